@@ -4,7 +4,9 @@
 Simple, powerful group management bot
 """
 
+import asyncio
 import logging
+import signal
 import sys
 import re
 from datetime import datetime
@@ -13,16 +15,26 @@ from typing import Optional
 from telegram import Update, BotCommand
 from telegram.ext import (
     Application,
-    CommandHandler,
-    MessageHandler,
-    filters,
+    ChatMemberHandler,
+    TypeHandler,
     ContextTypes,
     ApplicationBuilder
 )
 
 import config
-from data_manager import data
-from admin_commands import AdminCommands
+from database import data
+from handlers.admin_handlers import AdminCommands
+from utils.admin_cache import admin_cache
+from utils.cleaner import cleaner
+from utils.directory import user_directory
+from utils.fedprop import fed_propagator
+from utils.lanes import lane_processor
+from utils.gban import gban_enforcer
+from utils.locks import lock_enforcer
+from utils.pipeline import pipeline
+from utils.router import CommandRouter
+from utils.sender import sender
+from utils.webhook import create_webhook_server, register_webhook
 
 # Configure logging
 logging.basicConfig(
@@ -42,13 +54,14 @@ class LegendBot:
         
         # Initialize handlers
         self.admin = AdminCommands()
+        self.router = CommandRouter()
         
         # Create application
         try:
             self.app = (
                 ApplicationBuilder()
                 .token(config.Config.BOT_TOKEN)
-                .concurrent_updates(True)
+                .concurrent_updates(lane_processor)
                 .build()
             )
         except Exception as e:
@@ -70,115 +83,112 @@ class LegendBot:
         """Register all command handlers"""
         
         # ============ BASIC COMMANDS ============
-        self.app.add_handler(CommandHandler("start", self.start_command))
-        self.app.add_handler(CommandHandler("help", self.help_command))
-        self.app.add_handler(CommandHandler("id", self.id_command))
+        self.router.add("start", self.start_command)
+        self.router.add("help", self.help_command)
+        self.router.add("id", self.id_command)
+        self.router.add("stats", self.stats_command)
         
         # ============ ADMIN COMMANDS ============
         # Sudo management
-        self.app.add_handler(CommandHandler("addsudo", self.admin.add_sudo))
-        self.app.add_handler(CommandHandler("rmsudo", self.admin.remove_sudo))
-        self.app.add_handler(CommandHandler("sudolist", self.admin.sudo_list))
+        self.router.add("addsudo", self.admin.add_sudo)
+        self.router.add("rmsudo", self.admin.remove_sudo)
+        self.router.add("sudolist", self.admin.sudo_list)
         
         # Global bans
-        self.app.add_handler(CommandHandler("gban", self.admin.global_ban))
-        self.app.add_handler(CommandHandler("ungban", self.admin.global_unban))
-        self.app.add_handler(CommandHandler("gbanlist", self.admin.gban_list))
+        self.router.add("gban", self.admin.global_ban)
+        self.router.add("ungban", self.admin.global_unban)
+        self.router.add("gbanlist", self.admin.gban_list)
+        self.router.add("importgbans", self.admin.import_gbans)
+        self.router.add("exportgbans", self.admin.export_gbans)
         
         # Federation
-        self.app.add_handler(CommandHandler("newfed", self.admin.new_federation))
-        self.app.add_handler(CommandHandler("delfed", self.admin.delete_federation))
-        self.app.add_handler(CommandHandler("fedinfo", self.admin.fed_info))
-        self.app.add_handler(CommandHandler("fban", self.admin.fed_ban))
-        self.app.add_handler(CommandHandler("unfban", self.admin.fed_unban))
+        self.router.add("newfed", self.admin.new_federation)
+        self.router.add("delfed", self.admin.delete_federation)
+        self.router.add("fedinfo", self.admin.fed_info)
+        self.router.add("joinfed", self.admin.join_federation)
+        self.router.add("leavefed", self.admin.leave_federation)
+        self.router.add("fban", self.admin.fed_ban)
+        self.router.add("importfbans", self.admin.import_fbans)
+        self.router.add("exportfbans", self.admin.export_fbans)
+        self.router.add("unfban", self.admin.fed_unban)
         
         # Welcome/Goodbye
-        self.app.add_handler(CommandHandler("setwelcome", self.admin.set_welcome))
-        self.app.add_handler(CommandHandler("unsetwelcome", self.admin.unset_welcome))
-        self.app.add_handler(CommandHandler("setgoodbye", self.admin.set_goodbye))
-        self.app.add_handler(CommandHandler("unsetgoodbye", self.admin.unset_goodbye))
-        self.app.add_handler(CommandHandler("welcome", self.admin.show_welcome))
-        self.app.add_handler(CommandHandler("goodbye", self.admin.show_goodbye))
+        self.router.add("setwelcome", self.admin.set_welcome)
+        self.router.add("unsetwelcome", self.admin.unset_welcome)
+        self.router.add("setgoodbye", self.admin.set_goodbye)
+        self.router.add("unsetgoodbye", self.admin.unset_goodbye)
+        self.router.add("welcome", self.admin.show_welcome)
+        self.router.add("goodbye", self.admin.show_goodbye)
         
         # Locks
-        self.app.add_handler(CommandHandler("lock", self.admin.lock_chat))
-        self.app.add_handler(CommandHandler("unlock", self.admin.unlock_chat))
-        self.app.add_handler(CommandHandler("lockall", self.admin.lock_all))
-        self.app.add_handler(CommandHandler("unlockall", self.admin.unlock_all))
-        self.app.add_handler(CommandHandler("locks", self.admin.show_locks))
-        self.app.add_handler(CommandHandler("locktypes", self.admin.lock_types))
+        self.router.add("lock", self.admin.lock_chat)
+        self.router.add("unlock", self.admin.unlock_chat)
+        self.router.add("lockall", self.admin.lock_all)
+        self.router.add("unlockall", self.admin.unlock_all)
+        self.router.add("locks", self.admin.show_locks)
+        self.router.add("locktypes", self.admin.lock_types)
         
         # Clean messages
-        self.app.add_handler(CommandHandler("cleanmsg", self.admin.clean_messages))
-        self.app.add_handler(CommandHandler("keepmsg", self.admin.keep_messages))
-        self.app.add_handler(CommandHandler("nocleanmsg", self.admin.keep_messages))
-        self.app.add_handler(CommandHandler("cleanmsgtypes", self.admin.clean_message_types))
+        self.router.add("cleanmsg", self.admin.clean_messages)
+        self.router.add("keepmsg", self.admin.keep_messages)
+        self.router.add("nocleanmsg", self.admin.keep_messages)
+        self.router.add("cleanmsgtypes", self.admin.clean_message_types)
         
         # Connections
-        self.app.add_handler(CommandHandler("connect", self.admin.connect_chat))
-        self.app.add_handler(CommandHandler("disconnect", self.admin.disconnect_chat))
-        self.app.add_handler(CommandHandler("reconnect", self.admin.reconnect_chat))
-        self.app.add_handler(CommandHandler("connection", self.admin.connection_info))
+        self.router.add("connect", self.admin.connect_chat)
+        self.router.add("disconnect", self.admin.disconnect_chat)
+        self.router.add("reconnect", self.admin.reconnect_chat)
+        self.router.add("connection", self.admin.connection_info)
         
         # ============ MODERATION COMMANDS ============
-        self.app.add_handler(CommandHandler("ban", self.admin.ban_user))
-        self.app.add_handler(CommandHandler("unban", self.admin.unban_user))
-        self.app.add_handler(CommandHandler("mute", self.admin.mute_user))
-        self.app.add_handler(CommandHandler("unmute", self.admin.unmute_user))
-        self.app.add_handler(CommandHandler("kick", self.admin.kick_user))
-        self.app.add_handler(CommandHandler("warn", self.admin.warn_user))
-        self.app.add_handler(CommandHandler("unwarn", self.admin.unwarn_user))
-        self.app.add_handler(CommandHandler("warns", self.admin.show_warns))
-        self.app.add_handler(CommandHandler("del", self.admin.delete_message))
-        self.app.add_handler(CommandHandler("purge", self.admin.purge_messages))
+        self.router.add("ban", self.admin.ban_user)
+        self.router.add("unban", self.admin.unban_user)
+        self.router.add("mute", self.admin.mute_user)
+        self.router.add("unmute", self.admin.unmute_user)
+        self.router.add("kick", self.admin.kick_user)
+        self.router.add("warn", self.admin.warn_user)
+        self.router.add("unwarn", self.admin.unwarn_user)
+        self.router.add("warns", self.admin.show_warns)
+        self.router.add("del", self.admin.delete_message)
+        self.router.add("purge", self.admin.purge_messages)
         
         # ============ FILTERS & NOTES ============
-        self.app.add_handler(CommandHandler("filter", self.admin.add_filter))
-        self.app.add_handler(CommandHandler("stop", self.admin.remove_filter))
-        self.app.add_handler(CommandHandler("filters", self.admin.list_filters))
+        self.router.add("filter", self.admin.add_filter)
+        self.router.add("stop", self.admin.remove_filter)
+        self.router.add("filters", self.admin.list_filters)
         
-        self.app.add_handler(CommandHandler("save", self.admin.save_note))
-        self.app.add_handler(CommandHandler("get", self.admin.get_note))
-        self.app.add_handler(CommandHandler("clear", self.admin.clear_note))
-        self.app.add_handler(CommandHandler("notes", self.admin.list_notes))
+        self.router.add("save", self.admin.save_note)
+        self.router.add("get", self.admin.get_note)
+        self.router.add("clear", self.admin.clear_note)
+        self.router.add("notes", self.admin.list_notes)
         
         # ============ UTILITY COMMANDS ============
-        self.app.add_handler(CommandHandler("rules", self.admin.show_rules))
-        self.app.add_handler(CommandHandler("setrules", self.admin.set_rules))
-        self.app.add_handler(CommandHandler("report", self.admin.report_user))
-        self.app.add_handler(CommandHandler("settings", self.admin.chat_settings))
+        self.router.add("rules", self.admin.show_rules)
+        self.router.add("setrules", self.admin.set_rules)
+        self.router.add("report", self.admin.report_user)
+        self.router.add("settings", self.admin.chat_settings)
         
-        # ============ MESSAGE HANDLERS ============
-        # Handle filters in messages
-        self.app.add_handler(
-            MessageHandler(
-                filters.TEXT & ~filters.COMMAND,
-                self.admin.handle_filter_message
-            )
-        )
+        # One handler routes every /command and !command above
+        self.app.add_handler(self.router)
         
-        # Handle new members for welcome
-        self.app.add_handler(
-            MessageHandler(
-                filters.StatusUpdate.NEW_CHAT_MEMBERS,
-                self.admin.handle_new_members
-            )
-        )
+        # ============ MESSAGE PIPELINE ============
+        # Every update passes these stages once, in order, before any
+        # command runs; a stage can end the pipeline or stop the update
+        pipeline.add("directory", user_directory.observe)
+        pipeline.add("bans", gban_enforcer.check)
+        pipeline.add("locks", lock_enforcer.check)
+        pipeline.add("filters", self.admin.handle_filter_message)
+        pipeline.add("welcome", self.admin.handle_new_members)
+        pipeline.add("goodbye", self.admin.handle_left_members)
+        self.app.add_handler(TypeHandler(Update, pipeline.handle_update), group=-2)
         
-        # Handle left members for goodbye
+        # Keep cached admin lists in sync with promotions and demotions
         self.app.add_handler(
-            MessageHandler(
-                filters.StatusUpdate.LEFT_CHAT_MEMBERS,
-                self.admin.handle_left_members
-            )
-        )
-        
-        # Alternative command prefix !
-        self.app.add_handler(
-            MessageHandler(
-                filters.Regex(r'^!\w+'),
-                self.handle_exclamation_command
-            )
+            ChatMemberHandler(
+                admin_cache.handle_chat_member,
+                ChatMemberHandler.ANY_CHAT_MEMBER
+            ),
+            group=-1
         )
     
     def _get_bot_commands(self):
@@ -216,12 +226,16 @@ class LegendBot:
             last_name=user.last_name or "",
             username=user.username or ""
         )
+        if chat.type == "private":
+            # Reachable in private again (e.g. for /report delivery)
+            data.set_pm_blocked(user.id, False)
         
         welcome_msg = config.Messages.START_MSG.format(
             support_chat=config.Config.SUPPORT_CHAT
         )
         
-        await update.message.reply_text(
+        await sender.reply(
+            update.effective_message,
             welcome_msg,
             parse_mode='Markdown',
             disable_web_page_preview=True
@@ -229,7 +243,8 @@ class LegendBot:
     
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /help command"""
-        await update.message.reply_text(
+        await sender.reply(
+            update.effective_message,
             config.Messages.HELP_MSG,
             parse_mode='Markdown',
             disable_web_page_preview=True
@@ -253,20 +268,37 @@ class LegendBot:
             response += f"📛 *Chat Title:* {chat.title}\n"
             response += f"👥 *Chat Type:* {chat.type}\n"
         
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
     
-    async def handle_exclamation_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle commands with ! prefix"""
-        message = update.message.text
-        command = message.split()[0][1:]  # Remove "!"
-        
-        # Simulate command handling
-        # In practice, you would route this to appropriate handlers
-        await update.message.reply_text(
-            f"Command `!{command}` received.\n"
-            f"I also support `/` prefix for commands.",
-            parse_mode='Markdown'
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show per-stage message pipeline timings (owner only)"""
+        if update.effective_user.id != config.Config.OWNER_ID:
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
+            return
+        
+        lines = ["📊 *Pipeline stages* (calls / mean / slowest)"]
+        if config.Config.SHARD_COUNT > 1:
+            lines.insert(0, f"🧩 Shard {config.Config.SHARD_INDEX + 1} of {config.Config.SHARD_COUNT} (this chat's)\n")
+        for name, calls, mean, slowest in pipeline.stats():
+            lines.append(f"• {name}: {calls} / {mean * 1000:.2f}ms / {slowest * 1000:.1f}ms")
+        
+        lanes = lane_processor.metrics()
+        lines.append(
+            f"\n🛣️ *Chat lanes*: {lanes['running']} running, {lanes['lanes']} active, "
+            f"{lanes['waiting']} waiting, deepest {lanes['deepest_lane']} (peak {lanes['peak_depth']})"
+        )
+        
+        metrics = sender.metrics()
+        lines.append(
+            f"\n📤 *Outbound*: {metrics['queued']} queued, {metrics['in_flight']} in flight, "
+            f"{metrics['sent']} sent, {metrics['failed']} failed"
         )
+        
+        if context.args and context.args[0] == "reset":
+            pipeline.reset_stats()
+            lines.append("\nTimings reset.")
+        
+        await sender.reply(update.effective_message, "\n".join(lines), parse_mode='Markdown')
     
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE):
         """Handle errors"""
@@ -274,8 +306,9 @@ class LegendBot:
         
         # Try to send error to user
         try:
-            if update and hasattr(update, 'message') and update.message:
-                await update.message.reply_text(
+            if isinstance(update, Update) and update.effective_message:
+                await sender.reply(
+                    update.effective_message,
                     f"❌ An error occurred:\n`{context.error}`",
                     parse_mode='Markdown'
                 )
@@ -284,6 +317,13 @@ class LegendBot:
     
     async def post_init(self, application: Application):
         """Run after bot initialization"""
+        # Route all outbound messages through the rate-limited scheduler
+        sender.start(application.bot)
+        # /command@botname only counts when it names this bot
+        self.router.set_bot_username(application.bot.username)
+        cleaner.start(application.bot)
+        fed_propagator.start(application.bot)
+        
         try:
             # Set bot commands
             await application.bot.set_my_commands(self.commands)
@@ -312,28 +352,78 @@ class LegendBot:
         except Exception as e:
             logger.error(f"Post-init error: {e}")
     
+    async def post_shutdown(self, application: Application):
+        """Run after the bot stops"""
+        logger.info(f"Outbound queue at shutdown: {sender.metrics()}")
+        logger.info(f"Update lanes at shutdown: {lane_processor.metrics()}")
+        await fed_propagator.stop()
+        await cleaner.stop()
+        await sender.stop()
+    
+    def _enqueue_update(self, payload: dict):
+        """Hand a webhook update to the application without waiting on it"""
+        try:
+            update = Update.de_json(payload, self.app.bot)
+            if update is None:
+                raise ValueError("empty payload")
+        except Exception as e:
+            logger.warning(f"Dropped a malformed webhook update: {e}")
+            raise ValueError("not an update") from e
+        self.app.update_queue.put_nowait(update)
+    
+    async def _run_webhook(self):
+        """Serve updates from the webhook until SIGINT/SIGTERM"""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                # Windows: Ctrl+C still raises KeyboardInterrupt
+                pass
+        
+        server = create_webhook_server(self._enqueue_update)
+        
+        async with self.app:
+            await self.post_init(self.app)
+            await self.app.start()
+            await server.start()
+            
+            await register_webhook(self.app.bot)
+            
+            try:
+                await stop.wait()
+            finally:
+                logger.info(f"Webhook requests: {server.metrics()}")
+                await server.stop()
+                await self.app.stop()
+        await self.post_shutdown(self.app)
+    
     def run(self):
         """Start the bot"""
         try:
-            logger.info("Starting bot polling...")
-            
             # Add post-init callback
             self.app.post_init = self.post_init
+            self.app.post_shutdown = self.post_shutdown
             
-            # Start polling
-            self.app.run_polling(
-                allowed_updates=Update.ALL_TYPES,
-                drop_pending_updates=True,
-                close_loop=False
-            )
+            if config.Config.BOT_MODE == "webhook":
+                logger.info("Starting bot webhook...")
+                asyncio.run(self._run_webhook())
+            else:
+                logger.info("Starting bot polling...")
+                self.app.run_polling(
+                    allowed_updates=Update.ALL_TYPES,
+                    drop_pending_updates=True,
+                    close_loop=False
+                )
             
         except KeyboardInterrupt:
             logger.info("Bot stopped by user")
-            data.cleanup()  # Save all data
         except Exception as e:
             logger.error(f"Fatal error: {e}")
-            data.cleanup()  # Save all data before exit
             sys.exit(1)
+        finally:
+            data.cleanup()  # Flush pending writes before exit
 
 def main():
     """Main entry point"""
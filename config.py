@@ -35,8 +35,113 @@ class Config:
     # ===== PATHS =====
     DATA_DIR = "data"
     
+    # ===== UPDATE SOURCE =====
+    # "polling" or "webhook". In webhook mode updates are POSTed to
+    # http(s)://WEBHOOK_LISTEN:WEBHOOK_PORT/WEBHOOK_PATH; WEBHOOK_URL is the
+    # public URL registered with Telegram (leave empty to register nothing,
+    # e.g. to POST recorded updates locally). Requests must carry
+    # WEBHOOK_SECRET in the X-Telegram-Bot-Api-Secret-Token header if set.
+    BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "webhook")
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+    # Parallel connections Telegram may open to the webhook (1-100)
+    WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+    # Serve TLS directly instead of behind a proxy
+    WEBHOOK_CERT = os.getenv("WEBHOOK_CERT", "")
+    WEBHOOK_KEY = os.getenv("WEBHOOK_KEY", "")
+    
+    # ===== PERSISTENCE =====
+    # "json" (snapshots + journal) or "sqlite"
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
+    SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(DATA_DIR, "legend.db"))
+    # Dirty stores are written at most FLUSH_INTERVAL seconds after a change,
+    # or sooner once FLUSH_THRESHOLD mutations are pending
+    FLUSH_INTERVAL = float(os.getenv("FLUSH_INTERVAL", "5"))
+    FLUSH_THRESHOLD = int(os.getenv("FLUSH_THRESHOLD", "500"))
+    # The journal is folded into fresh snapshots once it reaches this size
+    JOURNAL_COMPACT_BYTES = int(os.getenv("JOURNAL_COMPACT_BYTES", str(8 * 1024 * 1024)))
+    
+    # ===== OUTBOUND RATE LIMITS =====
+    # Messages per second overall, per minute per group, per second per
+    # private chat, and API calls allowed in flight at once
+    GLOBAL_SEND_RATE = float(os.getenv("GLOBAL_SEND_RATE", "30"))
+    GROUP_SEND_RATE = float(os.getenv("GROUP_SEND_RATE", "20"))
+    PRIVATE_SEND_RATE = float(os.getenv("PRIVATE_SEND_RATE", "1"))
+    SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", "16"))
+    
+    # ===== UPDATE PROCESSING =====
+    # Updates processed at once across all chats; updates of one chat
+    # always run one after another
+    UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "256"))
+    
+    # ===== SHARDING =====
+    # Worker processes started by supervisor.py (needs STORAGE_BACKEND=sqlite).
+    # Every chat is handled by exactly one shard; BOT_MODE picks how the
+    # supervisor receives updates. SHARD_INDEX/SHARD_COUNT are set per worker.
+    SHARDS = int(os.getenv("SHARDS", "4"))
+    SHARD_INDEX = 0
+    SHARD_COUNT = 1
+    
+    # ===== BULK DELETION =====
+    # deleteMessages calls per second, parallel calls, and the most
+    # messages a single /purge may remove
+    DELETE_RATE = float(os.getenv("DELETE_RATE", "10"))
+    DELETE_CONCURRENCY = int(os.getenv("DELETE_CONCURRENCY", "4"))
+    PURGE_LIMIT = int(os.getenv("PURGE_LIMIT", "5000"))
+    # Single deletions (e.g. lock violations) within this many seconds
+    # share one deleteMessages call per chat
+    DELETE_BATCH_WINDOW = float(os.getenv("DELETE_BATCH_WINDOW", "1"))
+    
+    # ===== CACHES =====
+    # Chats whose compiled filter matcher is kept in memory
+    FILTER_CACHE_SIZE = int(os.getenv("FILTER_CACHE_SIZE", "1024"))
+    # Chats whose compiled welcome/goodbye templates are kept in memory
+    TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "1024"))
+    # Locked chats whose lock bitmask is kept in memory
+    LOCK_CACHE_SIZE = int(os.getenv("LOCK_CACHE_SIZE", "1024"))
+    # Seconds a chat's admin list is trusted before it is fetched again
+    ADMIN_CACHE_TTL = float(os.getenv("ADMIN_CACHE_TTL", "600"))
+    # Seconds a chat's member count is reused for {count}
+    MEMBER_COUNT_TTL = float(os.getenv("MEMBER_COUNT_TTL", "300"))
+    
+    # ===== GLOBAL BAN ENFORCEMENT =====
+    # From this many gbans on, lookups go through a Bloom filter and the
+    # compact ban list instead of a set of IDs (0 keeps the set); a
+    # chat/user pair is banned at most once per GBAN_ENFORCED_TTL seconds
+    GBAN_BLOOM_MIN = int(os.getenv("GBAN_BLOOM_MIN", "1000000"))
+    GBAN_ENFORCED_TTL = float(os.getenv("GBAN_ENFORCED_TTL", "3600"))
+    
+    # ===== FEDERATIONS =====
+    # Ban/unban calls per second when an fban is applied to member chats,
+    # calls in flight at once, and attempts per chat before giving up
+    FED_BAN_RATE = float(os.getenv("FED_BAN_RATE", "20"))
+    FED_CONCURRENCY = int(os.getenv("FED_CONCURRENCY", "8"))
+    FED_MAX_ATTEMPTS = int(os.getenv("FED_MAX_ATTEMPTS", "5"))
+    # Chats whose merged federation ban set is kept in memory
+    FBAN_CACHE_SIZE = int(os.getenv("FBAN_CACHE_SIZE", "1024"))
+    
+    # ===== USERNAME DIRECTORY =====
+    # A user's last_seen is refreshed at most every USERNAME_SEEN_INTERVAL
+    # seconds; usernames not seen for USERNAME_MAX_AGE seconds are not
+    # resolved any more (the name may have changed hands, 0 = never expire)
+    USERNAME_SEEN_INTERVAL = float(os.getenv("USERNAME_SEEN_INTERVAL", "3600"))
+    USERNAME_MAX_AGE = float(os.getenv("USERNAME_MAX_AGE", str(30 * 24 * 3600)))
+    
+    # ===== WELCOME =====
+    # Joins within WELCOME_BATCH_WINDOW seconds share one welcome message
+    # naming at most WELCOME_MAX_NAMES members; a member re-joining within
+    # WELCOME_DEDUPE_TTL seconds is not welcomed again
+    WELCOME_BATCH_WINDOW = float(os.getenv("WELCOME_BATCH_WINDOW", "3"))
+    WELCOME_MAX_NAMES = int(os.getenv("WELCOME_MAX_NAMES", "20"))
+    WELCOME_DEDUPE_TTL = float(os.getenv("WELCOME_DEDUPE_TTL", "60"))
+    
     # ===== CLEAN MESSAGE TYPES =====
     CLEAN_TYPES = ["action", "note", "warn", "report", "filter"]
+    # Seconds before a cleanable bot message is deleted
+    CLEAN_DELAY = float(os.getenv("CLEAN_DELAY", "300"))
     
     # ===== LOCK TYPES =====
     LOCK_TYPES = [
@@ -90,13 +195,19 @@ Support: {support_chat}
 • /gban [user] [reason] - Global ban
 • /ungban [user] - Remove global ban
 • /gbanlist - List globally banned users
+• /importgbans - Import gbans (reply to .csv/.ndjson, owner)
+• /exportgbans [csv|ndjson] - Export gbans (owner)
 
 *Federation:*
 • /newfed [name] - Create federation
 • /delfed [fedid] - Delete federation
 • /fedinfo [fedid] - Federation info
+• /joinfed [fedid] - Join this chat to a federation
+• /leavefed [fedid] - Leave a federation
 • /fban [user] [reason] - Ban in federation
 • /unfban [user] - Unban in federation
+• /importfbans [fedid] - Import fbans (reply to file, owner)
+• /exportfbans [fedid] [csv|ndjson] - Export fbans (owner)
 
 *Locks:*
 • /lock [type] - Lock media type
@@ -129,6 +240,7 @@ Support: {support_chat}
 • /start - Start the bot
 • /help - This message
 • /id - Get user/chat ID
+• /stats - Pipeline timings (owner)
 • /report [reason] - Report user
 • /rules - Show chat rules
 • /setrules [text] - Set rules
@@ -1,17 +1,100 @@
+import asyncio
 import json
+import logging
 import os
-from typing import Dict, List, Any, Optional
+import queue
+import sqlite3
+import struct
+import threading
+from collections.abc import MutableMapping
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List, Any, Optional, Tuple
 from datetime import datetime
+from cachetools import LRUCache
 import config
+from utils.banlist import BanList
+from utils.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+STORES = (
+    "users", "chats", "filters", "notes", "warns", "gbans", "feds", "connections",
+    "pending_deletes", "fed_queue"
+)
+JOURNAL_FILE = "journal.log"
+# Rows per transaction when a bulk import is written to SQLite
+BULK_BATCH_ROWS = 10000
+# Stores every shard needs in full; the rest are owned by the shard of their chat
+SHARED_STORES = ("users", "gbans", "feds", "connections")
+
+class _Missing:
+    """Marker for a journal path that no longer exists"""
+
+MISSING = _Missing()
+
+def _json_default(value):
+    """Serialize ban lists inside journal records as plain dicts"""
+    if isinstance(value, BanList):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
 
 class DataManager:
-    """JSON-based data storage manager"""
+    """JSON-based data storage manager
+    
+    Each store is kept in memory and persisted as a JSON snapshot plus an
+    append-only journal. A mutation records the path it touched; a single
+    writer thread owns all disk I/O, appends one journal line per touched
+    path and folds the journal into fresh snapshots once it grows past
+    JOURNAL_COMPACT_BYTES.
+    """
     
     def __init__(self):
         self.data_dir = config.Config.DATA_DIR
         self._ensure_data_dir()
         
+        # Write-behind state: mutations only record the touched path and
+        # the writer thread persists it later, never the mutating caller
+        self.flush_interval = config.Config.FLUSH_INTERVAL
+        self.flush_threshold = config.Config.FLUSH_THRESHOLD
+        self.compact_bytes = config.Config.JOURNAL_COMPACT_BYTES
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._pending: Dict[Tuple[str, Tuple[str, ...]], None] = {}
+        # (store, path) -> keys added by bulk_add_* since the last commit_bulk
+        self._bulk_keys: Dict[Tuple[str, Tuple[str, ...]], List[str]] = {}
+        self._unsnapshotted = set()
+        self._filter_generations: Dict[str, int] = {}
+        self._jobs: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._flush_requested = False
+        # Set when other processes must see our writes, see
+        # SQLiteDataManager.set_replication
+        self._replicated = frozenset()
+        self._publish: Optional[Callable[[List[str]], None]] = None
+        
         # Initialize data structures
+        self._load_stores()
+        self._build_indexes()
+        
+        self._writer = threading.Thread(
+            target=self._writer_loop, name="data-writer", daemon=True
+        )
+        self._writer.start()
+    
+    def _build_indexes(self):
+        """Derive in-memory lookup structures from the loaded stores"""
+        self._index_warns()
+        self._index_usernames()
+        self._index_sudo()
+        self._index_gbans()
+        self._index_fed_chats()
+    
+    def _ensure_data_dir(self):
+        """Create data directory if it doesn't exist"""
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+    
+    def _load_stores(self):
+        """Load snapshots and replay the journal on top of them"""
         self.users = self._load_json("users.json", {})
         self.chats = self._load_json("chats.json", {})
         self.filters = self._load_json("filters.json", {})
@@ -20,11 +103,19 @@ class DataManager:
         self.gbans = self._load_json("gbans.json", {})
         self.feds = self._load_json("feds.json", {})
         self.connections = self._load_json("connections.json", {})
-    
-    def _ensure_data_dir(self):
-        """Create data directory if it doesn't exist"""
-        if not os.path.exists(self.data_dir):
-            os.makedirs(self.data_dir)
+        self.pending_deletes = self._load_json("pending_deletes.json", {})
+        self.fed_queue = self._load_json("fed_queue.json", {})
+        self._load_banlists()
+        
+        self._journal_path = os.path.join(self.data_dir, JOURNAL_FILE)
+        replayed = self._replay_journal()
+        self._adopt_banlists()
+        if replayed:
+            # Fold the replayed records into snapshots and drop any torn tail
+            self._unsnapshotted.update(STORES)
+            self.compact()
+        else:
+            self._journal = open(self._journal_path, 'a', encoding='utf-8')
     
     def _load_json(self, filename: str, default=None):
         """Load JSON data from file"""
@@ -33,15 +124,313 @@ class DataManager:
             try:
                 with open(filepath, 'r', encoding='utf-8') as f:
                     return json.load(f)
-            except (json.JSONDecodeError, IOError):
+            except (json.JSONDecodeError, IOError) as e:
+                # Keep the damaged file for inspection instead of losing it
+                # on the next snapshot
+                aside = f"{filepath}.corrupt-{int(datetime.now().timestamp())}"
+                logger.error(f"Failed to load {filename} ({e}), moved to {aside}")
+                try:
+                    os.replace(filepath, aside)
+                except OSError:
+                    pass
                 return default if default is not None else {}
         return default if default is not None else {}
     
-    def _save_json(self, filename: str, data):
-        """Save data to JSON file"""
+    def _load_banlists(self):
+        """Map saved gban/fban lists from disk over the JSON snapshots"""
+        path = os.path.join(self.data_dir, "gbans.bin")
+        if os.path.exists(path):
+            self.gbans = self._load_banlist(path)
+        for fed_id, fed in self.feds.items():
+            path = self._fban_path(fed_id)
+            # Lists still embedded in feds.json predate the binary files
+            if not fed.get('fbans') and os.path.exists(path):
+                fed['fbans'] = self._load_banlist(path)
+        self._adopt_banlists()
+    
+    def _load_banlist(self, path: str) -> BanList:
+        """Load one ban list file, moving it aside if it is damaged"""
+        try:
+            return BanList.load(path)
+        except (OSError, ValueError, struct.error) as e:
+            aside = f"{path}.corrupt-{int(datetime.now().timestamp())}"
+            logger.error(f"Failed to load {path} ({e}), moved to {aside}")
+            try:
+                os.replace(path, aside)
+            except OSError:
+                pass
+            return BanList()
+    
+    def _adopt_banlists(self):
+        """Convert plain ban dicts (legacy snapshots, replayed records) to BanLists"""
+        if not isinstance(self.gbans, BanList):
+            self.gbans = BanList.from_mapping(self.gbans)
+        for fed in self.feds.values():
+            if not isinstance(fed.get('fbans'), BanList):
+                fed['fbans'] = BanList.from_mapping(fed.get('fbans') or {})
+    
+    def _fban_path(self, fed_id: str) -> str:
+        """Get the ban list file of a federation"""
+        return os.path.join(self.data_dir, "fbans", f"{fed_id}.bin")
+    
+    def _snapshot_files(self, store: str) -> Dict[str, Any]:
+        """Serialize a store into the files holding its snapshot"""
+        if store == "gbans":
+            return {"gbans.bin": self.gbans.to_bytes()}
+        if store == "feds":
+            files = {
+                os.path.join("fbans", f"{fed_id}.bin"): fed['fbans'].to_bytes()
+                for fed_id, fed in self.feds.items()
+            }
+            feds = {
+                fed_id: {k: v for k, v in fed.items() if k != 'fbans'}
+                for fed_id, fed in self.feds.items()
+            }
+            files["feds.json"] = json.dumps(feds, ensure_ascii=False)
+            return files
+        return {f"{store}.json": json.dumps(getattr(self, store), ensure_ascii=False)}
+    
+    def _prune_snapshot_files(self, stores):
+        """Remove files made obsolete by the snapshots just written"""
+        obsolete = []
+        if "gbans" in stores:
+            obsolete.append(os.path.join(self.data_dir, "gbans.json"))
+        if "feds" in stores:
+            fban_dir = os.path.join(self.data_dir, "fbans")
+            if os.path.isdir(fban_dir):
+                obsolete.extend(
+                    os.path.join(fban_dir, name) for name in os.listdir(fban_dir)
+                    if name.endswith(".bin") and name[:-4] not in self.feds
+                )
+        for path in obsolete:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    
+    def _write_file(self, filename: str, payload):
+        """Atomically replace a file in the data directory"""
         filepath = os.path.join(self.data_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        tmp_path = filepath + ".tmp"
+        binary = isinstance(payload, bytes)
+        with open(tmp_path, 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    
+    # ===== JOURNAL =====
+    def _touch(self, store: str, *path):
+        """Record that the value at store[path...] changed"""
+        key = (store, tuple(str(p) for p in path))
+        with self._lock:
+            # Re-insert so records are written in last-touched order
+            self._pending.pop(key, None)
+            self._pending[key] = None
+            if len(self._pending) >= self.flush_threshold and not self._flush_requested:
+                self._flush_requested = True
+                self.submit(self.flush)
+    
+    def _resolve(self, store: str, path: Tuple[str, ...]):
+        """Get the current value at store[path...] or MISSING"""
+        node = getattr(self, store)
+        for part in path:
+            if not isinstance(node, MutableMapping) or part not in node:
+                return MISSING
+            node = node[part]
+        return node
+    
+    def _apply_record(self, store: str, path: List[str], value):
+        """Set (or delete, for MISSING) the value at store[path...]"""
+        if not path:
+            setattr(self, store, {} if value is MISSING else value)
+            return
+        
+        node = getattr(self, store)
+        for part in path[:-1]:
+            if value is MISSING and part not in node:
+                return
+            node = node.setdefault(part, {})
+            if not isinstance(node, MutableMapping):
+                return
+        
+        if value is MISSING:
+            node.pop(path[-1], None)
+        else:
+            node[path[-1]] = value
+    
+    def _replay_journal(self) -> int:
+        """Apply journal records to the loaded snapshots"""
+        if not os.path.exists(self._journal_path):
+            return 0
+        
+        replayed = 0
+        with open(self._journal_path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                    store, path = record['s'], record['p']
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    # A crash mid-append leaves at most one torn record at the end
+                    logger.warning(f"Journal truncated at line {line_no}, ignoring the rest")
+                    break
+                if store not in STORES:
+                    continue
+                self._apply_record(store, path, record.get('v', MISSING))
+                replayed += 1
+        
+        if replayed:
+            logger.info(f"Replayed {replayed} journal records")
+        return replayed
+    
+    # ===== WRITER THREAD =====
+    def _writer_loop(self):
+        """Run queued jobs in order and flush every FLUSH_INTERVAL seconds"""
+        while True:
+            try:
+                job = self._jobs.get(timeout=self.flush_interval)
+            except queue.Empty:
+                job = (self.flush, (), None)
+            if job is None:
+                return
+            
+            func, args, future = job
+            if future is not None and not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = func(*args)
+                if self._needs_compaction():
+                    self.compact()
+            except Exception as e:
+                logger.error(f"Storage job {func.__name__} failed: {e}")
+                if future is not None:
+                    future.set_exception(e)
+            else:
+                if future is not None:
+                    future.set_result(result)
+    
+    def submit(self, func, *args) -> Future:
+        """Run func on the writer thread after everything queued before it"""
+        future = Future()
+        writer = getattr(self, '_writer', None)
+        if writer is None or threading.current_thread() is writer:
+            # Still loading, or already on the writer where queueing
+            # would wait on ourselves
+            future.set_result(func(*args))
+            return future
+        self._jobs.put((func, args, future))
+        return future
+    
+    async def durable(self):
+        """Wait until every change made so far is on disk"""
+        await asyncio.wrap_future(self.submit(self.flush))
+    
+    # ===== WRITE-BEHIND =====    
+    def _take_records(self) -> List[Tuple[str, Tuple[str, ...], Any]]:
+        """Pop pending paths and resolve their current values"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flush_requested = False
+            return [(store, path, self._resolve(store, path)) for store, path in pending]
+    
+    def _restore_records(self, records: List[Tuple[str, Tuple[str, ...], Any]]):
+        """Put taken paths back so the next flush retries them"""
+        with self._lock:
+            for store, path, _ in records:
+                self._pending.setdefault((store, path), None)
+    
+    def flush(self):
+        """Persist all pending records"""
+        with self._write_lock:
+            with self._lock:
+                # Serialize under the lock so no half-mutated value is written
+                records = self._take_records()
+                try:
+                    batch = self._encode_records(records)
+                except Exception:
+                    self._restore_records(records)
+                    raise
+                replica = [
+                    self._record_line(store, path, value)
+                    for store, path, value in records if store in self._replicated
+                ]
+            
+            if batch:
+                try:
+                    self._write_records(batch)
+                except Exception:
+                    logger.warning(f"Flush failed; retrying {len(records)} records on the next one")
+                    self._restore_records(records)
+                    raise
+            if replica:
+                self._publish(replica)
+    
+    def _record_line(self, store: str, path: Tuple[str, ...], value) -> str:
+        """Serialize one record as a journal line"""
+        record = {'s': store, 'p': list(path)}
+        if value is not MISSING:
+            record['v'] = value
+        return json.dumps(record, ensure_ascii=False, default=_json_default) + "\n"
+    
+    def _encode_records(self, records: List[Tuple[str, Tuple[str, ...], Any]]) -> List[str]:
+        """Serialize records as journal lines"""
+        lines = []
+        for store, path, value in records:
+            lines.append(self._record_line(store, path, value))
+            self._unsnapshotted.add(store)
+        return lines
+    
+    def _write_records(self, lines: List[str]):
+        """Append journal lines with a single fsync"""
+        self._journal.write("".join(lines))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+    
+    def _needs_compaction(self) -> bool:
+        """Check if the journal has outgrown JOURNAL_COMPACT_BYTES"""
+        return self._journal.tell() >= self.compact_bytes
+    
+    def commit_bulk(self, store: str, *path) -> Future:
+        """Persist a bulk change to store[path...] as one batch on the writer"""
+        return self.submit(self._commit_bulk, store, tuple(str(p) for p in path))
+    
+    def _commit_bulk(self, store: str, path: Tuple[str, ...]):
+        """Snapshot a bulk-changed store instead of journaling every entry"""
+        with self._lock:
+            self._bulk_keys.pop((store, path), None)
+            self._unsnapshotted.add(store)
+        self.compact()
+    
+    def compact(self):
+        """Fold the journal into new snapshots and truncate it"""
+        with self._write_lock:
+            with self._lock:
+                records = self._take_records()
+                self._unsnapshotted.update(store for store, _, _ in records)
+                stores, self._unsnapshotted = self._unsnapshotted, set()
+                payloads = {store: self._snapshot_files(store) for store in stores}
+            
+            try:
+                for files in payloads.values():
+                    for filename, payload in files.items():
+                        self._write_file(filename, payload)
+            except OSError:
+                # Keep the journal and retry on the next compaction
+                with self._lock:
+                    self._unsnapshotted.update(stores)
+                self._restore_records(records)
+                raise
+            
+            # Every journaled change is now in a snapshot
+            journal = getattr(self, '_journal', None)
+            if journal is not None:
+                journal.close()
+            self._journal = open(self._journal_path, 'w', encoding='utf-8')
+            os.fsync(self._journal.fileno())
+            self._prune_snapshot_files(payloads)
+            if payloads:
+                logger.info(f"Compacted journal into {len(payloads)} snapshots")
     
     # ===== USER MANAGEMENT =====
     def get_user(self, user_id: int) -> Dict:
@@ -60,7 +449,7 @@ class DataManager:
                 'join_date': datetime.now().isoformat(),
                 'last_seen': datetime.now().isoformat()
             }
-            self.save_users()
+            self._touch("users", user_id)
         return self.users[user_id]
     
     def update_user(self, user_id: int, **kwargs):
@@ -68,11 +457,76 @@ class DataManager:
         user = self.get_user(user_id)
         user.update(kwargs)
         user['last_seen'] = datetime.now().isoformat()
-        self.save_users()
+        if user.get('username'):
+            self._usernames[user['username'].lower()] = int(user_id)
+        if 'sudo' in kwargs:
+            self._sudo_index(int(user_id), user)
+        self._touch("users", str(user_id))
+    
+    # ===== USERNAME DIRECTORY =====
+    def _index_usernames(self):
+        """Build the lowercase username -> user ID index"""
+        self._usernames: Dict[str, int] = {}
+        # Oldest first, so the most recent holder of a reused name wins
+        users = sorted(self.users.values(), key=lambda user: user.get('last_seen') or '')
+        for user in users:
+            if user.get('username'):
+                self._usernames[user['username'].lower()] = user['id']
+    
+    def observe_user(self, user_id: int, username: str, first_name: str, last_name: str,
+                     touch_seen: bool = False) -> bool:
+        """Record a user seen in an update; returns whether anything was written"""
+        user = self.users.get(str(user_id))
+        if (user is not None and not touch_seen and user.get('username') == username
+                and user.get('first_name') == first_name and user.get('last_name') == last_name):
+            return False
+        
+        user = self.get_user(user_id)
+        old = (user.get('username') or '').lower()
+        if old and old != username.lower() and self._usernames.get(old) == user_id:
+            del self._usernames[old]
+        user['username'] = username
+        user['first_name'] = first_name
+        user['last_name'] = last_name
+        user['last_seen'] = datetime.now().isoformat()
+        if username:
+            self._usernames[username.lower()] = user_id
+        self._touch("users", str(user_id))
+        return True
+    
+    def resolve_username(self, username: str, max_age: Optional[float] = None) -> Optional[int]:
+        """Look up a user ID by username (case-insensitive, without the @)"""
+        user_id = self._usernames.get(username.lower())
+        if user_id is None:
+            return None
+        user = self.users.get(str(user_id))
+        if not user or (user.get('username') or '').lower() != username.lower():
+            return None
+        if max_age:
+            try:
+                seen = datetime.fromisoformat(user['last_seen'])
+            except (KeyError, TypeError, ValueError):
+                return None
+            # Names not seen for a while may have changed hands
+            if (datetime.now() - seen).total_seconds() > max_age:
+                return None
+        return user_id
+    
+    def set_pm_blocked(self, user_id: int, blocked: bool):
+        """Mark whether the bot can message a user privately"""
+        user = self.get_user(user_id)
+        if user.get('pm_blocked', False) != blocked:
+            user['pm_blocked'] = blocked
+            self._touch("users", str(user_id))
+    
+    def is_pm_blocked(self, user_id: int) -> bool:
+        """Check if a user is known to be unreachable in private"""
+        user = self.users.get(str(user_id))
+        return bool(user and user.get('pm_blocked'))
     
     def save_users(self):
-        """Save users to file"""
-        self._save_json("users.json", self.users)
+        """Schedule all users for the next flush"""
+        self._touch("users")
     
     # ===== CHAT MANAGEMENT =====
     def get_chat(self, chat_id: int) -> Dict:
@@ -95,18 +549,18 @@ class DataManager:
                 'antispam': True,
                 'created_at': datetime.now().isoformat()
             }
-            self.save_chats()
+            self._touch("chats", chat_id)
         return self.chats[chat_id]
     
     def update_chat(self, chat_id: int, **kwargs):
         """Update chat data"""
         chat = self.get_chat(chat_id)
         chat.update(kwargs)
-        self.save_chats()
+        self._touch("chats", chat_id)
     
     def save_chats(self):
-        """Save chats to file"""
-        self._save_json("chats.json", self.chats)
+        """Schedule all chats for the next flush"""
+        self._touch("chats")
     
     # ===== FILTERS =====
     def add_filter(self, chat_id: int, keyword: str, content: str, **kwargs):
@@ -121,7 +575,8 @@ class DataManager:
             'added_at': datetime.now().isoformat(),
             **kwargs
         }
-        self.save_filters()
+        self._touch("filters", chat_id, keyword.lower())
+        self._bump_filter_generation(chat_id)
     
     def remove_filter(self, chat_id: int, keyword: str) -> bool:
         """Remove a filter"""
@@ -130,7 +585,8 @@ class DataManager:
         
         if chat_id in self.filters and keyword in self.filters[chat_id]:
             del self.filters[chat_id][keyword]
-            self.save_filters()
+            self._touch("filters", chat_id, keyword)
+            self._bump_filter_generation(chat_id)
             return True
         return False
     
@@ -148,9 +604,17 @@ class DataManager:
         chat_id = str(chat_id)
         return self.filters.get(chat_id, {})
     
+    def _bump_filter_generation(self, chat_id: str):
+        """Invalidate compiled matchers for a chat's filters"""
+        self._filter_generations[chat_id] = self._filter_generations.get(chat_id, 0) + 1
+    
+    def filter_generation(self, chat_id: int) -> int:
+        """Get a counter that changes whenever a chat's filters change"""
+        return self._filter_generations.get(str(chat_id), 0)
+    
     def save_filters(self):
-        """Save filters to file"""
-        self._save_json("filters.json", self.filters)
+        """Schedule all filters for the next flush"""
+        self._touch("filters")
     
     # ===== NOTES =====
     def add_note(self, chat_id: int, name: str, content: str, **kwargs):
@@ -165,7 +629,7 @@ class DataManager:
             'added_at': datetime.now().isoformat(),
             **kwargs
         }
-        self.save_notes()
+        self._touch("notes", chat_id, name.lower())
     
     def remove_note(self, chat_id: int, name: str) -> bool:
         """Remove a note"""
@@ -174,7 +638,7 @@ class DataManager:
         
         if chat_id in self.notes and name in self.notes[chat_id]:
             del self.notes[chat_id][name]
-            self.save_notes()
+            self._touch("notes", chat_id, name)
             return True
         return False
     
@@ -193,29 +657,58 @@ class DataManager:
         return self.notes.get(chat_id, {})
     
     def save_notes(self):
-        """Save notes to file"""
-        self._save_json("notes.json", self.notes)
+        """Schedule all notes for the next flush"""
+        self._touch("notes")
     
     # ===== WARNS =====
+    def _index_warns(self):
+        """Build the (chat, user) -> warn ids index and warn counters"""
+        self._warn_index: Dict[Tuple[str, int], List[str]] = {}
+        self._chat_warn_counts: Dict[str, int] = {}
+        self._user_warn_totals: Dict[int, int] = {}
+        
+        for chat_id, chat_warns in self.warns.items():
+            for warn_id, warn_data in chat_warns.items():
+                user_id = int(warn_data['user_id'])
+                self._warn_index.setdefault((chat_id, user_id), []).append(warn_id)
+                self._user_warn_totals[user_id] = self._user_warn_totals.get(user_id, 0) + 1
+            self._chat_warn_counts[chat_id] = len(chat_warns)
+        
+        # user['warns'] used to be a separately maintained counter that
+        # drifted; derive it from the index instead
+        for user_id, user in self.users.items():
+            total = self._user_warn_totals.get(int(user_id), 0)
+            if user.get('warns', 0) != total:
+                user['warns'] = total
+                self._touch("users", user_id)
+    
+    def _sync_user_warns(self, user_id: int):
+        """Copy the indexed warn total into the user record"""
+        user = self.get_user(user_id)
+        user['warns'] = self._user_warn_totals.get(user_id, 0)
+        self._touch("users", user_id)
+    
     def add_warn(self, user_id: int, chat_id: int, reason: str = "", warned_by: int = 0):
         """Add a warning"""
         warn_id = f"{user_id}_{chat_id}_{datetime.now().timestamp()}"
+        chat_id = str(chat_id)
         
-        if str(chat_id) not in self.warns:
-            self.warns[str(chat_id)] = {}
+        if chat_id not in self.warns:
+            self.warns[chat_id] = {}
         
-        self.warns[str(chat_id)][warn_id] = {
+        self.warns[chat_id][warn_id] = {
             'user_id': user_id,
             'reason': reason,
             'warned_by': warned_by,
             'warned_at': datetime.now().isoformat()
         }
-        self.save_warns()
+        self._touch("warns", chat_id, warn_id)
         
-        # Update user warn count
-        user = self.get_user(user_id)
-        user['warns'] = user.get('warns', 0) + 1
-        self.save_users()
+        # Update indexes and user warn count
+        self._warn_index.setdefault((chat_id, user_id), []).append(warn_id)
+        self._chat_warn_counts[chat_id] = self._chat_warn_counts.get(chat_id, 0) + 1
+        self._user_warn_totals[user_id] = self._user_warn_totals.get(user_id, 0) + 1
+        self._sync_user_warns(user_id)
         
         return warn_id
     
@@ -223,14 +716,19 @@ class DataManager:
         """Remove a warning"""
         chat_id = str(chat_id)
         if chat_id in self.warns and warn_id in self.warns[chat_id]:
-            user_id = self.warns[chat_id][warn_id]['user_id']
+            user_id = int(self.warns[chat_id][warn_id]['user_id'])
             del self.warns[chat_id][warn_id]
-            self.save_warns()
+            self._touch("warns", chat_id, warn_id)
             
-            # Update user warn count
-            user = self.get_user(user_id)
-            user['warns'] = max(0, user.get('warns', 0) - 1)
-            self.save_users()
+            # Update indexes and user warn count
+            warn_ids = self._warn_index.get((chat_id, user_id), [])
+            if warn_id in warn_ids:
+                warn_ids.remove(warn_id)
+            if not warn_ids:
+                self._warn_index.pop((chat_id, user_id), None)
+            self._chat_warn_counts[chat_id] = self._chat_warn_counts.get(chat_id, 1) - 1
+            self._user_warn_totals[user_id] = max(0, self._user_warn_totals.get(user_id, 1) - 1)
+            self._sync_user_warns(user_id)
             
             return True
         return False
@@ -238,20 +736,40 @@ class DataManager:
     def get_user_warns(self, user_id: int, chat_id: int) -> List[Dict]:
         """Get all warns for a user in a chat"""
         chat_id = str(chat_id)
-        user_warns = []
-        
-        if chat_id in self.warns:
-            for warn_id, warn_data in self.warns[chat_id].items():
-                if warn_data['user_id'] == user_id:
-                    user_warns.append({'id': warn_id, **warn_data})
-        
-        return user_warns
+        chat_warns = self.warns.get(chat_id, {})
+        return [
+            {'id': warn_id, **chat_warns[warn_id]}
+            for warn_id in self._warn_index.get((chat_id, user_id), [])
+        ]
+    
+    def count_user_warns(self, user_id: int, chat_id: int) -> int:
+        """Get the number of warns for a user in a chat"""
+        return len(self._warn_index.get((str(chat_id), user_id), ()))
+    
+    def count_chat_warns(self, chat_id: int) -> int:
+        """Get the number of warns in a chat"""
+        return self._chat_warn_counts.get(str(chat_id), 0)
     
     def save_warns(self):
-        """Save warns to file"""
-        self._save_json("warns.json", self.warns)
+        """Schedule all warns for the next flush"""
+        self._touch("warns")
     
     # ===== GLOBAL BANS =====
+    def _index_gbans(self):
+        """Build the in-memory membership index of globally banned user IDs"""
+        self._gban_ids, self._gban_bloom = self._gban_index(self.gbans)
+    
+    @staticmethod
+    def _gban_index(gbans: BanList) -> Tuple[set, Optional[BloomFilter]]:
+        """Get the ID set, or for very large lists the Bloom filter, of a ban list"""
+        # Very large lists stay in the compact ban list behind a Bloom
+        # filter instead of being copied into a set
+        bloom_min = config.Config.GBAN_BLOOM_MIN
+        if bloom_min and len(gbans) >= bloom_min:
+            logger.info(f"Building Bloom filter for {len(gbans)} global bans")
+            return set(), BloomFilter.from_ids(gbans.ids(), capacity=len(gbans) * 2)
+        return set(gbans.ids()), None
+    
     def add_gban(self, user_id: int, reason: str = "", banned_by: int = 0):
         """Add global ban"""
         user_id = str(user_id)
@@ -264,36 +782,64 @@ class DataManager:
         # Update user
         user = self.get_user(int(user_id))
         user['is_gbanned'] = True
-        self.save_users()
+        self._touch("users", user_id)
         
-        self.save_gbans()
+        if self._gban_bloom is not None:
+            self._gban_bloom.add(int(user_id))
+        else:
+            self._gban_ids.add(int(user_id))
+        self._touch("gbans", user_id)
+    
+    def bulk_add_gbans(self, rows: Iterable[Tuple[int, Dict]]) -> int:
+        """Add many global bans without journaling each one; see commit_bulk"""
+        added = 0
+        keys = self._bulk_keys.setdefault(("gbans", ()), [])
+        for user_id, ban in rows:
+            self.gbans[str(user_id)] = ban
+            keys.append(str(user_id))
+            if self._gban_bloom is not None:
+                self._gban_bloom.add(user_id)
+            else:
+                self._gban_ids.add(user_id)
+            
+            # Only flag users we already know; imports must not create records
+            user = self.users.get(str(user_id))
+            if user is not None and not user.get('is_gbanned'):
+                user['is_gbanned'] = True
+                self._touch("users", str(user_id))
+            added += 1
+        return added
     
     def remove_gban(self, user_id: int) -> bool:
         """Remove global ban"""
         user_id = str(user_id)
         if user_id in self.gbans:
             del self.gbans[user_id]
+            self._gban_ids.discard(int(user_id))
             
             # Update user
             user = self.get_user(int(user_id))
             user['is_gbanned'] = False
-            self.save_users()
+            self._touch("users", user_id)
             
-            self.save_gbans()
+            self._touch("gbans", user_id)
             return True
         return False
     
     def is_gbanned(self, user_id: int) -> bool:
         """Check if user is globally banned"""
-        return str(user_id) in self.gbans
+        bloom = self._gban_bloom
+        if bloom is None:
+            return user_id in self._gban_ids
+        return user_id in bloom and self.gbans.contains_id(user_id)
     
     def get_gban(self, user_id: int) -> Optional[Dict]:
         """Get global ban info"""
         return self.gbans.get(str(user_id))
     
     def save_gbans(self):
-        """Save global bans to file"""
-        self._save_json("gbans.json", self.gbans)
+        """Schedule all global bans for the next flush"""
+        self._touch("gbans")
     
     # ===== FEDERATIONS =====
     def create_fed(self, name: str, owner_id: int) -> str:
@@ -305,17 +851,19 @@ class DataManager:
             'owner_id': owner_id,
             'admins': [],
             'chats': [],
-            'fbans': {},
+            'fbans': BanList(),
             'created_at': datetime.now().isoformat()
         }
-        self.save_feds()
+        self._touch("feds", fed_id)
         return fed_id
     
     def delete_fed(self, fed_id: str, owner_id: int) -> bool:
         """Delete a federation"""
         if fed_id in self.feds and self.feds[fed_id]['owner_id'] == owner_id:
+            for chat_id in self.feds[fed_id]['chats']:
+                self._chat_left(fed_id, chat_id)
             del self.feds[fed_id]
-            self.save_feds()
+            self._touch("feds", fed_id)
             return True
         return False
     
@@ -324,7 +872,7 @@ class DataManager:
         if fed_id in self.feds and self.feds[fed_id]['owner_id'] == promoter_id:
             if user_id not in self.feds[fed_id]['admins']:
                 self.feds[fed_id]['admins'].append(user_id)
-                self.save_feds()
+                self._touch("feds", fed_id, 'admins')
             return True
         return False
     
@@ -337,11 +885,166 @@ class DataManager:
                 'banned_by': banned_by,
                 'banned_at': datetime.now().isoformat()
             }
-            self.save_feds()
+            self._touch("feds", fed_id, 'fbans', user_id)
+            self._fban_added(self.feds[fed_id], int(user_id))
+    
+    def remove_fban(self, fed_id: str, user_id: int) -> bool:
+        """Remove federation ban"""
+        user_id = str(user_id)
+        if fed_id in self.feds and user_id in self.feds[fed_id]['fbans']:
+            del self.feds[fed_id]['fbans'][user_id]
+            self._touch("feds", fed_id, 'fbans', user_id)
+            self._fban_removed(self.feds[fed_id], int(user_id))
+            return True
+        return False
+    
+    def bulk_add_fbans(self, fed_id: str, rows: Iterable[Tuple[int, Dict]]) -> int:
+        """Add many federation bans without journaling each one; see commit_bulk"""
+        fbans = self.feds[fed_id]['fbans']
+        added = 0
+        keys = self._bulk_keys.setdefault(("feds", (fed_id,)), [])
+        for user_id, ban in rows:
+            fbans[str(user_id)] = ban
+            keys.append(str(user_id))
+            added += 1
+        # Cheaper to rebuild the member chats' sets on demand than to patch them
+        for chat_id in self.feds[fed_id]['chats']:
+            self._chat_fbans.pop(str(chat_id), None)
+        return added
     
     def save_feds(self):
-        """Save federations to file"""
-        self._save_json("feds.json", self.feds)
+        """Schedule all federations for the next flush"""
+        self._touch("feds")
+    
+    # ===== FEDERATION CHATS =====
+    def _index_fed_chats(self):
+        """Build the chat -> federations index"""
+        self._chat_feds: Dict[str, List[str]] = {}
+        for fed_id, fed in self.feds.items():
+            for chat_id in fed.get('chats', []):
+                self._chat_feds.setdefault(str(chat_id), []).append(fed_id)
+        # Per-chat union of its federations' fbans, built on first use
+        self._chat_fbans: LRUCache = LRUCache(maxsize=config.Config.FBAN_CACHE_SIZE)
+    
+    def _chat_joined(self, fed_id: str, chat_id: int):
+        """Index a chat that joined a federation"""
+        self._chat_feds.setdefault(str(chat_id), []).append(fed_id)
+        banned = self._chat_fbans.get(str(chat_id))
+        if banned is not None:
+            banned.update(self.feds[fed_id]['fbans'].ids())
+    
+    def _chat_left(self, fed_id: str, chat_id: int):
+        """Unindex a chat that left a federation"""
+        feds = self._chat_feds.get(str(chat_id), [])
+        if fed_id in feds:
+            feds.remove(fed_id)
+        if not feds:
+            self._chat_feds.pop(str(chat_id), None)
+        self._chat_fbans.pop(str(chat_id), None)
+    
+    def _fban_added(self, fed: Dict, user_id: int):
+        """Add a new fban to the cached ban sets of a federation's chats"""
+        for chat_id in fed['chats']:
+            banned = self._chat_fbans.get(str(chat_id))
+            if banned is not None:
+                banned.add(user_id)
+    
+    def _fban_removed(self, fed: Dict, user_id: int):
+        """Drop a lifted fban from the cached ban sets of a federation's chats"""
+        for chat_id in fed['chats']:
+            banned = self._chat_fbans.get(str(chat_id))
+            # Keep the user if another of the chat's federations bans them too
+            if banned is not None and not self.get_chat_fban(chat_id, user_id):
+                banned.discard(user_id)
+    
+    def join_fed(self, fed_id: str, chat_id: int) -> bool:
+        """Add a chat to a federation"""
+        fed = self.feds.get(fed_id)
+        if fed is None or chat_id in fed['chats']:
+            return False
+        fed['chats'].append(chat_id)
+        self._chat_joined(fed_id, chat_id)
+        self._touch("feds", fed_id, 'chats')
+        return True
+    
+    def leave_fed(self, fed_id: str, chat_id: int) -> bool:
+        """Remove a chat from a federation"""
+        fed = self.feds.get(fed_id)
+        if fed is None or chat_id not in fed['chats']:
+            return False
+        fed['chats'].remove(chat_id)
+        self._chat_left(fed_id, chat_id)
+        self._touch("feds", fed_id, 'chats')
+        return True
+    
+    def get_chat_feds(self, chat_id: int) -> List[str]:
+        """Get the federations a chat belongs to"""
+        return self._chat_feds.get(str(chat_id), [])
+    
+    def _chat_fban_set(self, key: str) -> set:
+        """Get the IDs banned by any federation of a chat"""
+        banned = self._chat_fbans.get(key)
+        if banned is None:
+            banned = set()
+            for fed_id in self._chat_feds.get(key, []):
+                banned.update(self.feds[fed_id]['fbans'].ids())
+            self._chat_fbans[key] = banned
+        return banned
+    
+    def is_fbanned_in_chat(self, chat_id: int, user_id: int) -> bool:
+        """Check if any federation of a chat bans a user"""
+        key = str(chat_id)
+        if key not in self._chat_feds:
+            return False
+        return user_id in self._chat_fban_set(key)
+    
+    def get_chat_fban(self, chat_id: int, user_id: int) -> Optional[Tuple[str, Dict]]:
+        """Get the first of a chat's federations banning a user, and the ban"""
+        for fed_id in self._chat_feds.get(str(chat_id), []):
+            fbans = self.feds[fed_id]['fbans']
+            if fbans.contains_id(user_id):
+                return fed_id, fbans[str(user_id)]
+        return None
+    
+    # ===== FEDERATION BAN QUEUE =====
+    def add_fed_job(self, fed_id: str, user_id: int, action: str, chat_ids: List[int], shard: int = 0) -> str:
+        """Queue a ban/unban of a user in every listed chat, run by one shard"""
+        job_id = f"{fed_id}:{user_id}:{int(datetime.now().timestamp() * 1000)}"
+        self.fed_queue[job_id] = {
+            'shard': shard,
+            'fed_id': fed_id,
+            'user_id': user_id,
+            'action': action,
+            'total': len(chat_ids),
+            'failed': 0,
+            'pending': {str(chat_id): 0 for chat_id in chat_ids},
+            'created_at': datetime.now().isoformat()
+        }
+        self._touch("fed_queue", job_id)
+        return job_id
+    
+    def finish_fed_job_chat(self, job_id: str, chat_id: int, failed: bool = False):
+        """Mark one chat of a queued job as done (or given up on)"""
+        job = self.fed_queue.get(job_id)
+        if job is None or job['pending'].pop(str(chat_id), None) is None:
+            return
+        if failed:
+            job['failed'] += 1
+        self._touch("fed_queue", job_id, 'pending', str(chat_id))
+    
+    def retry_fed_job_chat(self, job_id: str, chat_id: int) -> int:
+        """Count a failed attempt for one chat; returns the attempts so far"""
+        job = self.fed_queue.get(job_id)
+        if job is None or str(chat_id) not in job['pending']:
+            return 0
+        job['pending'][str(chat_id)] += 1
+        self._touch("fed_queue", job_id, 'pending', str(chat_id))
+        return job['pending'][str(chat_id)]
+    
+    def remove_fed_job(self, job_id: str):
+        """Drop a finished job"""
+        if self.fed_queue.pop(job_id, None) is not None:
+            self._touch("fed_queue", job_id)
     
     # ===== CONNECTIONS =====
     def add_connection(self, user_id: int, chat_id: int, chat_title: str = ""):
@@ -364,7 +1067,7 @@ class DataManager:
         if len(self.connections[user_id]) > 5:
             self.connections[user_id] = self.connections[user_id][-5:]
         
-        self.save_connections()
+        self._touch("connections", user_id)
     
     def remove_connection(self, user_id: int, chat_id: int = 0) -> bool:
         """Remove a connection"""
@@ -382,7 +1085,7 @@ class DataManager:
                 if not self.connections[user_id]:
                     del self.connections[user_id]
             
-            self.save_connections()
+            self._touch("connections", user_id)
             return True
         return False
     
@@ -391,28 +1094,516 @@ class DataManager:
         return self.connections.get(str(user_id), [])
     
     def save_connections(self):
-        """Save connections to file"""
-        self._save_json("connections.json", self.connections)
+        """Schedule all connections for the next flush"""
+        self._touch("connections")
+    
+    # ===== AUTO-DELETE =====
+    def add_pending_delete(self, chat_id: int, message_id: int, due: float):
+        """Remember a bot message to delete at a unix time"""
+        chat_id = str(chat_id)
+        if chat_id not in self.pending_deletes:
+            self.pending_deletes[chat_id] = {}
+        self.pending_deletes[chat_id][str(message_id)] = due
+        self._touch("pending_deletes", chat_id, str(message_id))
+    
+    def remove_pending_deletes(self, chat_id: int, message_ids: List[int]):
+        """Forget messages that were deleted"""
+        chat_id = str(chat_id)
+        pending = self.pending_deletes.get(chat_id)
+        if not pending:
+            return
+        for message_id in message_ids:
+            if pending.pop(str(message_id), None) is not None:
+                self._touch("pending_deletes", chat_id, str(message_id))
+        if not pending:
+            del self.pending_deletes[chat_id]
     
     # ===== UTILITY =====
+    def _index_sudo(self):
+        """Build the set of users made sudo with /addsudo"""
+        self._sudo_ids = {int(user_id) for user_id, user in self.users.items() if user.get('sudo')}
+    
+    def _sudo_index(self, user_id: int, user: Optional[Dict]):
+        """Keep one user's entry in the sudo set current"""
+        if user and user.get('sudo'):
+            self._sudo_ids.add(user_id)
+        else:
+            self._sudo_ids.discard(user_id)
+    
+    def is_sudo_user(self, user_id: int) -> bool:
+        """Check if a user was made sudo with /addsudo"""
+        return user_id in self._sudo_ids
+    
     def get_all_sudo_users(self) -> List[int]:
         """Get all sudo users"""
-        sudo_users = []
-        for user_id, user_data in self.users.items():
-            if user_data.get('sudo'):
-                sudo_users.append(int(user_id))
-        return sudo_users
+        return sorted(self._sudo_ids)
     
     def cleanup(self):
-        """Save all data to files"""
-        self.save_users()
-        self.save_chats()
-        self.save_filters()
-        self.save_notes()
-        self.save_warns()
-        self.save_gbans()
-        self.save_feds()
-        self.save_connections()
+        """Stop the writer and fold all pending data into snapshots"""
+        if self._writer.is_alive():
+            self._jobs.put(None)
+            self._writer.join()
+        self.compact()
+        self._close_storage()
+    
+    def _close_storage(self):
+        """Release file handles"""
+        self._journal.close()
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY, username TEXT, sudo INTEGER NOT NULL DEFAULT 0, data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_sudo ON users (sudo) WHERE sudo = 1;
+CREATE INDEX IF NOT EXISTS users_username ON users (username COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS chats (id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS filters (
+    chat_id INTEGER, keyword TEXT, data TEXT NOT NULL, PRIMARY KEY (chat_id, keyword)
+);
+CREATE TABLE IF NOT EXISTS notes (
+    chat_id INTEGER, name TEXT, data TEXT NOT NULL, PRIMARY KEY (chat_id, name)
+);
+CREATE TABLE IF NOT EXISTS warns (
+    chat_id INTEGER, id TEXT, user_id INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (chat_id, id)
+);
+CREATE INDEX IF NOT EXISTS warns_chat_user ON warns (chat_id, user_id);
+CREATE TABLE IF NOT EXISTS gbans (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS feds (id TEXT PRIMARY KEY, owner_id INTEGER, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS fed_bans (
+    fed_id TEXT, user_id INTEGER, data TEXT NOT NULL, PRIMARY KEY (fed_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS fed_bans_user ON fed_bans (user_id);
+CREATE TABLE IF NOT EXISTS connections (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS fed_queue (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS pending_deletes (
+    chat_id INTEGER, message_id INTEGER, data TEXT NOT NULL, PRIMARY KEY (chat_id, message_id)
+);
+"""
+
+# store -> (table, key columns, derived columns); a store path as deep as the
+# key columns maps to exactly one row
+_SQLITE_TABLES = {
+    "users": ("users", ("id",), ("username", "sudo")),
+    "chats": ("chats", ("id",), ()),
+    "filters": ("filters", ("chat_id", "keyword"), ()),
+    "notes": ("notes", ("chat_id", "name"), ()),
+    "warns": ("warns", ("chat_id", "id"), ("user_id",)),
+    "gbans": ("gbans", ("user_id",), ()),
+    "feds": ("feds", ("id",), ("owner_id",)),
+    "fbans": ("fed_bans", ("fed_id", "user_id"), ()),
+    "connections": ("connections", ("user_id",), ()),
+    "pending_deletes": ("pending_deletes", ("chat_id", "message_id"), ()),
+    "fed_queue": ("fed_queue", ("id",), ()),
+}
+
+class SQLiteDataManager(DataManager):
+    """SQLite-backed data storage manager
+    
+    Keeps the same in-memory stores, indexes and API as DataManager, but
+    persists each touched path as a single-row upsert in a WAL-mode
+    database. Lookups are answered from memory, never by a query on the
+    event loop.
+    """
+    
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or config.Config.SQLITE_PATH
+        # store -> reload in progress, see _reload_store
+        self._reloading: Dict[str, Dict[str, Any]] = {}
+        super().__init__()
+    
+    def _load_stores(self):
+        """Open the database, migrating JSON data on first start"""
+        self._journal_path = os.path.join(self.data_dir, JOURNAL_FILE)
+        self._db_lock = threading.Lock()
+        # Shards share the file, so wait out each other's write transactions
+        self._db = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SQLITE_SCHEMA)
+        
+        if self._meta("migrated_from_json") is None:
+            self.migrate_from_json()
+        
+        for store in STORES:
+            setattr(self, store, {})
+        for store in (*STORES, "fbans"):
+            self._load_table(store, self.feds if store == "fbans" else getattr(self, store))
+        self._adopt_banlists()
+    
+    def _load_table(self, store: str, target: Dict):
+        """Read a table store's rows into an empty dict (the feds, for fbans)"""
+        table, keys, _ = _SQLITE_TABLES[store]
+        rows = self._db.execute(f"SELECT {', '.join(keys)}, data FROM {table} ORDER BY rowid")
+        for row in rows:
+            *key_values, payload = row
+            value = json.loads(payload)
+            if store == "fbans":
+                fed = target.get(str(key_values[0]))
+                if fed is not None:
+                    fed['fbans'][str(key_values[1])] = value
+                continue
+            node = target
+            for key in key_values[:-1]:
+                node = node.setdefault(str(key), {})
+            node[str(key_values[-1])] = value
+            if store == "feds":
+                value['fbans'] = {}
+    
+    def _meta(self, key: str) -> Optional[str]:
+        """Get a value from the meta table"""
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def migrate_from_json(self):
+        """Import data/*.json snapshots and journal into the database once"""
+        for store in STORES:
+            setattr(self, store, self._load_json(f"{store}.json", {}))
+        self._load_banlists()
+        self._replay_journal()
+        self._adopt_banlists()
+        
+        statements = []
+        for store in STORES:
+            statements.extend(self._replace_rows(store, ()))
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            for sql, params in statements:
+                self._db.execute(sql, params)
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+                (datetime.now().isoformat(),)
+            )
+            self._db.execute("COMMIT")
+        
+        counts = ", ".join(f"{len(getattr(self, store))} {store}" for store in STORES)
+        logger.info(f"Migrated JSON data into {self.db_path}: {counts}")
+    
+    # ===== ROW MAPPING =====
+    def _row_store(self, store: str, path: Tuple[str, ...]) -> Tuple[str, Tuple[str, ...]]:
+        """Map a journal path onto the table store and row path it lives in"""
+        if store == "feds" and len(path) >= 3 and path[1] == 'fbans':
+            return "fbans", (path[0], path[2])
+        depth = len(_SQLITE_TABLES[store][1])
+        return store, path[:depth]
+    
+    def _row_params(self, store: str, keys: Tuple[str, ...], value: Dict) -> tuple:
+        """Build the column values for one row"""
+        if store == "users":
+            derived = (value.get('username') or '', 1 if value.get('sudo') else 0)
+        elif store == "warns":
+            derived = (value.get('user_id'),)
+        elif store == "feds":
+            derived = (value.get('owner_id'),)
+            value = {k: v for k, v in value.items() if k != 'fbans'}
+        else:
+            derived = ()
+        return (*keys, *derived, json.dumps(value, ensure_ascii=False, default=_json_default))
+    
+    def _upsert_sql(self, store: str) -> str:
+        """Build the upsert statement for a table store"""
+        table, keys, derived = _SQLITE_TABLES[store]
+        columns = (*keys, *derived, "data")
+        updates = ", ".join(f"{c} = excluded.{c}" for c in (*derived, "data"))
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}"
+        )
+    
+    def _delete_sql(self, store: str, depth: int) -> str:
+        """Build a delete for every row under a key prefix of the given depth"""
+        table, keys, _ = _SQLITE_TABLES[store]
+        where = " AND ".join(f"{k} = ?" for k in keys[:depth])
+        return f"DELETE FROM {table}" + (f" WHERE {where}" if where else "")
+    
+    def _iter_rows(self, store: str, prefix: Tuple[str, ...], node, depth: int):
+        """Yield (keys, value) for every row in a subtree"""
+        if len(prefix) == depth:
+            yield prefix, node
+            return
+        if isinstance(node, MutableMapping):
+            for key, child in node.items():
+                yield from self._iter_rows(store, prefix + (str(key),), child, depth)
+    
+    def _replace_rows(self, store: str, path: Tuple[str, ...]) -> List[Tuple[str, tuple]]:
+        """Statements that rewrite every row under a store path"""
+        statements = [(self._delete_sql(store, len(path)), path)]
+        if store == "feds":
+            statements.append((self._delete_sql("fbans", len(path)), path))
+        
+        subtree = self._resolve(store, path)
+        if subtree is MISSING:
+            return statements
+        
+        depth = len(_SQLITE_TABLES[store][1])
+        upsert = self._upsert_sql(store)
+        for keys, value in self._iter_rows(store, path, subtree, depth):
+            statements.append((upsert, self._row_params(store, keys, value)))
+            if store == "feds":
+                fban_upsert = self._upsert_sql("fbans")
+                for user_id, fban in value.get('fbans', {}).items():
+                    statements.append((fban_upsert, self._row_params("fbans", (keys[0], user_id), fban)))
+        return statements
+    
+    # ===== REPLICATION =====
+    def set_replication(self, stores: Iterable[str], publish: Callable[[List[str]], None]):
+        """Publish every persisted change to `stores` as journal lines
+        
+        Used when several processes share the database: each applies the
+        others' lines with apply_replica. publish is called on the writer
+        thread after the change is committed.
+        """
+        self._replicated = frozenset(stores)
+        self._publish = publish
+    
+    def apply_replica(self, lines: List[str]):
+        """Apply changes another process already persisted (on the event loop)"""
+        reindex = set()
+        # Under the lock so the writer never serializes a half-applied store
+        with self._lock:
+            for line in lines:
+                record = json.loads(line)
+                store, path = record['s'], record['p']
+                if store not in STORES:
+                    continue
+                reload = self._reloading.get(store)
+                if record.get('reload'):
+                    if reload is None:
+                        reload = self._reloading[store] = {'records': [], 'touched': set(), 'again': False}
+                        reload['task'] = asyncio.ensure_future(self._reload_store(store))
+                    else:
+                        # The read under way may predate this bulk change
+                        reload['again'] = True
+                    continue
+                
+                value = record.get('v', MISSING)
+                if reload is not None:
+                    # Replayed on top of the re-read store
+                    reload['records'].append((path, value))
+                elif store == "feds" and path:
+                    self._apply_fed_record(path, value)
+                else:
+                    self._apply_record(store, path, value)
+                    self._index_record(store, path, value, reindex)
+            self._reindex(reindex)
+    
+    def _index_record(self, store: str, path: List[str], value, reindex: set):
+        """Update the indexes for one applied record, or note what to rebuild"""
+        if store == "users" and len(path) == 1:
+            user = None if value is MISSING else value
+            if user and user.get('username'):
+                self._usernames[user['username'].lower()] = int(path[0])
+            self._sudo_index(int(path[0]), user)
+        elif store == "gbans" and len(path) == 1:
+            if value is MISSING:
+                self._gban_ids.discard(int(path[0]))
+            elif self._gban_bloom is not None:
+                self._gban_bloom.add(int(path[0]))
+            else:
+                self._gban_ids.add(int(path[0]))
+        elif store in ("users", "gbans", "feds"):
+            reindex.add(store)
+    
+    def _apply_fed_record(self, path: List[str], value):
+        """Apply one federation record, patching the chat indexes like local changes do"""
+        fed_id = path[0]
+        fed = self.feds.get(fed_id)
+        if len(path) == 1:
+            if fed is not None:
+                for chat_id in fed['chats']:
+                    self._chat_left(fed_id, chat_id)
+                del self.feds[fed_id]
+            if value is not MISSING:
+                value['fbans'] = BanList.from_mapping(value.get('fbans') or {})
+                self.feds[fed_id] = value
+                for chat_id in value.get('chats', []):
+                    self._chat_joined(fed_id, chat_id)
+        elif fed is None:
+            return
+        elif path[1] == 'fbans' and len(path) == 3:
+            user_id = path[2]
+            if value is MISSING:
+                if user_id in fed['fbans']:
+                    del fed['fbans'][user_id]
+                    self._fban_removed(fed, int(user_id))
+            else:
+                fed['fbans'][user_id] = value
+                self._fban_added(fed, int(user_id))
+        elif path[1] == 'chats' and len(path) == 2:
+            chats = [] if value is MISSING else value
+            for chat_id in [c for c in fed['chats'] if c not in chats]:
+                fed['chats'].remove(chat_id)
+                self._chat_left(fed_id, chat_id)
+            for chat_id in [c for c in chats if c not in fed['chats']]:
+                fed['chats'].append(chat_id)
+                self._chat_joined(fed_id, chat_id)
+        else:
+            self._apply_record("feds", path, value)
+    
+    def _reindex(self, stores: set):
+        """Rebuild the indexes of stores changed beyond single records"""
+        if "gbans" in stores or "feds" in stores:
+            self._adopt_banlists()
+        if "users" in stores:
+            self._index_usernames()
+            self._index_sudo()
+        if "gbans" in stores:
+            self._index_gbans()
+        if "feds" in stores:
+            self._index_fed_chats()
+    
+    def _touch(self, store: str, *path):
+        """Record a change, remembering it if its store is being re-read"""
+        reload = self._reloading.get(store)
+        if reload is not None:
+            reload['touched'].add(tuple(str(p) for p in path))
+        super()._touch(store, *path)
+    
+    async def _reload_store(self, store: str):
+        """Re-read a bulk-changed store on the writer and swap it in
+        
+        Reading, building ban lists and the gban index all happen on the
+        writer thread; the event loop only swaps the result in, then
+        replays the records that arrived and the local changes made while
+        the store was being read.
+        """
+        while True:
+            try:
+                fresh, gban_index = await asyncio.wrap_future(self.submit(self._read_store, store))
+            except Exception as e:
+                # Keep the store we have, with what arrived since
+                logger.error(f"Failed to re-read {store}: {e}")
+                fresh = gban_index = None
+            
+            with self._lock:
+                reload = self._reloading[store]
+                carried = [(list(path), self._resolve(store, path)) for path in reload['touched']]
+                
+                reindex = set()
+                if fresh is not None:
+                    setattr(self, store, fresh)
+                    if store == "gbans":
+                        self._gban_ids, self._gban_bloom = gban_index
+                    elif store in ("users", "feds"):
+                        reindex.add(store)
+                for path, value in reload['records'] + carried:
+                    self._apply_record(store, path, value)
+                    self._index_record(store, path, value, reindex)
+                self._reindex(reindex)
+                
+                if fresh is None or not reload['again']:
+                    del self._reloading[store]
+                    return
+                reload.update(records=[], touched=set(), again=False)
+    
+    def _read_store(self, store: str) -> Tuple[Any, Optional[Tuple[set, Optional[BloomFilter]]]]:
+        """Read a whole store into new objects (on the writer thread)"""
+        # Our own pending changes go in first, so the read includes them
+        self.flush()
+        fresh: Dict = {}
+        with self._db_lock:
+            self._load_table(store, fresh)
+            if store == "feds":
+                self._load_table("fbans", fresh)
+        
+        if store == "feds":
+            for fed in fresh.values():
+                fed['fbans'] = BanList.from_mapping(fed['fbans'])
+        if store == "gbans":
+            fresh = BanList.from_mapping(fresh)
+            return fresh, self._gban_index(fresh)
+        return fresh, None
+    
+    # ===== PERSISTENCE HOOKS =====
+    def _encode_records(self, records: List[Tuple[str, Tuple[str, ...], Any]]) -> List[Tuple[str, tuple]]:
+        """Turn touched paths into row upserts and deletes"""
+        statements = []
+        written = set()
+        for store, path, _ in records:
+            table_store, row_path = self._row_store(store, path)
+            depth = len(_SQLITE_TABLES[table_store][1])
+            
+            if len(row_path) < depth:
+                statements.extend(self._replace_rows(store, row_path))
+                continue
+            
+            # Several touched paths inside one row need only one write
+            if (table_store, row_path) in written:
+                continue
+            written.add((table_store, row_path))
+            
+            if table_store == "fbans":
+                value = self._resolve("feds", (row_path[0], 'fbans', row_path[1]))
+            else:
+                value = self._resolve(store, row_path)
+            
+            if value is MISSING:
+                statements.append((self._delete_sql(table_store, depth), row_path))
+                if table_store == "feds":
+                    statements.append((self._delete_sql("fbans", 1), row_path))
+            else:
+                statements.append((self._upsert_sql(table_store), self._row_params(table_store, row_path, value)))
+        return statements
+    
+    def _write_records(self, statements: List[Tuple[str, tuple]]):
+        """Apply a batch of row statements in one transaction"""
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            try:
+                for sql, params in statements:
+                    self._db.execute(sql, params)
+                self._db.execute("COMMIT")
+            except Exception:
+                # COMMIT itself can fail (e.g. busy); leave no transaction open
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+    
+    def _needs_compaction(self) -> bool:
+        """SQLite checkpoints its own WAL"""
+        return False
+    
+    def _commit_bulk(self, store: str, path: Tuple[str, ...]):
+        """Upsert the bans a bulk import added, in batched transactions
+        
+        Only the imported rows are written: rows other processes added
+        that we have not received yet must survive the import.
+        """
+        self.flush()
+        with self._lock:
+            keys = self._bulk_keys.pop((store, path), [])
+        table_store = "fbans" if store == "feds" else store
+        upsert = self._upsert_sql(table_store)
+        for start in range(0, len(keys), BULK_BATCH_ROWS):
+            statements = []
+            with self._lock:
+                for key in keys[start:start + BULK_BATCH_ROWS]:
+                    ban = self._resolve(store, path + ('fbans', key) if store == "feds" else (key,))
+                    # Lifted since the import; that delete was written on its own
+                    if ban is not MISSING:
+                        statements.append((upsert, self._row_params(table_store, path + (key,), ban)))
+            self._write_records(statements)
+        if store in self._replicated:
+            # Too big to ship as records; other processes re-read the store
+            self._publish([json.dumps({'s': store, 'p': [], 'reload': True}) + "\n"])
+    
+    def compact(self):
+        """Flush pending rows and truncate the WAL"""
+        self.flush()
+        with self._db_lock:
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    
+    def _close_storage(self):
+        """Close the database"""
+        with self._db_lock:
+            self._db.close()
+
+def create_data_manager() -> DataManager:
+    """Create the data manager selected by STORAGE_BACKEND"""
+    if config.Config.STORAGE_BACKEND == "sqlite":
+        return SQLiteDataManager()
+    return DataManager()
 
 # Global data manager instance
-data = DataManager()
+data = create_data_manager()
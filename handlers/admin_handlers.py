@@ -1,14 +1,30 @@
-import re
 import html
+import asyncio
+import logging
+import os
+import tempfile
 from datetime import datetime, timedelta
+from itertools import islice
 from typing import Optional, List, Dict, Any
 
-from telegram import Update, ChatPermissions
+from telegram import Update, ChatPermissions, Document, Message
+from telegram.error import Forbidden
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 
 import config
-from data_manager import data
+from database import data
+from utils.admin_cache import admin_cache
+from utils.banio import FORMATS, BanReader, detect_format, export_bans, import_bans
+from utils.cleaner import cleaner
+from utils.deleter import delete_messages_batched
+from utils.fedprop import fed_propagator
+from utils.locks import lock_enforcer
+from utils.matcher import MatcherCache
+from utils.pipeline import MessageContext
+from utils.sender import Priority, sender
+from utils.templates import Template, TemplateCache, TemplateError, compile_template
+from utils.welcome import JoinBatcher, member_counts
 from utils.helpers import (
     extract_user_id, 
     is_admin, 
@@ -18,11 +34,25 @@ from utils.helpers import (
     parse_time
 )
 
+logger = logging.getLogger(__name__)
+
 class AdminCommands:
     """All admin command handlers"""
     
+    def __init__(self):
+        # Compiled filter keyword matchers, one per recently active chat
+        self._filter_matchers = MatcherCache(config.Config.FILTER_CACHE_SIZE)
+        # Compiled welcome/goodbye templates
+        self._templates = TemplateCache(config.Config.TEMPLATE_CACHE_SIZE)
+        # Pending welcomes, one batch per chat
+        self._welcomes = JoinBatcher(
+            config.Config.WELCOME_BATCH_WINDOW,
+            config.Config.WELCOME_DEDUPE_TTL,
+            self._send_welcome
+        )
+    
     # ===== HELPER METHODS =====
-    def _check_admin(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
+    async def _check_admin(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
         """Check if user is admin"""
         user_id = update.effective_user.id
         chat_id = update.effective_chat.id
@@ -33,10 +63,15 @@ class AdminCommands:
         
         # Check if admin in chat
         if chat_id and update.effective_chat.type != "private":
-            return is_admin(chat_id, user_id, context)
+            return await is_admin(chat_id, user_id, context)
         
         return False
     
+    async def _reply(self, update: Update, text: str, clean: Optional[str] = None, **kwargs):
+        """Reply and schedule the reply for deletion if the chat cleans its type"""
+        on_sent = (lambda message: cleaner.register(message, clean)) if clean else None
+        await sender.reply(update.effective_message, text, on_sent=on_sent, **kwargs)
+    
     def _check_owner(self, update: Update) -> bool:
         """Check if user is owner"""
         return is_owner(update.effective_user.id)
@@ -47,21 +82,12 @@ class AdminCommands:
     
     def _get_target_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
         """Extract target user from command"""
-        if update.message.reply_to_message:
-            return update.message.reply_to_message.from_user.id
+        if update.effective_message.reply_to_message:
+            return update.effective_message.reply_to_message.from_user.id
         
         if context.args:
-            # Try to extract user ID
-            target = extract_user_id(context.args[0])
-            if target:
-                return target
-            
-            # Check for username
-            match = re.match(r'^@(\w+)$', context.args[0])
-            if match:
-                # In real implementation, you'd resolve username to ID
-                # For now, return None
-                return None
+            # Numeric ID or a known @username
+            return extract_user_id(context.args[0])
         
         return None
     
@@ -69,61 +95,59 @@ class AdminCommands:
     async def add_sudo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Add user to sudo: /addsudo [user]"""
         if not self._check_owner(update):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if not context.args:
-            await update.message.reply_text("Usage: /addsudo [user_id/username/reply]")
+            await sender.reply(update.effective_message, "Usage: /addsudo [user_id/username/reply]")
             return
         
         target = self._get_target_user(update, context)
         if not target:
-            await update.message.reply_text("❌ Invalid user specified!")
+            await sender.reply(update.effective_message, "❌ Invalid user specified!")
             return
         
-        # Add to sudo
+        # Add to sudo; is_sudo reads the users store, which every shard sees
         data.update_user(target, sudo=True)
+        await data.durable()
         
-        # Add to config SUDO_USERS if not already
-        if target not in config.Config.SUDO_USERS:
-            config.Config.SUDO_USERS.append(target)
-        
-        await update.message.reply_text(f"✅ User {target} added to sudo!")
+        await sender.reply(update.effective_message, f"✅ User {target} added to sudo!")
     
     async def remove_sudo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Remove user from sudo: /rmsudo [user]"""
         if not self._check_owner(update):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if not context.args:
-            await update.message.reply_text("Usage: /rmsudo [user_id/username/reply]")
+            await sender.reply(update.effective_message, "Usage: /rmsudo [user_id/username/reply]")
             return
         
         target = self._get_target_user(update, context)
         if not target:
-            await update.message.reply_text("❌ Invalid user specified!")
+            await sender.reply(update.effective_message, "❌ Invalid user specified!")
+            return
+        
+        if target in config.Config.SUDO_USERS:
+            await sender.reply(update.effective_message, f"❌ User {target} is listed in SUDO_USERS; remove them from .env instead!")
             return
         
         # Remove from sudo
         data.update_user(target, sudo=False)
+        await data.durable()
         
-        # Remove from config SUDO_USERS
-        if target in config.Config.SUDO_USERS:
-            config.Config.SUDO_USERS.remove(target)
-        
-        await update.message.reply_text(f"✅ User {target} removed from sudo!")
+        await sender.reply(update.effective_message, f"✅ User {target} removed from sudo!")
     
     async def sudo_list(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """List all sudo users: /sudolist"""
         if not self._check_owner(update):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         sudo_users = data.get_all_sudo_users()
         
         if not sudo_users:
-            await update.message.reply_text("📝 No sudo users.")
+            await sender.reply(update.effective_message, "📝 No sudo users.")
             return
         
         response = "👑 *Sudo Users:*\n\n"
@@ -140,35 +164,37 @@ class AdminCommands:
         if len(sudo_users) > 50:
             response += f"\n... and {len(sudo_users) - 50} more."
         
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
     
     # ===== GLOBAL BAN COMMANDS =====
     async def global_ban(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Globally ban user: /gban [user] [reason]"""
         if not self._check_sudo(update):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if not context.args:
-            await update.message.reply_text("Usage: /gban [user] [reason]")
+            await sender.reply(update.effective_message, "Usage: /gban [user] [reason]")
             return
         
         target = self._get_target_user(update, context)
         if not target:
-            await update.message.reply_text("❌ Invalid user specified!")
+            await sender.reply(update.effective_message, "❌ Invalid user specified!")
             return
         
         reason = " ".join(context.args[1:]) if len(context.args) > 1 else "No reason provided"
         
         # Check if already gbanned
         if data.is_gbanned(target):
-            await update.message.reply_text("❌ User is already globally banned!")
+            await sender.reply(update.effective_message, "❌ User is already globally banned!")
             return
         
         # Add global ban
         data.add_gban(target, reason, update.effective_user.id)
+        await data.durable()
         
-        await update.message.reply_text(
+        await sender.reply(
+            update.effective_message,
             f"✅ User {target} globally banned!\n"
             f"Reason: {reason}"
         )
@@ -176,38 +202,39 @@ class AdminCommands:
     async def global_unban(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Remove global ban: /ungban [user]"""
         if not self._check_sudo(update):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if not context.args:
-            await update.message.reply_text("Usage: /ungban [user]")
+            await sender.reply(update.effective_message, "Usage: /ungban [user]")
             return
         
         target = self._get_target_user(update, context)
         if not target:
-            await update.message.reply_text("❌ Invalid user specified!")
+            await sender.reply(update.effective_message, "❌ Invalid user specified!")
             return
         
         # Remove global ban
         if data.remove_gban(target):
-            await update.message.reply_text(f"✅ User {target} removed from global ban!")
+            await data.durable()
+            await sender.reply(update.effective_message, f"✅ User {target} removed from global ban!")
         else:
-            await update.message.reply_text("❌ User is not globally banned!")
+            await sender.reply(update.effective_message, "❌ User is not globally banned!")
     
     async def gban_list(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """List globally banned users: /gbanlist"""
         if not self._check_sudo(update):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         gbans = data.gbans
         
         if not gbans:
-            await update.message.reply_text("📝 No globally banned users.")
+            await sender.reply(update.effective_message, "📝 No globally banned users.")
             return
         
         response = "🔨 *Globally Banned Users:*\n\n"
-        for user_id, ban_data in list(gbans.items())[:30]:  # Show first 30
+        for user_id, ban_data in islice(gbans.items(), 30):  # Show first 30
             user_data = data.get_user(int(user_id))
             name = user_data.get('first_name', 'Unknown')
             reason = ban_data.get('reason', 'No reason')
@@ -218,23 +245,134 @@ class AdminCommands:
         if len(gbans) > 30:
             response += f"... and {len(gbans) - 30} more."
         
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
+    
+    # ===== BAN LIST IMPORT/EXPORT =====
+    async def import_gbans(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Import global bans from a file: reply to a .csv/.ndjson with /importgbans"""
+        await self._import_bans(update, context, "gbans", None)
+    
+    async def import_fbans(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Import federation bans: reply to a file with /importfbans [fed_id]"""
+        if not context.args:
+            await sender.reply(update.effective_message, "Usage: reply to a file with /importfbans [fed_id]")
+            return
+        await self._import_bans(update, context, "fbans", context.args[0])
+    
+    async def export_gbans(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Export global bans: /exportgbans [csv|ndjson]"""
+        fmt = context.args[0].lower() if context.args else "ndjson"
+        await self._export_bans(update, context, "gbans", None, fmt)
+    
+    async def export_fbans(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Export federation bans: /exportfbans [fed_id] [csv|ndjson]"""
+        if not context.args:
+            await sender.reply(update.effective_message, "Usage: /exportfbans [fed_id] [csv|ndjson]")
+            return
+        fmt = context.args[1].lower() if len(context.args) > 1 else "ndjson"
+        await self._export_bans(update, context, "fbans", context.args[0], fmt)
+    
+    async def _import_bans(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                           kind: str, fed_id: Optional[str]):
+        """Download an attached ban list and stream it into the data manager"""
+        if not self._check_owner(update):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
+            return
+        
+        reply = update.effective_message.reply_to_message
+        document = update.effective_message.document or (reply.document if reply else None)
+        if not document:
+            await sender.reply(update.effective_message, "❌ Reply to a .csv or .ndjson file!")
+            return
+        
+        if kind == "fbans" and fed_id not in data.feds:
+            await sender.reply(update.effective_message, "❌ Federation not found!")
+            return
+        
+        # A long import must not hold this chat's lane
+        context.application.create_task(self._run_import(update, context, kind, fed_id, document), update=update)
+    
+    async def _run_import(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                          kind: str, fed_id: Optional[str], document: Document):
+        """Import a ban list in the background, editing a status message"""
+        status = await sender.reply(update.effective_message, f"⏳ Importing {kind}...", wait=True)
+        started = datetime.now()
+        last_update = [started]
+        
+        def progress(count: int):
+            # Edit the status message at most every few seconds
+            now = datetime.now()
+            if (now - last_update[0]).total_seconds() >= 3:
+                last_update[0] = now
+                sender.post(status.chat_id, lambda: status.edit_text(f"⏳ Imported {count} {kind}..."), Priority.BULK)
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = os.path.join(tmp_dir, "bans")
+                file = await context.bot.get_file(document.file_id)
+                await file.download_to_drive(path)
+                
+                with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+                    reader = BanReader(f, detect_format(document.file_name), update.effective_user.id)
+                    total = await import_bans(kind, reader, fed_id, progress)
+        except Exception as e:
+            logger.error(f"Import of {kind} failed: {e}", exc_info=e)
+            await sender.send(status.chat_id, lambda: status.edit_text(f"❌ Import failed: {e}"))
+            return
+        
+        elapsed = (datetime.now() - started).total_seconds()
+        logger.info(f"Imported {total} {kind} ({reader.skipped} skipped) in {elapsed:.1f}s")
+        await sender.send(status.chat_id, lambda: status.edit_text(
+            f"✅ Imported {total} {kind} in {elapsed:.1f}s\n"
+            f"Skipped {reader.skipped} invalid rows"
+        ))
+    
+    async def _export_bans(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                           kind: str, fed_id: Optional[str], fmt: str):
+        """Stream a ban list to a file and send it as a document"""
+        if not self._check_owner(update):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
+            return
+        
+        if fmt not in FORMATS:
+            await sender.reply(update.effective_message, f"❌ Format must be one of: {', '.join(FORMATS)}")
+            return
+        
+        if kind == "fbans" and fed_id not in data.feds:
+            await sender.reply(update.effective_message, "❌ Federation not found!")
+            return
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = f"{fed_id or kind}.{fmt}"
+            path = os.path.join(tmp_dir, filename)
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                total = export_bans(kind, f, fmt, fed_id)
+            
+            async def send_file():
+                with open(path, 'rb') as f:
+                    return await update.effective_message.reply_document(
+                        f, filename=filename, caption=f"📦 {total} {kind}"
+                    )
+            
+            await sender.send(update.effective_chat.id, send_file)
     
     # ===== FEDERATION COMMANDS =====
     async def new_federation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Create new federation: /newfed [name]"""
         if not self._check_sudo(update):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if not context.args:
-            await update.message.reply_text("Usage: /newfed [name]")
+            await sender.reply(update.effective_message, "Usage: /newfed [name]")
             return
         
         fed_name = " ".join(context.args)
         fed_id = data.create_fed(fed_name, update.effective_user.id)
+        await data.durable()
         
-        await update.message.reply_text(
+        await sender.reply(
+            update.effective_message,
             f"✅ Federation created!\n"
             f"Name: {fed_name}\n"
             f"ID: `{fed_id}`",
@@ -244,32 +382,34 @@ class AdminCommands:
     async def delete_federation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Delete federation: /delfed [fedid]"""
         if not self._check_sudo(update):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if not context.args:
-            await update.message.reply_text("Usage: /delfed [fed_id]")
+            await sender.reply(update.effective_message, "Usage: /delfed [fed_id]")
             return
         
         fed_id = context.args[0]
         
         if data.delete_fed(fed_id, update.effective_user.id):
-            await update.message.reply_text(f"✅ Federation `{fed_id}` deleted!")
+            await data.durable()
+            await sender.reply(update.effective_message, f"✅ Federation `{fed_id}` deleted!")
         else:
-            await update.message.reply_text(
+            await sender.reply(
+                update.effective_message,
                 "❌ Federation not found or you're not the owner!"
             )
     
     async def fed_info(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Get federation info: /fedinfo [fedid]"""
         if not context.args:
-            await update.message.reply_text("Usage: /fedinfo [fed_id]")
+            await sender.reply(update.effective_message, "Usage: /fedinfo [fed_id]")
             return
         
         fed_id = context.args[0]
         
         if fed_id not in data.feds:
-            await update.message.reply_text("❌ Federation not found!")
+            await sender.reply(update.effective_message, "❌ Federation not found!")
             return
         
         fed = data.feds[fed_id]
@@ -285,16 +425,105 @@ class AdminCommands:
             f"• Created: {fed['created_at'][:10]}"
         )
         
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
+    
+    async def join_federation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Join this chat to a federation: /joinfed [fedid]"""
+        if update.effective_chat.type == "private":
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
+            return
+        
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
+            return
+        
+        if not context.args:
+            await sender.reply(update.effective_message, "Usage: /joinfed [fed_id]")
+            return
+        
+        fed_id = context.args[0]
+        
+        if fed_id not in data.feds:
+            await sender.reply(update.effective_message, "❌ Federation not found!")
+            return
+        
+        if data.join_fed(fed_id, update.effective_chat.id):
+            await data.durable()
+            await sender.reply(update.effective_message, f"✅ Chat joined federation {data.feds[fed_id]['name']}!")
+        else:
+            await sender.reply(update.effective_message, "❌ Chat is already in this federation!")
+    
+    async def leave_federation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Leave a federation: /leavefed [fedid]"""
+        if update.effective_chat.type == "private":
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
+            return
+        
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
+            return
+        
+        chat_id = update.effective_chat.id
+        feds = data.get_chat_feds(chat_id)
+        
+        if context.args:
+            fed_id = context.args[0]
+        elif len(feds) == 1:
+            fed_id = feds[0]
+        else:
+            await sender.reply(update.effective_message, "Usage: /leavefed [fed_id]")
+            return
+        
+        if data.leave_fed(fed_id, chat_id):
+            await data.durable()
+            await sender.reply(update.effective_message, f"✅ Chat left federation `{fed_id}`!", parse_mode='Markdown')
+        else:
+            await sender.reply(update.effective_message, "❌ Chat is not in this federation!")
+    
+    async def _propagate_fed_action(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                    fed_id: str, target: int, action: str):
+        """Apply an fban/unfban in the federation's chats, editing a status message"""
+        chats = len(data.feds[fed_id]['chats'])
+        if not chats:
+            return
+        
+        verb = "Banning" if action == "ban" else "Unbanning"
+        # The job starts at once; progress shows up once the status message
+        # is out, without holding this chat's lane until then
+        status: List[Optional[Message]] = [None]
+        latest: List[Optional[str]] = [None]
+        
+        def show(text: str):
+            latest[0] = text
+            message = status[0]
+            if message is not None:
+                sender.post(message.chat_id, lambda: message.edit_text(text), Priority.BULK)
+        
+        def sent(message: Message):
+            status[0] = message
+            if latest[0] is not None:
+                show(latest[0])
+        
+        def progress(done: int, failed: int, total: int, finished: bool):
+            if finished:
+                text = f"✅ Federation {action} of {target} applied in {done - failed}/{total} chats"
+                if failed:
+                    text += f"\n{failed} chats skipped (no rights or bot removed)"
+            else:
+                text = f"⏳ {verb} {target}: {done}/{total} chats..."
+            show(text)
+        
+        await sender.reply(update.effective_message, f"⏳ {verb} {target} in {chats} federation chats...", on_sent=sent)
+        fed_propagator.enqueue(fed_id, target, action, progress)
     
     async def fed_ban(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Ban in federation: /fban [user] [reason]"""
         if not self._check_sudo(update):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if len(context.args) < 2:
-            await update.message.reply_text("Usage: /fban [fed_id] [user] [reason]")
+            await sender.reply(update.effective_message, "Usage: /fban [fed_id] [user] [reason]")
             return
         
         fed_id = context.args[0]
@@ -302,11 +531,11 @@ class AdminCommands:
         reason = " ".join(context.args[2:]) if len(context.args) > 2 else "No reason"
         
         if not target:
-            await update.message.reply_text("❌ Invalid user specified!")
+            await sender.reply(update.effective_message, "❌ Invalid user specified!")
             return
         
         if fed_id not in data.feds:
-            await update.message.reply_text("❌ Federation not found!")
+            await sender.reply(update.effective_message, "❌ Federation not found!")
             return
         
         # Check if user is fed admin or owner
@@ -314,55 +543,57 @@ class AdminCommands:
         user_id = update.effective_user.id
         
         if user_id != fed['owner_id'] and user_id not in fed['admins']:
-            await update.message.reply_text("❌ You're not admin in this federation!")
+            await sender.reply(update.effective_message, "❌ You're not admin in this federation!")
             return
         
         data.add_fban(fed_id, target, reason, user_id)
+        await data.durable()
         
-        await update.message.reply_text(
+        await sender.reply(
+            update.effective_message,
             f"✅ User {target} banned in federation {fed['name']}!\n"
             f"Reason: {reason}"
         )
+        await self._propagate_fed_action(update, context, fed_id, target, "ban")
     
     async def fed_unban(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Unban in federation: /unfban [user]"""
         if not self._check_sudo(update):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if len(context.args) < 2:
-            await update.message.reply_text("Usage: /unfban [fed_id] [user]")
+            await sender.reply(update.effective_message, "Usage: /unfban [fed_id] [user]")
             return
         
         fed_id = context.args[0]
         target = extract_user_id(context.args[1])
         
         if not target:
-            await update.message.reply_text("❌ Invalid user specified!")
+            await sender.reply(update.effective_message, "❌ Invalid user specified!")
             return
         
         if fed_id not in data.feds:
-            await update.message.reply_text("❌ Federation not found!")
+            await sender.reply(update.effective_message, "❌ Federation not found!")
             return
         
         # Remove fban if exists
-        target_str = str(target)
-        if target_str in data.feds[fed_id]['fbans']:
-            del data.feds[fed_id]['fbans'][target_str]
-            data.save_feds()
-            await update.message.reply_text(f"✅ User {target} unbanned from federation!")
+        if data.remove_fban(fed_id, target):
+            await data.durable()
+            await sender.reply(update.effective_message, f"✅ User {target} unbanned from federation!")
+            await self._propagate_fed_action(update, context, fed_id, target, "unban")
         else:
-            await update.message.reply_text("❌ User is not banned in this federation!")
+            await sender.reply(update.effective_message, "❌ User is not banned in this federation!")
     
     # ===== WELCOME/GOODBYE COMMANDS =====
     async def set_welcome(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Set welcome message: /setwelcome [text]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         if not context.args:
@@ -376,30 +607,37 @@ class AdminCommands:
                 "{id} - User's ID\n"
                 "{chat} - Chat title\n"
                 "{count} - Member count\n"
-                "{mention} - Mention the user\n\n"
+                "{mention} - Mention the user\n"
+                "Use {{ and }} for literal braces\n\n"
                 "Example:\n"
                 "/setwelcome Welcome {first} to {chat}!"
             )
-            await update.message.reply_text(help_text)
+            await sender.reply(update.effective_message, help_text)
             return
         
         welcome_text = " ".join(context.args)
         chat_id = update.effective_chat.id
         
-        data.update_chat(chat_id, welcome=welcome_text, welcome_enabled=True)
+        try:
+            template = compile_template(welcome_text)
+        except TemplateError as e:
+            await sender.reply(update.effective_message, f"❌ Invalid welcome message: {e}")
+            return
+        
+        data.update_chat(chat_id, welcome=welcome_text, welcome_tpl=template.segments, welcome_enabled=True)
         
-        await update.message.reply_text("✅ Welcome message set!")
+        await sender.reply(update.effective_message, "✅ Welcome message set!")
     
     async def unset_welcome(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Remove welcome message: /unsetwelcome"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         chat_id = update.effective_chat.id
-        data.update_chat(chat_id, welcome="", welcome_enabled=False)
+        data.update_chat(chat_id, welcome="", welcome_tpl=[], welcome_enabled=False)
         
-        await update.message.reply_text("✅ Welcome message removed!")
+        await sender.reply(update.effective_message, "✅ Welcome message removed!")
     
     async def show_welcome(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show current welcome: /welcome"""
@@ -412,16 +650,16 @@ class AdminCommands:
         else:
             response = "❌ No welcome message set for this chat."
         
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
     
     async def set_goodbye(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Set goodbye message: /setgoodbye [text]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         if not context.args:
@@ -435,30 +673,37 @@ class AdminCommands:
                 "{id} - User's ID\n"
                 "{chat} - Chat title\n"
                 "{count} - Member count\n"
-                "{mention} - Mention the user\n\n"
+                "{mention} - Mention the user\n"
+                "Use {{ and }} for literal braces\n\n"
                 "Example:\n"
                 "/setgoodbye Goodbye {first}!"
             )
-            await update.message.reply_text(help_text)
+            await sender.reply(update.effective_message, help_text)
             return
         
         goodbye_text = " ".join(context.args)
         chat_id = update.effective_chat.id
         
-        data.update_chat(chat_id, goodbye=goodbye_text, goodbye_enabled=True)
+        try:
+            template = compile_template(goodbye_text)
+        except TemplateError as e:
+            await sender.reply(update.effective_message, f"❌ Invalid goodbye message: {e}")
+            return
+        
+        data.update_chat(chat_id, goodbye=goodbye_text, goodbye_tpl=template.segments, goodbye_enabled=True)
         
-        await update.message.reply_text("✅ Goodbye message set!")
+        await sender.reply(update.effective_message, "✅ Goodbye message set!")
     
     async def unset_goodbye(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Remove goodbye message: /unsetgoodbye"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         chat_id = update.effective_chat.id
-        data.update_chat(chat_id, goodbye="", goodbye_enabled=False)
+        data.update_chat(chat_id, goodbye="", goodbye_tpl=[], goodbye_enabled=False)
         
-        await update.message.reply_text("✅ Goodbye message removed!")
+        await sender.reply(update.effective_message, "✅ Goodbye message removed!")
     
     async def show_goodbye(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show current goodbye: /goodbye"""
@@ -471,99 +716,120 @@ class AdminCommands:
         else:
             response = "❌ No goodbye message set for this chat."
         
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
     
-    async def handle_new_members(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def handle_new_members(self, ctx: MessageContext, context: ContextTypes.DEFAULT_TYPE):
         """Handle new chat members (welcome)"""
-        chat_id = update.effective_chat.id
-        chat = data.get_chat(chat_id)
+        message = ctx.update.effective_message
+        if not message or not message.new_chat_members:
+            return
+        members = [member for member in message.new_chat_members if not member.is_bot]
+        member_counts.adjust(ctx.chat_id, len(message.new_chat_members))
+        
+        chat = ctx.chat
+        if not chat or not chat.get('welcome_enabled') or not chat.get('welcome') or not members:
+            return True
         
-        if not chat.get('welcome_enabled') or not chat.get('welcome'):
+        # Joins in quick succession are welcomed together
+        self._welcomes.add(message, members)
+        return True
+    
+    async def _send_welcome(self, message, members: List[Any]):
+        """Send one welcome for a batch of joined members"""
+        chat = data.get_chat(message.chat_id)
+        template = self._templates.get(chat, 'welcome')
+        if not chat.get('welcome_enabled') or not template:
             return
         
-        for member in update.message.new_chat_members:
-            # Don't welcome bots
-            if member.is_bot:
-                continue
-            
-            welcome_text = chat['welcome']
-            
-            # Replace variables
-            replacements = {
-                '{first}': member.first_name,
-                '{last}': member.last_name or '',
-                '{fullname}': member.full_name,
-                '{username}': f"@{member.username}" if member.username else member.first_name,
-                '{id}': str(member.id),
-                '{chat}': update.effective_chat.title,
-                '{count}': str(update.effective_chat.get_member_count()),
-                '{mention}': member.mention_html(member.first_name)
-            }
-            
-            for key, value in replacements.items():
-                welcome_text = welcome_text.replace(key, value)
-            
-            try:
-                await update.message.reply_text(
-                    welcome_text,
-                    parse_mode=ParseMode.HTML,
-                    disable_web_page_preview=True
-                )
-            except Exception as e:
-                print(f"Error sending welcome: {e}")
+        welcome_text = await self._render_greeting(template, message.get_bot(), message.chat, members)
+        
+        # A lone join replies to its service message; a burst gets one post
+        if len(members) == 1:
+            await sender.reply(
+                message,
+                welcome_text,
+                parse_mode=ParseMode.HTML,
+                disable_web_page_preview=True,
+                priority=Priority.BULK
+            )
+        else:
+            await sender.send_message(
+                message.chat_id,
+                welcome_text,
+                parse_mode=ParseMode.HTML,
+                disable_web_page_preview=True,
+                priority=Priority.BULK
+            )
     
-    async def handle_left_members(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def _render_greeting(self, template: Template, bot, tg_chat, members: List[Any]) -> str:
+        """Fill welcome/goodbye variables for one or more members"""
+        shown = members[:config.Config.WELCOME_MAX_NAMES]
+        hidden = len(members) - len(shown)
+        
+        def join(values) -> str:
+            text = ", ".join(values)
+            return f"{text} and {hidden} others" if hidden else text
+        
+        # Only fetch the member count when the template shows it
+        count = None
+        if 'count' in template.fields:
+            count = await member_counts.get(bot, tg_chat.id)
+        
+        return template.render({
+            'first': lambda: join(html.escape(m.first_name) for m in shown),
+            'last': lambda: join(html.escape(m.last_name or '') for m in shown),
+            'fullname': lambda: join(html.escape(m.full_name) for m in shown),
+            'username': lambda: join(f"@{m.username}" if m.username else html.escape(m.first_name) for m in shown),
+            'id': lambda: join(str(m.id) for m in shown),
+            'chat': lambda: html.escape(tg_chat.title or ''),
+            'count': lambda: str(count) if count is not None else '',
+            'mention': lambda: join(m.mention_html(m.first_name) for m in shown)
+        })
+    
+    async def handle_left_members(self, ctx: MessageContext, context: ContextTypes.DEFAULT_TYPE):
         """Handle left chat members (goodbye)"""
-        chat_id = update.effective_chat.id
-        chat = data.get_chat(chat_id)
-        
-        if not chat.get('goodbye_enabled') or not chat.get('goodbye'):
+        message = ctx.update.effective_message
+        if not message or not message.left_chat_member:
             return
+        member = message.left_chat_member
+        member_counts.adjust(ctx.chat_id, -1)
         
-        for member in update.message.left_chat_members:
-            # Don't say goodbye to bots
-            if member.is_bot:
-                continue
-            
-            goodbye_text = chat['goodbye']
-            
-            # Replace variables
-            replacements = {
-                '{first}': member.first_name,
-                '{last}': member.last_name or '',
-                '{fullname}': member.full_name,
-                '{username}': f"@{member.username}" if member.username else member.first_name,
-                '{id}': str(member.id),
-                '{chat}': update.effective_chat.title,
-                '{count}': str(update.effective_chat.get_member_count()),
-                '{mention}': member.mention_html(member.first_name)
-            }
-            
-            for key, value in replacements.items():
-                goodbye_text = goodbye_text.replace(key, value)
-            
-            try:
-                await update.message.reply_text(
-                    goodbye_text,
-                    parse_mode=ParseMode.HTML,
-                    disable_web_page_preview=True
-                )
-            except Exception as e:
-                print(f"Error sending goodbye: {e}")
+        chat = ctx.chat
+        if not chat or not chat.get('goodbye_enabled'):
+            return True
+        template = self._templates.get(chat, 'goodbye')
+        
+        # Don't say goodbye to bots
+        if not template or member.is_bot:
+            return True
+        
+        goodbye_text = await self._render_greeting(template, context.bot, message.chat, [member])
+        
+        try:
+            await sender.reply(
+                message,
+                goodbye_text,
+                parse_mode=ParseMode.HTML,
+                disable_web_page_preview=True,
+                priority=Priority.BULK
+            )
+        except Exception as e:
+            logger.error(f"Error sending goodbye: {e}")
     
     # ===== LOCK COMMANDS =====
     async def lock_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Lock media type: /lock [type]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         if not context.args:
-            await update.message.reply_text(
+            await sender.reply(
+                update.effective_message,
                 "Usage: /lock [type]\n"
                 "Use /locktypes to see available types"
             )
@@ -572,7 +838,8 @@ class AdminCommands:
         lock_type = context.args[0].lower()
         
         if lock_type not in config.Config.LOCK_TYPES:
-            await update.message.reply_text(
+            await sender.reply(
+                update.effective_message,
                 f"❌ Invalid lock type!\n"
                 f"Use /locktypes to see available types"
             )
@@ -585,21 +852,23 @@ class AdminCommands:
         if lock_type not in lock_types:
             lock_types.append(lock_type)
             data.update_chat(chat_id, lock_types=lock_types)
+            lock_enforcer.invalidate(chat_id)
         
-        await update.message.reply_text(f"✅ Locked `{lock_type}`!")
+        await sender.reply(update.effective_message, f"✅ Locked `{lock_type}`!")
     
     async def unlock_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Unlock media type: /unlock [type]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         if not context.args:
-            await update.message.reply_text(
+            await sender.reply(
+                update.effective_message,
                 "Usage: /unlock [type]\n"
                 "Use /locktypes to see available types"
             )
@@ -614,38 +883,41 @@ class AdminCommands:
         if lock_type in lock_types:
             lock_types.remove(lock_type)
             data.update_chat(chat_id, lock_types=lock_types)
+            lock_enforcer.invalidate(chat_id)
         
-        await update.message.reply_text(f"✅ Unlocked `{lock_type}`!")
+        await sender.reply(update.effective_message, f"✅ Unlocked `{lock_type}`!")
     
     async def lock_all(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Lock all media types: /lockall"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         chat_id = update.effective_chat.id
         data.update_chat(chat_id, is_locked=True)
+        lock_enforcer.invalidate(chat_id)
         
-        await update.message.reply_text("✅ All media types locked!")
+        await sender.reply(update.effective_message, "✅ All media types locked!")
     
     async def unlock_all(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Unlock all media types: /unlockall"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         chat_id = update.effective_chat.id
         data.update_chat(chat_id, is_locked=False, lock_types=[])
+        lock_enforcer.invalidate(chat_id)
         
-        await update.message.reply_text("✅ All media types unlocked!")
+        await sender.reply(update.effective_message, "✅ All media types unlocked!")
     
     async def show_locks(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show current locks: /locks"""
@@ -666,7 +938,7 @@ class AdminCommands:
                 response = "🔓 *No active locks.*\n"
                 response += "Use /lock [type] to lock something."
         
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
     
     async def lock_types(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show lockable types: /locktypes"""
@@ -679,13 +951,13 @@ class AdminCommands:
         
         types_text += "\n*Usage:* `/lock [type]` or `/unlock [type]`"
         
-        await update.message.reply_text(types_text, parse_mode='Markdown')
+        await sender.reply(update.effective_message, types_text, parse_mode='Markdown')
     
     # ===== CLEAN MESSAGE COMMANDS (FROM IMAGES) =====
     async def clean_messages(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Auto-delete bot messages: /cleanmsg [type]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if not context.args:
@@ -700,40 +972,72 @@ class AdminCommands:
                 "• `filter` - Filter triggers\n"
                 "• `all` - All of the above\n\n"
                 "*Examples:*\n"
-                "• `/cleanmsg action` - Delete ban messages after 5 min\n"
+                f"• `/cleanmsg action` - Delete ban messages after {format_time(int(config.Config.CLEAN_DELAY))}\n"
                 "• `/cleanmsg all` - Delete all bot messages"
             )
-            await update.message.reply_text(response, parse_mode='Markdown')
+            await sender.reply(update.effective_message, response, parse_mode='Markdown')
             return
         
         msg_type = context.args[0].lower()
         valid_types = config.Config.CLEAN_TYPES + ["all"]
         
         if msg_type not in valid_types:
-            await update.message.reply_text(
+            await sender.reply(
+                update.effective_message,
                 f"❌ Invalid type! Use one of: {', '.join(valid_types)}"
             )
             return
         
-        await update.message.reply_text(
-            f"✅ Bot will delete `{msg_type}` messages after 5 minutes.\n"
+        if update.effective_chat.type == "private":
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
+            return
+        
+        chat_id = update.effective_chat.id
+        chat = data.get_chat(chat_id)
+        added = config.Config.CLEAN_TYPES if msg_type == "all" else [msg_type]
+        clean_types = list(chat.get('clean_types', []))
+        clean_types += [t for t in added if t not in clean_types]
+        data.update_chat(chat_id, clean_types=clean_types)
+        
+        await sender.reply(
+            update.effective_message,
+            f"✅ Bot will delete `{msg_type}` messages after {format_time(int(config.Config.CLEAN_DELAY))}.\n"
             f"Use `/keepmsg {msg_type}` to stop deleting.",
             parse_mode='Markdown'
         )
     
     async def keep_messages(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Stop auto-deleting: /keepmsg [type]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if not context.args:
-            await update.message.reply_text("Usage: /keepmsg [type]\nUse /cleanmsgtypes to see types")
+            await sender.reply(update.effective_message, "Usage: /keepmsg [type]\nUse /cleanmsgtypes to see types")
             return
         
         msg_type = context.args[0].lower()
+        valid_types = config.Config.CLEAN_TYPES + ["all"]
+        
+        if msg_type not in valid_types:
+            await sender.reply(
+                update.effective_message,
+                f"❌ Invalid type! Use one of: {', '.join(valid_types)}"
+            )
+            return
+        
+        if update.effective_chat.type == "private":
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
+            return
         
-        await update.message.reply_text(
+        chat_id = update.effective_chat.id
+        chat = data.get_chat(chat_id)
+        removed = config.Config.CLEAN_TYPES if msg_type == "all" else [msg_type]
+        clean_types = [t for t in chat.get('clean_types', []) if t not in removed]
+        data.update_chat(chat_id, clean_types=clean_types)
+        
+        await sender.reply(
+            update.effective_message,
             f"✅ Bot will stop deleting `{msg_type}` messages.",
             parse_mode='Markdown'
         )
@@ -749,9 +1053,9 @@ class AdminCommands:
             "• `filter` - Filter trigger messages\n"
             "• `all` - All of the above\n\n"
             "*Example:* `/cleanmsg action`\n"
-            "Delete all ban/mute messages after 5 minutes"
+            f"Delete all ban/mute messages after {format_time(int(config.Config.CLEAN_DELAY))}"
         )
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
     
     # ===== CONNECTION COMMANDS (FROM IMAGES) =====
     async def connect_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -765,7 +1069,8 @@ class AdminCommands:
             # Store connection
             data.add_connection(user_id, 0, target)  # 0 for unknown chat_id
             
-            await update.message.reply_text(
+            await sender.reply(
+                update.effective_message,
                 f"✅ Connected to chat: `{target}`\n"
                 f"Use /connection to see info\n"
                 f"Use /disconnect to disconnect",
@@ -793,7 +1098,7 @@ class AdminCommands:
                     
                     response += "\nUse `/connect [chat]` to connect to a new chat."
                 
-                await update.message.reply_text(response, parse_mode='Markdown')
+                await sender.reply(update.effective_message, response, parse_mode='Markdown')
             
             else:
                 # In a group, connect to this chat
@@ -802,7 +1107,8 @@ class AdminCommands:
                 
                 data.add_connection(user_id, chat_id, chat_title)
                 
-                await update.message.reply_text(
+                await sender.reply(
+                    update.effective_message,
                     f"✅ Connected to this chat!\n"
                     f"Chat: {chat_title}\n"
                     f"ID: `{chat_id}`",
@@ -816,10 +1122,10 @@ class AdminCommands:
         if context.args and context.args[0].isdigit():
             chat_id = int(context.args[0])
             data.remove_connection(user_id, chat_id)
-            await update.message.reply_text(f"✅ Disconnected from chat `{chat_id}`!")
+            await sender.reply(update.effective_message, f"✅ Disconnected from chat `{chat_id}`!")
         else:
             data.remove_connection(user_id)
-            await update.message.reply_text("✅ Disconnected from all chats!")
+            await sender.reply(update.effective_message, "✅ Disconnected from all chats!")
     
     async def reconnect_chat(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Reconnect to previous chat: /reconnect"""
@@ -827,13 +1133,14 @@ class AdminCommands:
         connections = data.get_connections(user_id)
         
         if not connections:
-            await update.message.reply_text("❌ No previous connections found!")
+            await sender.reply(update.effective_message, "❌ No previous connections found!")
             return
         
         # Get the last connection
         last_conn = connections[-1]
         
-        await update.message.reply_text(
+        await sender.reply(
+            update.effective_message,
             f"✅ Reconnected to:\n"
             f"Chat: {last_conn.get('chat_title', 'Unknown')}\n"
             f"ID: `{last_conn.get('chat_id', 'Unknown')}`",
@@ -846,7 +1153,8 @@ class AdminCommands:
         connections = data.get_connections(user_id)
         
         if not connections:
-            await update.message.reply_text(
+            await sender.reply(
+                update.effective_message,
                 "📡 *No active connection.*\n"
                 "Use `/connect` to connect to a chat.",
                 parse_mode='Markdown'
@@ -866,22 +1174,22 @@ class AdminCommands:
             "Use `/disconnect` to disconnect"
         )
         
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
     
     # ===== MODERATION COMMANDS =====
     async def ban_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Ban user: /ban [user] [reason]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         target = self._get_target_user(update, context)
         if not target:
-            await update.message.reply_text("❌ Please reply to a user or provide user ID!")
+            await sender.reply(update.effective_message, "❌ Please reply to a user or provide user ID!")
             return
         
         reason = " ".join(context.args[1:]) if context.args and len(context.args) > 1 else "No reason"
@@ -900,24 +1208,24 @@ class AdminCommands:
             if reason != "No reason":
                 response += f"Reason: {reason}"
             
-            await update.message.reply_text(response)
+            await self._reply(update, response, clean="action", priority=Priority.MODERATION)
             
         except Exception as e:
-            await update.message.reply_text(f"❌ Failed to ban user: {e}")
+            await sender.reply(update.effective_message, f"❌ Failed to ban user: {e}")
     
     async def unban_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Unban user: /unban [user]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         target = self._get_target_user(update, context)
         if not target:
-            await update.message.reply_text("❌ Please reply to a user or provide user ID!")
+            await sender.reply(update.effective_message, "❌ Please reply to a user or provide user ID!")
             return
         
         try:
@@ -930,24 +1238,24 @@ class AdminCommands:
             # Update user data
             data.update_user(target, is_banned=False)
             
-            await update.message.reply_text("✅ User unbanned!")
+            await self._reply(update, "✅ User unbanned!", clean="action", priority=Priority.MODERATION)
             
         except Exception as e:
-            await update.message.reply_text(f"❌ Failed to unban user: {e}")
+            await sender.reply(update.effective_message, f"❌ Failed to unban user: {e}")
     
     async def mute_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Mute user: /mute [user] [time]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         target = self._get_target_user(update, context)
         if not target:
-            await update.message.reply_text("❌ Please reply to a user or provide user ID!")
+            await sender.reply(update.effective_message, "❌ Please reply to a user or provide user ID!")
             return
         
         # Parse mute time
@@ -980,24 +1288,24 @@ class AdminCommands:
             if reason != "No reason":
                 response += f"Reason: {reason}"
             
-            await update.message.reply_text(response)
+            await self._reply(update, response, clean="action", priority=Priority.MODERATION)
             
         except Exception as e:
-            await update.message.reply_text(f"❌ Failed to mute user: {e}")
+            await sender.reply(update.effective_message, f"❌ Failed to mute user: {e}")
     
     async def unmute_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Unmute user: /unmute [user]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         target = self._get_target_user(update, context)
         if not target:
-            await update.message.reply_text("❌ Please reply to a user or provide user ID!")
+            await sender.reply(update.effective_message, "❌ Please reply to a user or provide user ID!")
             return
         
         try:
@@ -1012,24 +1320,24 @@ class AdminCommands:
                 )
             )
             
-            await update.message.reply_text("✅ User unmuted!")
+            await self._reply(update, "✅ User unmuted!", clean="action", priority=Priority.MODERATION)
             
         except Exception as e:
-            await update.message.reply_text(f"❌ Failed to unmute user: {e}")
+            await sender.reply(update.effective_message, f"❌ Failed to unmute user: {e}")
     
     async def kick_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Kick user: /kick [user] [reason]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         target = self._get_target_user(update, context)
         if not target:
-            await update.message.reply_text("❌ Please reply to a user or provide user ID!")
+            await sender.reply(update.effective_message, "❌ Please reply to a user or provide user ID!")
             return
         
         reason = " ".join(context.args[1:]) if context.args and len(context.args) > 1 else "No reason"
@@ -1050,24 +1358,24 @@ class AdminCommands:
             if reason != "No reason":
                 response += f"Reason: {reason}"
             
-            await update.message.reply_text(response)
+            await self._reply(update, response, clean="action", priority=Priority.MODERATION)
             
         except Exception as e:
-            await update.message.reply_text(f"❌ Failed to kick user: {e}")
+            await sender.reply(update.effective_message, f"❌ Failed to kick user: {e}")
     
     async def warn_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Warn user: /warn [user] [reason]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         target = self._get_target_user(update, context)
         if not target:
-            await update.message.reply_text("❌ Please reply to a user or provide user ID!")
+            await sender.reply(update.effective_message, "❌ Please reply to a user or provide user ID!")
             return
         
         reason = " ".join(context.args[1:]) if context.args and len(context.args) > 1 else "No reason"
@@ -1080,8 +1388,7 @@ class AdminCommands:
             update.effective_user.id
         )
         
-        user_warns = data.get_user_warns(target, update.effective_chat.id)
-        warn_count = len(user_warns)
+        warn_count = data.count_user_warns(target, update.effective_chat.id)
         
         response = f"⚠️ User warned! ({warn_count}/3)\n"
         if reason:
@@ -1099,56 +1406,57 @@ class AdminCommands:
             except Exception as e:
                 response += f"\n❌ Failed to auto-ban: {e}"
         
-        await update.message.reply_text(response)
+        await self._reply(update, response, clean="warn", priority=Priority.MODERATION)
     
     async def unwarn_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Remove warning: /unwarn [user] [warn_id]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         target = self._get_target_user(update, context)
         if not target:
-            await update.message.reply_text("❌ Please reply to a user or provide user ID!")
+            await sender.reply(update.effective_message, "❌ Please reply to a user or provide user ID!")
             return
         
         # Get all warns for this user
         user_warns = data.get_user_warns(target, update.effective_chat.id)
         
         if not user_warns:
-            await update.message.reply_text("❌ User has no warnings!")
+            await sender.reply(update.effective_message, "❌ User has no warnings!")
             return
         
         # If warn_id provided, remove specific warn
         if context.args and len(context.args) > 1:
             warn_id = context.args[1]
-            if data.remove_warn(warn_id, update.effective_chat.id):
-                await update.message.reply_text(f"✅ Warning removed!")
+            if any(warn['id'] == warn_id for warn in user_warns) and \
+                    data.remove_warn(warn_id, update.effective_chat.id):
+                await self._reply(update, f"✅ Warning removed!", clean="warn", priority=Priority.MODERATION)
             else:
-                await update.message.reply_text("❌ Warning not found!")
+                await sender.reply(update.effective_message, "❌ Warning not found!")
         else:
             # Remove the last warn
             last_warn = user_warns[-1]
             if data.remove_warn(last_warn['id'], update.effective_chat.id):
-                await update.message.reply_text(f"✅ Last warning removed!")
+                await self._reply(update, f"✅ Last warning removed!", clean="warn", priority=Priority.MODERATION)
             else:
-                await update.message.reply_text("❌ Failed to remove warning!")
+                await sender.reply(update.effective_message, "❌ Failed to remove warning!")
     
     async def show_warns(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show user warnings: /warns [user]"""
         target = self._get_target_user(update, context)
         if not target:
-            await update.message.reply_text("❌ Please reply to a user or provide user ID!")
+            await sender.reply(update.effective_message, "❌ Please reply to a user or provide user ID!")
             return
         
         user_warns = data.get_user_warns(target, update.effective_chat.id)
         
         if not user_warns:
-            await update.message.reply_text("✅ User has no warnings!")
+            await sender.reply(update.effective_message, "✅ User has no warnings!")
             return
         
         user_data = data.get_user(target)
@@ -1164,91 +1472,92 @@ class AdminCommands:
         
         response += "Use `/unwarn [user] [warn_id]` to remove a warning."
         
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
     
     async def delete_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Delete message: /del"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
-        if not update.message.reply_to_message:
-            await update.message.reply_text("❌ Reply to a message to delete it!")
+        if not update.effective_message.reply_to_message:
+            await sender.reply(update.effective_message, "❌ Reply to a message to delete it!")
             return
         
         try:
-            await update.message.reply_to_message.delete()
-            await update.message.delete()
+            await update.effective_message.reply_to_message.delete()
+            await update.effective_message.delete()
         except Exception as e:
-            await update.message.reply_text(f"❌ Failed to delete message: {e}")
+            await sender.reply(update.effective_message, f"❌ Failed to delete message: {e}")
     
     async def purge_messages(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Purge messages: /purge [count]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
-        if not update.message.reply_to_message:
-            await update.message.reply_text("❌ Reply to a message to start purge from!")
+        if not update.effective_message.reply_to_message:
+            await sender.reply(update.effective_message, "❌ Reply to a message to start purge from!")
             return
         
         try:
-            count = 50  # Default
+            count = config.Config.PURGE_LIMIT
             if context.args and context.args[0].isdigit():
-                count = min(int(context.args[0]), 100)  # Max 100 messages
+                count = min(int(context.args[0]), count)
             
-            # Get message IDs to delete
-            start_id = update.message.reply_to_message.message_id
-            end_id = update.message.message_id
+            # Delete from the command back to the replied message
+            start_id = update.effective_message.reply_to_message.message_id
+            end_id = update.effective_message.message_id
+            message_ids = range(end_id, max(start_id, end_id - count + 1) - 1, -1)
             
-            # Delete messages in reverse order
-            deleted = 0
-            for msg_id in range(end_id, start_id - 1, -1):
-                try:
-                    await context.bot.delete_message(
-                        chat_id=update.effective_chat.id,
-                        message_id=msg_id
-                    )
-                    deleted += 1
-                    
-                    # Limit to count
-                    if deleted >= count:
-                        break
-                        
-                except:
-                    continue
-            
-            # Send confirmation (will be deleted after 5 seconds)
-            msg = await update.effective_chat.send_message(f"✅ Purged {deleted} messages!")
+            deleted = await delete_messages_batched(
+                context.bot, update.effective_chat.id, message_ids
+            )
             
-            # Delete confirmation after 5 seconds
-            await asyncio.sleep(5)
-            await msg.delete()
+            # Send confirmation and let the job queue remove it
+            await sender.send_message(
+                update.effective_chat.id,
+                f"✅ Purged {deleted} messages!",
+                priority=Priority.MODERATION,
+                on_sent=lambda msg: context.job_queue.run_once(
+                    self._delete_message_job,
+                    5,
+                    data={'chat_id': msg.chat_id, 'message_id': msg.message_id}
+                )
+            )
             
         except Exception as e:
-            await update.message.reply_text(f"❌ Failed to purge messages: {e}")
+            await sender.reply(update.effective_message, f"❌ Failed to purge messages: {e}")
+    
+    async def _delete_message_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Delete a message scheduled with the job queue"""
+        try:
+            await context.bot.delete_message(**context.job.data)
+        except Exception:
+            pass
     
     # ===== FILTER COMMANDS =====
     async def add_filter(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Add filter: /filter [word] [reply]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         if len(context.args) < 2:
-            await update.message.reply_text(
+            await sender.reply(
+                update.effective_message,
                 "Usage: /filter [keyword] [reply text]\n"
                 "Or reply to a message with: /filter [keyword]"
             )
@@ -1256,10 +1565,10 @@ class AdminCommands:
         
         keyword = context.args[0].lower()
         
-        if update.message.reply_to_message:
+        if update.effective_message.reply_to_message:
             # Use replied message content
-            if update.message.reply_to_message.text:
-                content = update.message.reply_to_message.text
+            if update.effective_message.reply_to_message.text:
+                content = update.effective_message.reply_to_message.text
             else:
                 content = "[Media message]"
         else:
@@ -1271,7 +1580,7 @@ class AdminCommands:
         # Check if filter already exists
         existing = data.get_filter(chat_id, keyword)
         if existing:
-            await update.message.reply_text(f"❌ Filter `{keyword}` already exists!")
+            await sender.reply(update.effective_message, f"❌ Filter `{keyword}` already exists!")
             return
         
         # Add filter
@@ -1282,29 +1591,29 @@ class AdminCommands:
             user_id=update.effective_user.id
         )
         
-        await update.message.reply_text(f"✅ Filter `{keyword}` added!")
+        await sender.reply(update.effective_message, f"✅ Filter `{keyword}` added!")
     
     async def remove_filter(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Remove filter: /stop [word]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         if not context.args:
-            await update.message.reply_text("Usage: /stop [keyword]")
+            await sender.reply(update.effective_message, "Usage: /stop [keyword]")
             return
         
         keyword = context.args[0].lower()
         chat_id = update.effective_chat.id
         
         if data.remove_filter(chat_id, keyword):
-            await update.message.reply_text(f"✅ Filter `{keyword}` removed!")
+            await sender.reply(update.effective_message, f"✅ Filter `{keyword}` removed!")
         else:
-            await update.message.reply_text(f"❌ Filter `{keyword}` not found!")
+            await sender.reply(update.effective_message, f"❌ Filter `{keyword}` not found!")
     
     async def list_filters(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """List filters: /filters"""
@@ -1312,7 +1621,7 @@ class AdminCommands:
         filters = data.get_chat_filters(chat_id)
         
         if not filters:
-            await update.message.reply_text("📝 No filters in this chat.")
+            await sender.reply(update.effective_message, "📝 No filters in this chat.")
             return
         
         response = "📝 *Filters in this chat:*\n\n"
@@ -1321,35 +1630,41 @@ class AdminCommands:
         
         response += "\nUse `/filter [word] [reply]` to add more."
         
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
     
-    async def handle_filter_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def handle_filter_message(self, ctx: MessageContext, context: ContextTypes.DEFAULT_TYPE):
         """Handle filter triggers in messages"""
-        chat_id = update.effective_chat.id
-        message_text = update.message.text.lower()
-        
-        filters = data.get_chat_filters(chat_id)
+        message = ctx.update.effective_message
+        if not message or not message.text or ctx.is_command:
+            return
+        filters = data.filters.get(ctx.chat_key)
+        if not filters:
+            return True
         
-        for keyword, filter_data in filters.items():
-            if keyword in message_text:
-                content = filter_data.get('content', '')
-                if content:
-                    await update.message.reply_text(content)
-                break
+        matcher = self._filter_matchers.get(
+            ctx.chat_key, data.filter_generation(ctx.chat_id), filters
+        )
+        keyword = matcher.first_match(message.text.lower())
+        if keyword is not None:
+            content = filters[keyword].get('content', '')
+            if content:
+                await self._reply(ctx.update, content, clean="filter", priority=Priority.BULK)
+        return True
     
     # ===== NOTE COMMANDS =====
     async def save_note(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Save note: /save [name] [content]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         if len(context.args) < 2:
-            await update.message.reply_text(
+            await sender.reply(
+                update.effective_message,
                 "Usage: /save [name] [content]\n"
                 "Or reply to a message with: /save [name]"
             )
@@ -1357,10 +1672,10 @@ class AdminCommands:
         
         name = context.args[0].lower()
         
-        if update.message.reply_to_message:
+        if update.effective_message.reply_to_message:
             # Use replied message content
-            if update.message.reply_to_message.text:
-                content = update.message.reply_to_message.text
+            if update.effective_message.reply_to_message.text:
+                content = update.effective_message.reply_to_message.text
             else:
                 content = "[Media message]"
         else:
@@ -1372,7 +1687,7 @@ class AdminCommands:
         # Check if note already exists
         existing = data.get_note(chat_id, name)
         if existing:
-            await update.message.reply_text(f"❌ Note `{name}` already exists!")
+            await sender.reply(update.effective_message, f"❌ Note `{name}` already exists!")
             return
         
         # Add note
@@ -1383,12 +1698,12 @@ class AdminCommands:
             user_id=update.effective_user.id
         )
         
-        await update.message.reply_text(f"✅ Note `{name}` saved!")
+        await sender.reply(update.effective_message, f"✅ Note `{name}` saved!")
     
     async def get_note(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Get note: /get [name]"""
         if not context.args:
-            await update.message.reply_text("Usage: /get [note_name]")
+            await sender.reply(update.effective_message, "Usage: /get [note_name]")
             return
         
         name = context.args[0].lower()
@@ -1396,33 +1711,33 @@ class AdminCommands:
         
         note = data.get_note(chat_id, name)
         if not note:
-            await update.message.reply_text(f"❌ Note `{name}` not found!")
+            await sender.reply(update.effective_message, f"❌ Note `{name}` not found!")
             return
         
         content = note.get('content', '')
-        await update.message.reply_text(content)
+        await self._reply(update, content, clean="note")
     
     async def clear_note(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Delete note: /clear [name]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         if not context.args:
-            await update.message.reply_text("Usage: /clear [note_name]")
+            await sender.reply(update.effective_message, "Usage: /clear [note_name]")
             return
         
         name = context.args[0].lower()
         chat_id = update.effective_chat.id
         
         if data.remove_note(chat_id, name):
-            await update.message.reply_text(f"✅ Note `{name}` deleted!")
+            await sender.reply(update.effective_message, f"✅ Note `{name}` deleted!")
         else:
-            await update.message.reply_text(f"❌ Note `{name}` not found!")
+            await sender.reply(update.effective_message, f"❌ Note `{name}` not found!")
     
     async def list_notes(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """List notes: /notes"""
@@ -1430,7 +1745,7 @@ class AdminCommands:
         notes = data.get_chat_notes(chat_id)
         
         if not notes:
-            await update.message.reply_text("📝 No notes in this chat.")
+            await sender.reply(update.effective_message, "📝 No notes in this chat.")
             return
         
         response = "📝 *Notes in this chat:*\n\n"
@@ -1439,7 +1754,7 @@ class AdminCommands:
         
         response += "\nUse `/get [name]` to get a note."
         
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
     
     # ===== OTHER COMMANDS =====
     async def show_rules(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1454,20 +1769,20 @@ class AdminCommands:
         else:
             response = "📜 No rules set for this chat.\nAdmins can set rules with /setrules"
         
-        await update.message.reply_text(response, parse_mode='Markdown')
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
     
     async def set_rules(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Set rules: /setrules [text]"""
-        if not self._check_admin(update, context):
-            await update.message.reply_text(config.Messages.NO_PERMISSION)
+        if not await self._check_admin(update, context):
+            await sender.reply(update.effective_message, config.Messages.NO_PERMISSION)
             return
         
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         if not context.args:
-            await update.message.reply_text("Usage: /setrules [rules text]")
+            await sender.reply(update.effective_message, "Usage: /setrules [rules text]")
             return
         
         rules_text = " ".join(context.args)
@@ -1475,16 +1790,17 @@ class AdminCommands:
         
         data.update_chat(chat_id, rules=rules_text)
         
-        await update.message.reply_text("✅ Rules set!")
+        await sender.reply(update.effective_message, "✅ Rules set!")
     
     async def report_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Report user: /report [reason]"""
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
-        if not context.args and not update.message.reply_to_message:
-            await update.message.reply_text(
+        if not context.args and not update.effective_message.reply_to_message:
+            await sender.reply(
+                update.effective_message,
                 "Usage: /report [reason]\n"
                 "Or reply to a message with /report"
             )
@@ -1493,54 +1809,91 @@ class AdminCommands:
         reason = " ".join(context.args) if context.args else "No reason provided"
         reporter = update.effective_user
         
-        if update.message.reply_to_message:
-            target = update.message.reply_to_message.from_user
-            reported_msg = update.message.reply_to_message.text or "[Media message]"
+        if update.effective_message.reply_to_message:
+            target = update.effective_message.reply_to_message.from_user
+            reported_msg = update.effective_message.reply_to_message.text or "[Media message]"
         else:
             target = None
             reported_msg = ""
         
-        # Create report message
+        # Create report message; every field is user-supplied text
+        chat = update.effective_chat
         report_text = (
-            f"🚨 *New Report*\n\n"
-            f"• Chat: {update.effective_chat.title}\n"
-            f"• Chat ID: `{update.effective_chat.id}`\n"
+            f"🚨 <b>New Report</b>\n\n"
+            f"• Chat: {html.escape(chat.title or '')}\n"
+            f"• Chat ID: <code>{chat.id}</code>\n"
             f"• Reporter: {reporter.mention_html(reporter.first_name)}\n"
-            f"• Reporter ID: `{reporter.id}`\n"
+            f"• Reporter ID: <code>{reporter.id}</code>\n"
         )
         
         if target:
             report_text += f"• Reported: {target.mention_html(target.first_name)}\n"
-            report_text += f"• Reported ID: `{target.id}`\n"
+            report_text += f"• Reported ID: <code>{target.id}</code>\n"
         
-        report_text += f"• Reason: {reason}\n"
+        report_text += f"• Reason: {html.escape(reason)}\n"
         
         if reported_msg:
-            report_text += f"• Message: {reported_msg[:200]}..."
+            report_text += f"• Message: {html.escape(reported_msg[:200])}..."
         
-        # Send to admins
-        admins = await update.effective_chat.get_administrators()
-        for admin in admins:
-            try:
-                if admin.user.id != reporter.id:  # Don't send to reporter
-                    await context.bot.send_message(
-                        chat_id=admin.user.id,
-                        text=report_text,
-                        parse_mode=ParseMode.HTML,
-                        disable_web_page_preview=True
-                    )
-            except:
-                pass
+        # Deliver in the background so the reporter isn't kept waiting
+        try:
+            admins = await admin_cache.get_admins(context.bot, chat.id)
+        except Exception as e:
+            logger.warning(f"Could not fetch admins of {chat.id} for a report: {e}")
+            await sender.reply(update.effective_message, "❌ Could not reach the admins, try again later!")
+            return
+        recipients = [
+            user_id for user_id, admin in admins.items()
+            if user_id != reporter.id and not admin.user.is_bot and not data.is_pm_blocked(user_id)
+        ]
+        context.application.create_task(
+            self._deliver_report(chat.id, recipients, report_text, len(admins)),
+            update=update
+        )
         
-        await update.message.reply_text(
+        await self._reply(
+            update,
             "✅ Report sent to admins!",
-            reply_to_message_id=update.message.message_id
+            clean="report",
+            reply_to_message_id=update.effective_message.message_id
+        )
+    
+    async def _deliver_report(self, chat_id: int, recipients: List[int], report_text: str, admin_count: int):
+        """Send a report to every reachable admin at once"""
+        started = datetime.now()
+        results = await asyncio.gather(*(
+            sender.send_message(
+                user_id,
+                report_text,
+                priority=Priority.BULK,
+                wait=True,
+                parse_mode=ParseMode.HTML,
+                disable_web_page_preview=True
+            )
+            for user_id in recipients
+        ), return_exceptions=True)
+        
+        delivered = blocked = failed = 0
+        for user_id, result in zip(recipients, results):
+            if not isinstance(result, Exception):
+                delivered += 1
+            elif isinstance(result, Forbidden):
+                # Never started the bot or blocked it; skip them until they /start
+                data.set_pm_blocked(user_id, True)
+                blocked += 1
+            else:
+                failed += 1
+        
+        elapsed = (datetime.now() - started).total_seconds()
+        logger.info(
+            f"Report in {chat_id}: {delivered} delivered, {blocked} unreachable, {failed} failed, "
+            f"{admin_count - len(recipients)} skipped in {elapsed:.2f}s"
         )
     
     async def chat_settings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show chat settings: /settings"""
         if update.effective_chat.type == "private":
-            await update.message.reply_text(config.Messages.NOT_IN_GROUP)
+            await sender.reply(update.effective_message, config.Messages.NOT_IN_GROUP)
             return
         
         chat_id = update.effective_chat.id
@@ -1580,61 +1933,4 @@ class AdminCommands:
         
         response += "\nUse commands like /setwelcome, /lock, etc. to change settings."
         
-        await update.message.reply_text(response, parse_mode='Markdown')
-
-# Helper functions
-def is_owner(user_id: int) -> bool:
-    """Check if user is owner"""
-    return user_id == config.Config.OWNER_ID
-
-def is_sudo(user_id: int) -> bool:
-    """Check if user is sudo"""
-    return user_id in config.Config.SUDO_USERS or is_owner(user_id)
-
-def extract_user_id(text: str) -> Optional[int]:
-    """Extract user ID from text"""
-    if not text:
-        return None
-    
-    # Check if it's a numeric ID
-    match = re.match(r'^(\d+)$', text)
-    if match:
-        return int(match.group(1))
-    
-    # Check if it's a mention
-    match = re.match(r'^@(\w+)$', text)
-    if match:
-        # In real implementation, resolve username to ID
-        return None
-    
-    return None
-
-def format_time(seconds: int) -> str:
-    """Format seconds to human readable time"""
-    if seconds < 60:
-        return f"{seconds}s"
-    elif seconds < 3600:
-        return f"{seconds//60}m"
-    elif seconds < 86400:
-        return f"{seconds//3600}h"
-    else:
-        return f"{seconds//86400}d"
-
-def parse_time(time_str: str) -> Optional[int]:
-    """Parse time string to seconds"""
-    if not time_str:
-        return None
-    
-    multipliers = {
-        's': 1,
-        'm': 60,
-        'h': 3600,
-        'd': 86400
-    }
-    
-    match = re.match(r'^(\d+)([smhd])$', time_str.lower())
-    if match:
-        value, unit = match.groups()
-        return int(value) * multipliers.get(unit, 1)
-    
-    return None
+        await sender.reply(update.effective_message, response, parse_mode='Markdown')
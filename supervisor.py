@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+🌹 Legend Ultimate Bot - Sharded runner
+Spreads chats over SHARDS worker processes sharing one SQLite database
+"""
+
+import asyncio
+import logging
+import multiprocessing as mp
+import signal
+import sys
+import threading
+from typing import Any, Dict, List, Optional
+
+from telegram import Bot, Update
+from telegram.error import RetryAfter, TelegramError
+
+import config
+from utils.shards import route_key, shard_of
+from utils.webhook import create_webhook_server, register_webhook
+
+logger = logging.getLogger(__name__)
+
+# Seconds between worker liveness checks
+WATCH_INTERVAL = 2
+# Seconds a worker gets to finish its updates and flush on shutdown
+STOP_TIMEOUT = 30
+
+# ===== WORKER =====
+def _worker_main(index: int, count: int, inbox, outbox):
+    """Run one shard: a full bot fed with its chats' updates by the supervisor"""
+    cfg = config.Config
+    cfg.SHARD_INDEX = index
+    cfg.SHARD_COUNT = count
+    # Telegram's limits are per bot, so the shards split them
+    cfg.GLOBAL_SEND_RATE /= count
+    cfg.FED_BAN_RATE /= count
+    # The supervisor tells us when to stop, after the updates we were sent
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    # Imported only now: the data and rate limiters are built on import
+    from bot import LegendBot
+    from database import data
+
+    legend = LegendBot()
+    try:
+        asyncio.run(_serve_shard(legend, index, inbox, outbox))
+    finally:
+        data.cleanup()
+
+async def _serve_shard(legend, index: int, inbox, outbox):
+    """Process updates and replicated changes until told to stop"""
+    from database import SHARED_STORES, data
+
+    app = legend.app
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    data.set_replication(SHARED_STORES, lambda lines: outbox.put(("replica", index, lines)))
+
+    def pump():
+        """Move inbox messages onto the event loop"""
+        while True:
+            kind, payload = inbox.get()
+            if kind == "update":
+                try:
+                    update = Update.de_json(payload, app.bot)
+                except Exception as e:
+                    # One bad payload must not stop the pump
+                    logger.warning(f"Dropped a malformed update: {e}")
+                    continue
+                if update is not None:
+                    loop.call_soon_threadsafe(app.update_queue.put_nowait, update)
+            elif kind == "replica":
+                loop.call_soon_threadsafe(data.apply_replica, payload)
+            elif kind == "stop":
+                loop.call_soon_threadsafe(stop.set)
+                return
+
+    async with app:
+        await legend.post_init(app)
+        await app.start()
+        threading.Thread(target=pump, name=f"shard-{index}-inbox", daemon=True).start()
+        outbox.put(("ready", index, None))
+        try:
+            await stop.wait()
+        finally:
+            await app.stop()
+    await legend.post_shutdown(app)
+
+# ===== SUPERVISOR =====
+class Supervisor:
+    """Receive updates once and hand each to the shard owning its chat
+
+    Every worker is a complete bot that only ever sees the updates of its
+    own chats, so per-chat state (settings, filters, warns, lanes, rate
+    limits) lives in exactly one process. The stores every shard reads in
+    full (users, gbans, feds, connections) are replicated: each worker
+    publishes its committed changes, and the supervisor relays them to
+    the other workers. A worker that dies is restarted and reloads the
+    database; updates still in its old inbox are lost.
+    """
+
+    def __init__(self, count: int):
+        self.count = count
+        self._ctx = mp.get_context("spawn")
+        # One queue each way per worker: a worker killed while holding a
+        # queue's lock must not wedge the other workers
+        self._inboxes: List = [None] * count
+        self._outboxes: List = [None] * count
+        self._relays: List[Optional[threading.Thread]] = [None] * count
+        self._workers: List[Optional[mp.Process]] = [None] * count
+        self._ready = [threading.Event() for _ in range(count)]
+        self._stopping = False
+        self.counters: Dict[str, Any] = {'routed': [0] * count, 'replicated': 0, 'restarts': 0}
+
+    # ===== WORKERS =====
+    def _spawn(self, index: int):
+        """Start (or restart) the worker of a shard with fresh queues"""
+        old = self._inboxes[index]
+        if old is not None:
+            # Undelivered messages for the dead worker must not block our exit
+            old.cancel_join_thread()
+        inbox, outbox = self._ctx.Queue(), self._ctx.Queue()
+        self._inboxes[index], self._outboxes[index] = inbox, outbox
+        self._ready[index].clear()
+
+        relay = threading.Thread(target=self._relay, args=(index, outbox), name=f"shard-{index}-relay", daemon=True)
+        relay.start()
+        self._relays[index] = relay
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.count, inbox, outbox),
+            name=f"shard-{index}"
+        )
+        process.start()
+        self._workers[index] = process
+
+    def _wait_ready(self, index: int):
+        """Block until a worker is serving, or fail if it died first"""
+        while not self._ready[index].wait(1):
+            if not self._workers[index].is_alive():
+                raise RuntimeError(f"Shard {index} exited during startup")
+
+    def _start_workers(self):
+        """Start shard 0 alone, then the others"""
+        # Shard 0 first: a first SQLite start migrates data/*.json, which
+        # must not run in several processes at once
+        self._spawn(0)
+        self._wait_ready(0)
+        for index in range(1, self.count):
+            self._spawn(index)
+        for index in range(1, self.count):
+            self._wait_ready(index)
+        logger.info(f"All {self.count} shards running")
+
+    def _stop_workers(self):
+        """Let every worker drain its inbox and flush, then reap it"""
+        self._stopping = True
+        for inbox in self._inboxes:
+            inbox.put(("stop", None))
+        for index, process in enumerate(self._workers):
+            if process is None:
+                continue
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                logger.warning(f"Shard {index} did not stop in time; terminating it")
+                process.terminate()
+                process.join()
+        for outbox, relay in zip(self._outboxes, self._relays):
+            if outbox is not None:
+                outbox.put(("exit", -1, None))
+                relay.join()
+        for inbox in self._inboxes:
+            if inbox is not None:
+                inbox.cancel_join_thread()
+
+    async def _watch(self):
+        """Restart workers that died"""
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            for index, process in enumerate(self._workers):
+                if self._stopping or process.is_alive():
+                    continue
+                logger.error(f"Shard {index} exited with code {process.exitcode}; restarting it")
+                self.counters['restarts'] += 1
+                # The dead worker's relay keeps waiting on a queue nobody
+                # writes to any more; it is a daemon and holds nothing
+                self._spawn(index)
+
+    def _relay(self, source: int, outbox):
+        """Forward a worker's replicated changes to the other workers"""
+        while True:
+            kind, index, payload = outbox.get()
+            if kind == "replica":
+                self.counters['replicated'] += 1
+                for other, inbox in enumerate(self._inboxes):
+                    if other != source and inbox is not None:
+                        inbox.put(("replica", payload))
+            elif kind == "ready":
+                logger.info(f"Shard {index} ready")
+                self._ready[index].set()
+            elif kind == "exit":
+                return
+
+    # ===== ROUTING =====
+    def route(self, payload: Dict[str, Any]):
+        """Queue a raw update for the shard owning its chat"""
+        index = shard_of(route_key(payload), self.count)
+        self.counters['routed'][index] += 1
+        self._inboxes[index].put(("update", payload))
+
+    async def _poll(self, bot: Bot):
+        """Long-poll getUpdates and route every update"""
+        await bot.delete_webhook(drop_pending_updates=True)
+        offset = None
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=offset,
+                    timeout=30,
+                    read_timeout=40,
+                    allowed_updates=Update.ALL_TYPES
+                )
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                continue
+            except TelegramError as e:
+                logger.warning(f"getUpdates failed: {e}")
+                await asyncio.sleep(3)
+                continue
+            for update in updates:
+                self.route(update.to_dict())
+                offset = update.update_id + 1
+
+    # ===== LIFECYCLE =====
+    async def run(self):
+        """Serve until SIGINT/SIGTERM"""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                # Windows: Ctrl+C still raises KeyboardInterrupt
+                pass
+
+        try:
+            await asyncio.to_thread(self._start_workers)
+            async with Bot(config.Config.BOT_TOKEN) as bot:
+                server = None
+                tasks = [asyncio.create_task(self._watch(), name="shard-watch")]
+                if config.Config.BOT_MODE == "webhook":
+                    server = create_webhook_server(self.route)
+                    await server.start()
+                    await register_webhook(bot)
+                else:
+                    tasks.append(asyncio.create_task(self._poll(bot), name="shard-poll"))
+                logger.info(f"Routing updates to {self.count} shards ({config.Config.BOT_MODE})")
+
+                try:
+                    await stop.wait()
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    if server:
+                        await server.stop()
+        finally:
+            logger.info(f"Shard counters: {self.counters}")
+            await asyncio.to_thread(self._stop_workers)
+
+def main():
+    """Sharded entry point"""
+    logging.basicConfig(
+        format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO,
+        handlers=[
+            logging.FileHandler('supervisor.log', encoding='utf-8'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+    if config.Config.STORAGE_BACKEND != "sqlite":
+        logger.error("Sharding needs STORAGE_BACKEND=sqlite: the shards share one database")
+        sys.exit(1)
+    if config.Config.SHARDS < 1:
+        logger.error("SHARDS must be at least 1")
+        sys.exit(1)
+
+    print("\n" + "="*50)
+    print(f"🌹 LEGEND ULTIMATE BOT - {config.Config.SHARDS} shards")
+    print("="*50 + "\n")
+
+    try:
+        asyncio.run(Supervisor(config.Config.SHARDS).run())
+    except KeyboardInterrupt:
+        logger.info("Supervisor stopped by user")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# config exits without a token, and DATA_DIR is relative to the working
+# directory: give the tests both before anything imports the bot modules
+os.environ.setdefault("BOT_TOKEN", "1:test")
+os.environ.setdefault("OWNER_ID", "1")
+os.chdir(tempfile.mkdtemp(prefix="legend-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+from telegram import ChatMemberOwner, User
+
+from utils.admin_cache import AdminCache
+
+class _Bot:
+    """Counts get_chat_administrators calls; the first one fails"""
+
+    def __init__(self):
+        self.calls = 0
+        self.running = 0
+        self.peak = 0
+
+    async def get_chat_administrators(self, chat_id):
+        self.calls += 1
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(0.05)
+            if self.calls == 1:
+                raise RuntimeError("timed out")
+            return [ChatMemberOwner(User(1, "owner", False), is_anonymous=False)]
+        finally:
+            self.running -= 1
+
+def test_one_fetch_per_chat_at_a_time():
+    async def scenario():
+        cache, bot = AdminCache(ttl=60), _Bot()
+        first = asyncio.create_task(cache.get_admins(bot, -5))
+        second = asyncio.create_task(cache.get_admins(bot, -5))
+        with pytest.raises(RuntimeError):
+            await first
+        # Arrives while the second caller is refetching after the failure
+        third = await cache.get_admins(bot, -5)
+        assert (await second) is third
+        assert bot.peak == 1 and bot.calls == 2
+        assert not cache._refreshes
+
+    asyncio.run(scenario())
@@ -0,0 +1,41 @@
+import json
+
+from database import SQLiteDataManager
+from utils import banio
+
+def _write_rows(path, ids):
+    with open(path, 'w', encoding='utf-8') as f:
+        for user_id in ids:
+            f.write(json.dumps({'user_id': user_id, 'reason': f"spam {user_id}", 'banned_by': 9}) + "\n")
+        f.write("not json\n")
+
+def test_cli_round_trip_on_ban_list_files(tmp_path):
+    data_dir = tmp_path / "data"
+    _write_rows(tmp_path / "in.ndjson", range(1, 1001))
+
+    assert banio.main(["import", "gbans", str(tmp_path / "in.ndjson"), "--data-dir", str(data_dir)]) == 0
+    assert (data_dir / "gbans.bin").exists()
+    assert banio.main(["export", "gbans", str(tmp_path / "out.csv"), "--data-dir", str(data_dir)]) == 0
+
+    lines = (tmp_path / "out.csv").read_text().splitlines()
+    assert lines[0] == "user_id,reason,banned_by,banned_at"
+    assert len(lines) == 1001 and lines[1].startswith("1,spam 1,9,")
+
+def test_cli_imports_into_sqlite(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = SQLiteDataManager()
+    fed_id = manager.create_fed("spam watch", 1)
+    manager.add_fban(fed_id, 5, "kept", 1)
+    manager.cleanup()
+    _write_rows(tmp_path / "in.ndjson", range(100, 150))
+
+    db = manager.db_path
+    assert banio.main(["import", "fbans", fed_id, str(tmp_path / "in.ndjson"), "--db", db]) == 0
+    assert banio.main(["import", "fbans", "fed_x", str(tmp_path / "in.ndjson"), "--db", db]) == 1
+
+    manager = SQLiteDataManager()
+    try:
+        fbans = manager.feds[fed_id]['fbans']
+        assert len(fbans) == 51 and fbans["5"]['reason'] == "kept" and fbans["149"]['banned_by'] == 9
+    finally:
+        manager.cleanup()
@@ -0,0 +1,74 @@
+import threading
+
+from utils.banlist import BanList
+
+def _ban(user_id: int):
+    return {'reason': f"spam {user_id % 7}", 'banned_by': 1, 'banned_at': 1700000000 + user_id}
+
+def test_serialize_while_writing(tmp_path):
+    """to_bytes on another thread must not lose bans being added"""
+    banlist = BanList.from_mapping({str(i): _ban(i) for i in range(0, 20000, 2)})
+    path = tmp_path / "bans.bin"
+    banlist.save(str(path))
+    banlist = BanList.load(str(path))
+    done = threading.Event()
+    errors = []
+
+    def serialize():
+        while not done.is_set():
+            try:
+                banlist.to_bytes()
+                for user_id in (2000, 10000, 19998):
+                    assert banlist.contains_id(user_id)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    reader = threading.Thread(target=serialize)
+    reader.start()
+    try:
+        for user_id in range(1, 200001, 2):
+            banlist[str(user_id)] = _ban(user_id)
+        for user_id in range(0, 2000, 2):
+            del banlist[str(user_id)]
+    finally:
+        done.set()
+        reader.join()
+
+    assert not errors
+    assert len(banlist) == 100000 + 10000 - 1000
+    assert all(banlist.contains_id(user_id) for user_id in range(1, 200001, 2))
+
+    path.write_bytes(banlist.to_bytes())
+    reloaded = BanList.load(str(path))
+    assert list(reloaded.ids()) == list(banlist.ids())
+    assert reloaded["199999"] == banlist["199999"]
+
+def test_to_bytes_leaves_overlay():
+    """Serializing reads a merged copy instead of merging in place"""
+    banlist = BanList.from_mapping({"5": _ban(5)})
+    banlist["3"] = _ban(3)
+    del banlist["5"]
+    payload = banlist.to_bytes()
+    assert banlist._added and banlist._removed
+    assert list(banlist.ids()) == [3]
+    assert payload == banlist.to_bytes()
+
+def test_iter_bans_streams_overlay_and_arrays(tmp_path):
+    banlist = BanList.from_mapping({str(i): _ban(i) for i in range(0, 100, 2)})
+    path = tmp_path / "bans.bin"
+    banlist.save(str(path))
+    banlist = BanList.load(str(path))
+    expected = {i: _ban(i) for i in range(0, 100, 2)}
+    for user_id in (1, 5, 99, 150):
+        banlist[str(user_id)] = expected[user_id] = _ban(user_id)
+    for user_id in (0, 10, 98):
+        del banlist[str(user_id)]
+        del expected[user_id]
+    # Replaced in the overlay while the array copy is shadowed
+    banlist["20"] = expected[20] = {**_ban(20), 'reason': "changed"}
+
+    streamed = list(banlist.iter_bans(chunk=7))
+    assert [user_id for user_id, _ in streamed] == sorted(expected)
+    assert all(ban == banlist[str(user_id)] for user_id, ban in streamed)
+    assert dict(streamed)[20]['reason'] == "changed"
@@ -0,0 +1,22 @@
+import asyncio
+from types import SimpleNamespace
+
+from utils import decorators
+
+def test_denial_goes_through_the_sender(monkeypatch):
+    replies = []
+
+    async def reply(message, text, **kwargs):
+        replies.append(text)
+    monkeypatch.setattr(decorators.sender, "reply", reply)
+
+    @decorators.owner_only
+    async def command(update, context):
+        return "ran"
+
+    message = object()
+    stranger = SimpleNamespace(effective_user=SimpleNamespace(id=12345), effective_message=message)
+    owner = SimpleNamespace(effective_user=SimpleNamespace(id=1), effective_message=message)
+    assert asyncio.run(command(stranger, None)) is None
+    assert replies == ["❌ This command is only for the bot owner!"]
+    assert asyncio.run(command(owner, None)) == "ran"
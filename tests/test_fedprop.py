@@ -0,0 +1,34 @@
+import asyncio
+
+import config
+from database import data
+from utils.fedprop import FedPropagator
+
+def test_shards_resume_only_their_own_jobs(monkeypatch):
+    monkeypatch.setattr(config.Config, "SHARD_COUNT", 2)
+    mine = data.add_fed_job("fed_1", 5, "ban", [-100], shard=1)
+    theirs = data.add_fed_job("fed_1", 6, "ban", [-200], shard=0)
+    # Queued when there were four shards; shard 3's chats are ours now
+    moved = data.add_fed_job("fed_1", 7, "ban", [-300], shard=3)
+
+    async def scenario():
+        propagator = FedPropagator(rate=10, concurrency=1, max_attempts=1)
+
+        async def idle(job_id, progress):
+            await asyncio.sleep(60)
+        monkeypatch.setattr(propagator, "_run_job", idle)
+
+        monkeypatch.setattr(config.Config, "SHARD_INDEX", 1)
+        propagator.start(bot=None)
+        resumed = set(propagator._tasks)
+        pending = propagator.pending()
+        await propagator.stop()
+        return resumed, pending
+
+    try:
+        resumed, pending = asyncio.run(scenario())
+    finally:
+        for job_id in (mine, theirs, moved):
+            data.remove_fed_job(job_id)
+    assert resumed == {mine, moved}
+    assert pending == 2
@@ -0,0 +1,9 @@
+from utils import helpers
+
+def test_extract_user_id(monkeypatch):
+    monkeypatch.setattr(helpers.data, "resolve_username", lambda name, max_age: 42 if name == "legend" else None)
+    assert helpers.extract_user_id("123") == 123
+    assert helpers.extract_user_id("@legend") == 42
+    assert helpers.extract_user_id("@nobody") is None
+    for text in ("", "²", "12a", "@", "@two words"):
+        assert helpers.extract_user_id(text) is None
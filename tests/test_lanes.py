@@ -0,0 +1,46 @@
+import asyncio
+from datetime import datetime
+
+from telegram import Chat, Message, Update
+
+from utils.lanes import ChatLaneProcessor
+from utils.ratelimit import TokenBucket
+from utils.sender import MessageScheduler
+
+CHAT_ID = -1001
+
+def _update(update_id: int) -> Update:
+    message = Message(update_id, datetime.now(), Chat(CHAT_ID, Chat.SUPERGROUP), text="hi")
+    return Update(update_id, message=message)
+
+def test_throttled_reply_does_not_hold_the_lane():
+    async def scenario():
+        sender = MessageScheduler()
+        sender.start(bot=None)
+        # The chat has used up its send budget for the next minute
+        bucket = sender._chat_buckets[CHAT_ID] = TokenBucket(1 / 60, capacity=1)
+        bucket.try_acquire()
+
+        lanes = ChatLaneProcessor(4)
+        await lanes.initialize()
+        enforced = asyncio.Event()
+
+        async def command(update: Update):
+            await sender.reply(update.message, "✅ Done")
+
+        async def enforcement():
+            enforced.set()
+
+        first, second = _update(1), _update(2)
+        tasks = [
+            asyncio.create_task(lanes.process_update(first, command(first))),
+            asyncio.create_task(lanes.process_update(second, enforcement())),
+        ]
+        try:
+            await asyncio.wait_for(enforced.wait(), timeout=1)
+            await asyncio.gather(*tasks)
+            assert sender.metrics()['deferred'] == 1
+        finally:
+            await sender.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from telegram import Chat, Message, MessageEntity, Update, User
+from telegram.ext import ApplicationHandlerStop
+
+from database import data
+from utils.admin_cache import admin_cache
+from utils.deleter import batch_deleter
+from utils.locks import LOCK_BITS, LockEnforcer
+from utils.pipeline import MessageContext
+
+def test_only_locked_chats_are_cached():
+    enforcer = LockEnforcer(maxsize=2)
+    for chat_id in range(100):
+        assert enforcer.get_mask(chat_id, {'lock_types': []}) == 0
+    assert len(enforcer._masks) == 0
+
+    locked = {'lock_types': ["sticker"]}
+    for chat_id in range(5):
+        assert enforcer.get_mask(chat_id, locked) == LOCK_BITS["sticker"]
+    assert list(enforcer._masks.keys()) == [3, 4]
+
+    # Cached until invalidated, whatever record is passed
+    assert enforcer.get_mask(4, {'lock_types': []}) == LOCK_BITS["sticker"]
+    enforcer.invalidate(4)
+    assert enforcer.get_mask(4, {'lock_types': []}) == 0
+
+def _message(**kwargs) -> Message:
+    return Message(
+        1, datetime.now(timezone.utc), Chat(-100, Chat.SUPERGROUP),
+        from_user=User(7, "user", False), **kwargs
+    )
+
+def _command(text: str) -> Message:
+    return _message(text=text, entities=[MessageEntity(MessageEntity.BOT_COMMAND, 0, len(text.split()[0]))])
+
+async def _not_admin(bot, chat_id, user_id):
+    return False
+
+class _Bot:
+    def __init__(self):
+        self.banned = []
+
+    async def ban_chat_member(self, chat_id, user_id):
+        self.banned.append(user_id)
+
+@pytest.mark.parametrize("lock_types, message, deleted", [
+    (["all"], _message(text="hello"), True),
+    (["all"], _command("/rules"), False),
+    (["all"], _message(new_chat_members=[User(8, "new", False)]), False),
+    (["all", "bot"], _message(new_chat_members=[User(9, "spam_bot", True)]), True),
+    (["text"], _message(text="hello"), True),
+    (["text"], _command("/rules"), False),
+    (["text"], _message(left_chat_member=User(8, "gone", False)), False),
+])
+def test_commands_and_service_messages_pass_chat_locks(monkeypatch, lock_types, message, deleted):
+    monkeypatch.setitem(data.chats, "-100", {'lock_types': lock_types})
+    monkeypatch.setattr(admin_cache, "is_admin", _not_admin)
+    queued = []
+    monkeypatch.setattr(batch_deleter, "add", lambda bot, chat_id, message_id: queued.append(message_id))
+    enforcer = LockEnforcer(maxsize=8)
+    bot = _Bot()
+    context = SimpleNamespace(bot=bot)
+
+    async def scenario():
+        try:
+            await enforcer.check(MessageContext(Update(1, message=message)), context)
+        except ApplicationHandlerStop:
+            return True
+        return False
+
+    assert asyncio.run(scenario()) is deleted
+    assert bool(queued) is deleted
+    assert bot.banned == ([9] if "bot" in lock_types else [])
@@ -0,0 +1,42 @@
+import random
+
+from utils.matcher import KeywordMatcher, MatcherCache
+
+def _first_by_scan(keywords, text):
+    """What the matcher replaces: the first keyword, in order, found in the text"""
+    return next((keyword for keyword in keywords if keyword and keyword in text), None)
+
+def test_earliest_added_keyword_wins():
+    matcher = KeywordMatcher(["hers", "she", "he"])
+    # "he" ends first and "she" is longer, but "hers" was added first
+    assert matcher.first_match("ushers") == "hers"
+    assert matcher.first_match("she") == "she"
+    assert matcher.first_match("the end") == "he"
+    assert matcher.first_match("nothing") is None
+
+def test_overlapping_keywords_through_fail_links():
+    # "bcd" is only reached through the fail link out of "abc"
+    matcher = KeywordMatcher(["abcx", "bcd", "c"])
+    assert matcher.first_match("abcd") == "bcd"
+    assert matcher.first_match("abcx") == "abcx"
+    assert matcher.first_match("xxc") == "c"
+
+def test_empty_and_duplicate_keywords():
+    matcher = KeywordMatcher(["", "hi", "hi"])
+    assert matcher.first_match("hi there") == "hi"
+    assert matcher.first_match("") is None
+    assert KeywordMatcher([]).first_match("anything") is None
+
+def test_matches_a_plain_scan():
+    rng = random.Random(7)
+    for _ in range(300):
+        keywords = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 8))]
+        text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 30)))
+        assert KeywordMatcher(keywords).first_match(text) == _first_by_scan(keywords, text), (keywords, text)
+
+def test_cache_rebuilds_on_new_generation():
+    cache = MatcherCache(maxsize=2)
+    first = cache.get("-1", 0, ["spam"])
+    assert cache.get("-1", 0, ["ignored"]) is first
+    rebuilt = cache.get("-1", 1, ["eggs"])
+    assert rebuilt is not first and rebuilt.first_match("spam and eggs") == "eggs"
@@ -0,0 +1,46 @@
+import sqlite3
+
+import pytest
+
+from database import SQLiteDataManager
+
+def test_failed_flush_is_retried(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = SQLiteDataManager()
+    manager.update_user(7, first_name="Ada")
+
+    write_records = manager._write_records
+    def locked(statements):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(manager, "_write_records", locked)
+    with pytest.raises(sqlite3.OperationalError):
+        manager.flush()
+    assert ("users", ("7",)) in manager._pending
+
+    monkeypatch.setattr(manager, "_write_records", write_records)
+    manager.flush()
+    assert not manager._pending
+    manager.cleanup()
+
+    reopened = SQLiteDataManager()
+    assert reopened.users["7"]['first_name'] == "Ada"
+    reopened.cleanup()
+
+def test_sudo_set_follows_updates(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = SQLiteDataManager()
+    try:
+        manager.update_user(7, sudo=True)
+        manager.update_user(3, sudo=True)
+        manager.update_user(9, first_name="not sudo")
+        assert manager.get_all_sudo_users() == [3, 7]
+        manager.update_user(7, sudo=False)
+        assert manager.get_all_sudo_users() == [3] and not manager.is_sudo_user(7)
+    finally:
+        manager.cleanup()
+
+    manager = SQLiteDataManager()
+    try:
+        assert manager.get_all_sudo_users() == [3]
+    finally:
+        manager.cleanup()
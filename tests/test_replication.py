@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+import pytest
+
+from database import SHARED_STORES, SQLiteDataManager
+from utils import helpers
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch):
+    """Two managers sharing one database, the first replicating to the second"""
+    monkeypatch.chdir(tmp_path)
+    first, second = SQLiteDataManager(), SQLiteDataManager()
+    first.set_replication(SHARED_STORES, second.apply_replica)
+    yield first, second
+    first.cleanup()
+    second.cleanup()
+
+def test_sudo_follows_replicated_users(shards, monkeypatch):
+    first, second = shards
+    monkeypatch.setattr(helpers, "data", second)
+
+    first.update_user(42, sudo=True)
+    first.flush()
+    assert helpers.is_sudo(42)
+
+    first.update_user(42, sudo=False)
+    first.flush()
+    assert not helpers.is_sudo(42)
+
+def _reload_line(store: str) -> str:
+    return json.dumps({'s': store, 'p': [], 'reload': True}) + "\n"
+
+def test_bulk_reload_swaps_in_off_the_loop(shards):
+    first, second = shards
+    # Deliver by hand, as the supervisor would on the second shard's loop
+    first.set_replication((), None)
+
+    async def scenario():
+        first.bulk_add_gbans((user_id, {'reason': "bulk", 'banned_by': 1}) for user_id in range(1000, 3000))
+        await asyncio.wrap_future(first.commit_bulk("gbans"))
+
+        old = second.gbans
+        second.apply_replica([
+            _reload_line("gbans"),
+            # Arrives while the table is being read: replayed after the swap
+            json.dumps({'s': "gbans", 'p': ["77"], 'v': {'reason': "late", 'banned_by': 1}}) + "\n",
+        ])
+        # The loop only scheduled the read
+        assert second.gbans is old and "gbans" in second._reloading
+        # A local ban made meanwhile must survive the swap
+        second.add_gban(88, "local", 1)
+
+        while "gbans" in second._reloading:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert second.is_gbanned(1500) and second.is_gbanned(2999)
+    assert second.is_gbanned(77) and second.gbans["77"]['reason'] == "late"
+    assert second.is_gbanned(88)
+
+def test_fed_records_patch_the_merged_ban_sets(shards, monkeypatch):
+    first, second = shards
+    fed_id = first.create_fed("spam watch", 1)
+    first.join_fed(fed_id, -100)
+    first.add_fban(fed_id, 5, "spam", 1)
+    first.flush()
+    assert second.is_fbanned_in_chat(-100, 5)
+
+    # From here on every change must be applied in place
+    def rebuilt():
+        raise AssertionError("federation index rebuilt")
+    monkeypatch.setattr(second, "_index_fed_chats", rebuilt)
+    merged = second._chat_fbans["-100"]
+
+    first.add_fban(fed_id, 6, "spam", 1)
+    first.remove_fban(fed_id, 5)
+    first.flush()
+    assert second._chat_fbans["-100"] is merged
+    assert second.is_fbanned_in_chat(-100, 6) and not second.is_fbanned_in_chat(-100, 5)
+
+    first.join_fed(fed_id, -200)
+    first.leave_fed(fed_id, -100)
+    first.flush()
+    assert second.get_chat_feds(-200) == [fed_id] and second.get_chat_feds(-100) == []
+    assert second.is_fbanned_in_chat(-200, 6) and not second.is_fbanned_in_chat(-100, 6)
+
+    first.delete_fed(fed_id, 1)
+    first.flush()
+    assert fed_id not in second.feds and not second.is_fbanned_in_chat(-200, 6)
+
+def test_bulk_import_keeps_rows_from_other_shards(shards):
+    first, second = shards
+    first.set_replication((), None)
+    # Committed by the second shard; the first has not heard of it
+    second.add_gban(77, "elsewhere", 1)
+    second.flush()
+
+    first.bulk_add_gbans((user_id, {'reason': "bulk", 'banned_by': 1}) for user_id in range(1000, 1100))
+    first.commit_bulk("gbans").result()
+
+    fresh = SQLiteDataManager()
+    try:
+        assert fresh.is_gbanned(77) and fresh.is_gbanned(1000) and fresh.is_gbanned(1099)
+        assert len(fresh.gbans) == 101
+    finally:
+        fresh.cleanup()
@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+
+import pytest
+from telegram import Chat, Message, MessageEntity, Update, User
+
+from utils.pipeline import MessageContext
+from utils.router import CommandRouter
+
+async def _ban(update, context):
+    pass
+
+@pytest.fixture
+def router():
+    router = CommandRouter()
+    router.add("ban", _ban)
+    router.set_bot_username("LegendBot")
+    return router
+
+def _update(text: str, edited: bool = False) -> Update:
+    entities = []
+    if text.startswith("/"):
+        length = len(text.split()[0])
+        entities.append(MessageEntity(MessageEntity.BOT_COMMAND, 0, length))
+    message = Message(
+        1, datetime.now(timezone.utc), Chat(-100, Chat.SUPERGROUP),
+        from_user=User(7, "user", False), text=text, entities=entities
+    )
+    if edited:
+        return Update(1, edited_message=message)
+    return Update(1, message=message)
+
+def test_routes_with_bot_name(router):
+    assert router.check_update(_update("!ban@legendbot 42 spam")) == (_ban, ["42", "spam"])
+    assert router.check_update(_update("/BAN@LegendBot 42")) == (_ban, ["42"])
+    assert router.check_update(_update("!ban@otherbot 42")) is None
+    assert router.check_update(_update("/ban@otherbot 42")) is None
+
+def test_routes_edited_messages(router):
+    assert router.check_update(_update("/ban 42", edited=True)) == (_ban, ["42"])
+    assert router.check_update(_update("!ban", edited=True)) == (_ban, [])
+
+def test_bare_prefix_is_not_a_command(router):
+    for text in ("!", "! ban", "!@legendbot", "!?"):
+        update = _update(text)
+        assert router.check_update(update) is None
+        assert not MessageContext(update).is_command
+
+def test_slash_needs_command_entity(router):
+    message = Message(
+        1, datetime.now(timezone.utc), Chat(-100, Chat.SUPERGROUP),
+        from_user=User(7, "user", False), text="/ban 42"
+    )
+    update = Update(1, message=message)
+    assert router.check_update(update) is None
+    assert not MessageContext(update).is_command
+    assert MessageContext(_update("/ban 42")).is_command
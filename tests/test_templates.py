@@ -0,0 +1,45 @@
+import pytest
+
+from utils.templates import TemplateCache, TemplateError, compile_template
+
+def _values(calls):
+    def value(name, result):
+        def compute():
+            calls.append(name)
+            return result
+        return compute
+    return {'first': value('first', "Ada"), 'chat': value('chat', "Legends"), 'count': value('count', "42")}
+
+def test_render_fills_each_placeholder_once():
+    calls = []
+    template = compile_template("Hi {first}! {first}, welcome to {chat}.")
+    assert template.fields == {'first', 'chat'}
+    assert template.render(_values(calls)) == "Hi Ada! Ada, welcome to Legends."
+    # Only used placeholders are computed, each once
+    assert sorted(calls) == ['chat', 'first']
+
+def test_doubled_braces_are_literal():
+    template = compile_template("{{first}} is {first} {{}}")
+    assert template.render(_values([])) == "{first} is Ada {}"
+
+@pytest.mark.parametrize("text", ["Hi {name}", "Hi {first", "Hi first}", "{{first}"])
+def test_strict_rejects_unknown_and_unbalanced(text):
+    with pytest.raises(TemplateError):
+        compile_template(text)
+
+def test_lenient_keeps_old_text_as_is():
+    template = compile_template("Hi {name} {{first}} {first} {", strict=False)
+    assert template.render(_values([])) == "Hi {name} {{first}} Ada {"
+
+def test_cache_prefers_saved_segments_and_follows_edits():
+    cache = TemplateCache(maxsize=4)
+    saved = compile_template("Hello {first}")
+    chat = {'id': -1, 'welcome': "Hello {first}", 'welcome_tpl': saved.segments}
+    template = cache.get(chat, 'welcome')
+    assert template.render(_values([])) == "Hello Ada"
+    assert cache.get(chat, 'welcome') is template
+
+    # Edited without compiled segments, as messages saved before templates were
+    chat.update(welcome="Bye {first} {unknown}", welcome_tpl=None)
+    assert cache.get(chat, 'welcome').render(_values([])) == "Bye Ada {unknown}"
+    assert cache.get({'id': -1}, 'goodbye') is None
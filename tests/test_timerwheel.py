@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from utils.timerwheel import TimerWheel
+
+def _run(wheel, stops):
+    """Advance through stops; map each item to the clock reading that returned it"""
+    fired = {}
+    for now in stops:
+        for item in wheel.advance(now):
+            assert item not in fired
+            fired[item] = now
+    return fired
+
+@pytest.mark.parametrize("levels", [2, 3])
+def test_entries_fire_at_their_deadline_across_levels(levels):
+    rng = random.Random(levels)
+    wheel = TimerWheel(now=1000, levels=levels)
+    # Spans level 0, every higher level, and (for 2 levels) past the top
+    deadlines = [1000 + rng.choice((rng.randint(1, 63), rng.randint(64, 4095), rng.randint(4096, 20000)))
+                 for _ in range(500)]
+    for item, deadline in enumerate(deadlines):
+        wheel.schedule(deadline, item)
+    assert len(wheel) == 500
+
+    stops = list(range(1001, 21001 + 1, 7))
+    fired = _run(wheel, stops)
+    assert len(fired) == 500 and len(wheel) == 0
+    for item, deadline in enumerate(deadlines):
+        # The first clock reading at or past the deadline
+        assert fired[item] == next(now for now in stops if now >= deadline), (item, deadline)
+
+def test_fractional_ticks_and_past_deadlines():
+    wheel = TimerWheel(now=0, tick=0.5)
+    wheel.schedule(-3, "overdue")
+    wheel.schedule(1.2, "rounded up")
+    wheel.schedule(0.5, "one tick")
+    assert wheel.advance(0.1) == ["overdue"]
+    assert wheel.advance(0.5) == ["one tick"]
+    assert wheel.advance(1.4) == []
+    assert wheel.advance(1.5) == ["rounded up"]
+    assert len(wheel) == 0
+
+def test_cascade_boundary():
+    wheel = TimerWheel(now=0)
+    # Exactly one level-1 slot away, and the last tick before it
+    wheel.schedule(TimerWheel.SLOTS, "boundary")
+    wheel.schedule(TimerWheel.SLOTS - 1, "before")
+    wheel.schedule(TimerWheel.SLOTS ** 2 + 1, "level 2")
+    assert wheel.advance(TimerWheel.SLOTS - 1) == ["before"]
+    assert wheel.advance(TimerWheel.SLOTS) == ["boundary"]
+    assert wheel.advance(TimerWheel.SLOTS ** 2) == []
+    assert wheel.advance(TimerWheel.SLOTS ** 2 + 1) == ["level 2"]
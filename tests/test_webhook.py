@@ -0,0 +1,61 @@
+import asyncio
+import json
+import socket
+
+from tornado.httpclient import AsyncHTTPClient
+
+from utils.webhook import SECRET_HEADER, WebhookServer
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def test_health_check_hides_metrics_without_secret():
+    async def scenario():
+        port = _free_port()
+        server = WebhookServer(lambda payload: None, "127.0.0.1", port, "hook", secret="s3cret")
+        await server.start()
+        client = AsyncHTTPClient()
+        url = f"http://127.0.0.1:{port}/hook"
+        try:
+            bare = await client.fetch(url)
+            wrong = await client.fetch(url, headers={SECRET_HEADER: "guess"})
+            full = await client.fetch(url, headers={SECRET_HEADER: "s3cret"})
+        finally:
+            client.close()
+            await server.stop()
+        return bare, wrong, full
+
+    bare, wrong, full = asyncio.run(scenario())
+    assert bare.code == wrong.code == 200
+    assert bare.body == wrong.body == b"ok"
+    assert json.loads(full.body) == {'ok': True, 'received': 0, 'rejected': 0}
+
+def test_unparseable_update_is_rejected():
+    received = []
+
+    def sink(payload):
+        if 'update_id' not in payload:
+            raise ValueError("not an update")
+        received.append(payload)
+
+    async def scenario():
+        port = _free_port()
+        server = WebhookServer(sink, "127.0.0.1", port, "hook", secret="s3cret")
+        await server.start()
+        client = AsyncHTTPClient()
+        url = f"http://127.0.0.1:{port}/hook"
+        headers = {SECRET_HEADER: "s3cret"}
+        try:
+            bad = await client.fetch(url, method="POST", body=json.dumps({'x': 1}), headers=headers, raise_error=False)
+            good = await client.fetch(url, method="POST", body=json.dumps({'update_id': 1}), headers=headers)
+        finally:
+            client.close()
+            await server.stop()
+        return bad, good, server.metrics()
+
+    bad, good, metrics = asyncio.run(scenario())
+    assert bad.code == 400 and good.code == 200
+    assert received == [{'update_id': 1}]
+    assert metrics == {'received': 1, 'rejected': 1}
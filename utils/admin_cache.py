@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import Dict
+
+from cachetools import TTLCache
+from telegram import ChatMember, Update
+from telegram.ext import ContextTypes
+
+import config
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = (ChatMember.OWNER, ChatMember.ADMINISTRATOR)
+
+class _Refresh:
+    """Lock of one chat's admin fetch and the callers holding or awaiting it"""
+    
+    __slots__ = ('lock', 'users')
+    
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+class AdminCache:
+    """Per-chat administrator sets shared by every permission check
+    
+    Each chat's admins are fetched with one get_chat_administrators call,
+    kept for ADMIN_CACHE_TTL seconds and patched from ChatMemberUpdated
+    updates, so permission checks normally cost a dict lookup.
+    """
+    
+    def __init__(self, ttl: float, maxsize: int = 10000):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._refreshes: Dict[int, _Refresh] = {}
+    
+    async def get_admins(self, bot, chat_id: int) -> Dict[int, ChatMember]:
+        """Get chat admins keyed by user ID"""
+        admins = self._cache.get(chat_id)
+        if admins is not None:
+            return admins
+        
+        # One refresh per chat at a time; concurrent callers wait for it.
+        # The lock is dropped only once nobody holds or awaits it: a lock
+        # reads unlocked before its next waiter wakes up
+        refresh = self._refreshes.get(chat_id)
+        if refresh is None:
+            refresh = self._refreshes[chat_id] = _Refresh()
+        refresh.users += 1
+        try:
+            async with refresh.lock:
+                admins = self._cache.get(chat_id)
+                if admins is None:
+                    members = await bot.get_chat_administrators(chat_id)
+                    admins = {member.user.id: member for member in members}
+                    self._cache[chat_id] = admins
+        finally:
+            refresh.users -= 1
+            if not refresh.users:
+                del self._refreshes[chat_id]
+        return admins
+    
+    async def is_admin(self, bot, chat_id: int, user_id: int) -> bool:
+        """Check if user is admin in chat"""
+        try:
+            admins = await self.get_admins(bot, chat_id)
+        except Exception as e:
+            logger.debug(f"Could not fetch admins of {chat_id}: {e}")
+            return False
+        return user_id in admins
+    
+    def invalidate(self, chat_id: int):
+        """Drop the cached admins of a chat"""
+        self._cache.pop(chat_id, None)
+    
+    async def handle_chat_member(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Keep cached admin sets in sync with member status changes"""
+        member_update = update.chat_member or update.my_chat_member
+        if not member_update:
+            return
+        
+        chat_id = member_update.chat.id
+        admins = self._cache.get(chat_id)
+        if admins is None:
+            return
+        
+        new_member = member_update.new_chat_member
+        if new_member.status in ADMIN_STATUSES:
+            admins[new_member.user.id] = new_member
+        else:
+            admins.pop(new_member.user.id, None)
+
+# Global admin cache instance
+admin_cache = AdminCache(config.Config.ADMIN_CACHE_TTL)
@@ -0,0 +1,288 @@
+"""Streaming import/export of global and federation ban lists
+
+Files are NDJSON (one {"user_id", "reason", "banned_by", "banned_at"}
+object per line) or CSV with the same columns. Rows are read and written
+one at a time, so memory stays flat however long the list is.
+
+Command line (stop the bot first, it owns the data directory). It works
+on the stored ban lists directly and needs no .env or bot token; pass
+--db for the SQLite backend:
+
+    python -m utils.banio import gbans bans.csv
+    python -m utils.banio export fbans <fed_id> bans.ndjson --db data/legend.db
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+from utils.banlist import BanList
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("user_id", "reason", "banned_by", "banned_at")
+FORMATS = ("ndjson", "csv")
+
+# Rows handed to the data manager between progress updates
+CHUNK_SIZE = 5000
+
+Row = Tuple[int, Dict]
+
+def detect_format(filename: str, default: str = "ndjson") -> str:
+    """Guess the file format from its extension"""
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    return default
+
+class BanReader:
+    """Parse ban rows from a text stream, counting the ones skipped"""
+
+    def __init__(self, stream: TextIO, fmt: str, banned_by: int = 0):
+        self.stream = stream
+        self.fmt = fmt
+        self.banned_by = banned_by
+        self.skipped = 0
+
+    def __iter__(self) -> Iterator[Row]:
+        if self.fmt == "csv":
+            records = csv.DictReader(self.stream)
+        else:
+            records = self._json_lines()
+        for record in records:
+            row = self._row(record)
+            if row is None:
+                self.skipped += 1
+            else:
+                yield row
+
+    def _json_lines(self) -> Iterator[Optional[Dict]]:
+        for line in self.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            yield record if isinstance(record, dict) else None
+
+    def _row(self, record: Optional[Dict]) -> Optional[Row]:
+        """Validate one record"""
+        if not record:
+            return None
+        try:
+            user_id = int(record.get("user_id"))
+            banned_by = int(record.get("banned_by") or self.banned_by)
+        except (TypeError, ValueError):
+            return None
+        return user_id, {
+            'reason': record.get("reason") or "No reason provided",
+            'banned_by': banned_by,
+            'banned_at': record.get("banned_at") or datetime.now().isoformat()
+        }
+
+def write_bans(stream: TextIO, rows: Iterable[Row], fmt: str) -> int:
+    """Stream ban rows to a text file; returns the rows written"""
+    writer = csv.writer(stream) if fmt == "csv" else None
+    if writer:
+        writer.writerow(FIELDS)
+    written = 0
+    for user_id, ban in rows:
+        values = (int(user_id), ban.get('reason', ''), ban.get('banned_by', 0), ban.get('banned_at', ''))
+        if writer:
+            writer.writerow(values)
+        else:
+            stream.write(json.dumps(dict(zip(FIELDS, values)), ensure_ascii=False) + "\n")
+        written += 1
+    return written
+
+def _target(kind: str, fed_id: Optional[str]):
+    """Get the bulk-add function, ban list and store path of an import target"""
+    # Only the bot's side needs the data manager (and with it, config)
+    from database import data
+    if kind == "gbans":
+        return data.bulk_add_gbans, data.gbans, ("gbans",)
+    if fed_id not in data.feds:
+        raise KeyError(f"Federation {fed_id} not found")
+    return (
+        lambda rows: data.bulk_add_fbans(fed_id, rows),
+        data.feds[fed_id]['fbans'],
+        ("feds", fed_id)
+    )
+
+async def import_bans(kind: str, rows: Iterable[Row], fed_id: Optional[str] = None,
+                      progress: Optional[Callable[[int], None]] = None) -> int:
+    """Add streamed bans in chunks and persist them in one batch"""
+    bulk_add, _, path = _target(kind, fed_id)
+    rows = iter(rows)
+    total = 0
+    while True:
+        added = bulk_add(islice(rows, CHUNK_SIZE))
+        if not added:
+            break
+        total += added
+        if progress:
+            progress(total)
+        # Let other updates through between chunks
+        await asyncio.sleep(0)
+    await asyncio.wrap_future(data.commit_bulk(*path))
+    return total
+
+def export_bans(kind: str, stream: TextIO, fmt: str, fed_id: Optional[str] = None) -> int:
+    """Write a ban list to a text stream"""
+    _, bans, _ = _target(kind, fed_id)
+    return write_bans(stream, bans.iter_bans(), fmt)
+
+# ===== COMMAND LINE =====
+def _read_json(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _banlist_file(data_dir: str, fed_id: Optional[str]) -> str:
+    """Get the path of a ban list file of the JSON backend"""
+    if fed_id is None:
+        return os.path.join(data_dir, "gbans.bin")
+    feds = _read_json(os.path.join(data_dir, "feds.json"))
+    if fed_id not in feds:
+        raise KeyError(f"Federation {fed_id} not found")
+    # The bot ignores the file while feds.json still embeds the list
+    if feds[fed_id].get('fbans'):
+        raise ValueError("feds.json still holds its ban lists; start the bot once to convert it")
+    return os.path.join(data_dir, "fbans", f"{fed_id}.bin")
+
+def _open_banlist(data_dir: str, fed_id: Optional[str]) -> Tuple[BanList, str]:
+    """Map a ban list file of the JSON backend (empty if there is none yet)"""
+    path = _banlist_file(data_dir, fed_id)
+    if os.path.exists(path):
+        return BanList.load(path), path
+    if fed_id is None and os.path.exists(os.path.join(data_dir, "gbans.json")):
+        raise ValueError("gbans.json is not converted yet; start the bot once to convert it")
+    return BanList(), path
+
+def _open_db(db_path: str, fed_id: Optional[str]) -> sqlite3.Connection:
+    """Open the SQLite database the bot has already set up"""
+    if not os.path.exists(db_path):
+        raise ValueError(f"{db_path} does not exist; start the bot once to create it")
+    db = sqlite3.connect(db_path, timeout=30)
+    try:
+        if fed_id is not None and db.execute("SELECT 1 FROM feds WHERE id = ?", (fed_id,)).fetchone() is None:
+            raise KeyError(f"Federation {fed_id} not found")
+    except Exception:
+        db.close()
+        raise
+    return db
+
+def _db_rows(db: sqlite3.Connection, fed_id: Optional[str]) -> Iterator[Row]:
+    """Stream the bans of a table in user ID order"""
+    if fed_id is None:
+        cursor = db.execute("SELECT user_id, data FROM gbans ORDER BY user_id")
+    else:
+        cursor = db.execute("SELECT user_id, data FROM fed_bans WHERE fed_id = ? ORDER BY user_id", (fed_id,))
+    for user_id, payload in cursor:
+        yield user_id, json.loads(payload)
+
+def _db_import(db: sqlite3.Connection, rows: Iterable[Row], fed_id: Optional[str],
+               progress: Callable[[int], None]) -> int:
+    """Upsert bans into the database, CHUNK_SIZE rows per transaction"""
+    if fed_id is None:
+        sql = ("INSERT INTO gbans (user_id, data) VALUES (?, ?) "
+               "ON CONFLICT (user_id) DO UPDATE SET data = excluded.data")
+        prefix = ()
+    else:
+        sql = ("INSERT INTO fed_bans (fed_id, user_id, data) VALUES (?, ?, ?) "
+               "ON CONFLICT (fed_id, user_id) DO UPDATE SET data = excluded.data")
+        prefix = (fed_id,)
+    rows = iter(rows)
+    total = 0
+    while True:
+        chunk = [(*prefix, user_id, json.dumps(ban, ensure_ascii=False)) for user_id, ban in islice(rows, CHUNK_SIZE)]
+        if not chunk:
+            return total
+        with db:
+            db.executemany(sql, chunk)
+        total += len(chunk)
+        progress(total)
+
+def _file_import(data_dir: str, rows: Iterable[Row], fed_id: Optional[str],
+                 progress: Callable[[int], None]) -> int:
+    """Add bans to a ban list file of the JSON backend"""
+    bans, path = _open_banlist(data_dir, fed_id)
+    total = 0
+    for user_id, ban in rows:
+        bans[str(user_id)] = ban
+        total += 1
+        if total % CHUNK_SIZE == 0:
+            progress(total)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    bans.save(path)
+    return total
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m utils.banio", description="Import or export ban lists")
+    parser.add_argument("action", choices=("import", "export"))
+    parser.add_argument("kind", choices=("gbans", "fbans"))
+    parser.add_argument("args", nargs="+", metavar="[fed_id] file")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    parser.add_argument("--banned-by", type=int, default=0, help="banned_by for rows without one")
+    parser.add_argument("--data-dir", default="data", help="data directory of the JSON backend (default: data)")
+    parser.add_argument("--db", help="SQLite database to use instead (STORAGE_BACKEND=sqlite)")
+    options = parser.parse_args(argv)
+
+    fed_id = None
+    if options.kind == "fbans":
+        if len(options.args) != 2:
+            parser.error("fbans needs a federation ID and a file")
+        fed_id, filename = options.args
+    else:
+        filename = options.args[0]
+    fmt = options.format or detect_format(filename)
+
+    db = None
+    try:
+        started = time.monotonic()
+        if options.db:
+            db = _open_db(options.db, fed_id)
+        if options.action == "import":
+            progress = lambda n: print(f"\r{n} rows imported", end="", file=sys.stderr)
+            with open(filename, 'r', encoding='utf-8', newline='') as f:
+                reader = BanReader(f, fmt, options.banned_by)
+                if db is not None:
+                    total = _db_import(db, reader, fed_id, progress)
+                else:
+                    total = _file_import(options.data_dir, reader, fed_id, progress)
+            print(f"\rImported {total} {options.kind}, skipped {reader.skipped} invalid rows "
+                  f"in {time.monotonic() - started:.1f}s", file=sys.stderr)
+        else:
+            if db is not None:
+                rows = _db_rows(db, fed_id)
+            else:
+                rows = _open_banlist(options.data_dir, fed_id)[0].iter_bans()
+            with open(filename, 'w', encoding='utf-8', newline='') as f:
+                total = write_bans(f, rows, fmt)
+            print(f"Exported {total} {options.kind} to {filename}", file=sys.stderr)
+    except KeyError as e:
+        print(e.args[0], file=sys.stderr)
+        return 1
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"{options.action.capitalize()} failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if db is not None:
+            db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
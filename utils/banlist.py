@@ -0,0 +1,333 @@
+import heapq
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+# File layout: header, then ids/banned_at/banned_by as int64 arrays,
+# reason indexes as int32, padding to 8 bytes and the reasons as a JSON list.
+# Arrays are stored in native byte order so they can be mapped as-is.
+_MAGIC = b"LBAN"
+_VERSION = 1
+_HEADER = struct.Struct("<4sIQQ")
+
+# Overlay entries kept before they are merged into the sorted arrays
+OVERLAY_LIMIT = 16384
+
+Entry = Tuple[int, int, int]  # (reason index, banned_by, banned_at)
+
+def _to_timestamp(value) -> int:
+    """Convert a stored banned_at value to unix seconds"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+class BanList(MutableMapping):
+    """Compact ban list keyed by stringified user ID
+
+    Bans live in parallel sorted arrays (ids, banned_at, banned_by, reason
+    index) searched with bisect, with reasons interned in a side table,
+    so an entry costs 28 bytes instead of a dict of strings. Changes go
+    to a small overlay that is merged into the arrays in bulk. Saved lists
+    are memory-mapped on load instead of parsed.
+
+    Values read back as the usual {'reason', 'banned_by', 'banned_at'}
+    dicts; they are copies, so assign a new dict to change a ban.
+
+    The event loop changes bans while the storage writer serializes them,
+    so every access holds the list's lock; a merge swaps the arrays and
+    unmaps the file, which no other thread may observe half-done.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ids = array('q')
+        self._times = array('q')
+        self._by = array('q')
+        self._reason_idx = array('i')
+        self._reasons: List[str] = []
+        self._reason_ids: Dict[str, int] = {}
+        self._added: Dict[int, Entry] = {}
+        self._removed = set()
+        self._mmap: Optional[mmap.mmap] = None
+
+    # ===== CONSTRUCTION =====
+    @classmethod
+    def from_mapping(cls, bans: Mapping) -> "BanList":
+        """Build a ban list from {user_id: ban} items"""
+        banlist = cls()
+        entries = sorted((int(user_id), ban) for user_id, ban in bans.items())
+        for user_id, ban in entries:
+            banlist._ids.append(user_id)
+            banlist._times.append(_to_timestamp(ban.get('banned_at')))
+            banlist._by.append(int(ban.get('banned_by') or 0))
+            banlist._reason_idx.append(banlist._intern(ban.get('reason', '')))
+        return banlist
+
+    @classmethod
+    def load(cls, path: str) -> "BanList":
+        """Map a saved ban list from disk"""
+        banlist = cls()
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return banlist
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, reasons_size = _HEADER.unpack_from(mapped, 0)
+        if magic != _MAGIC or version != _VERSION:
+            mapped.close()
+            raise ValueError(f"{path} is not a ban list")
+
+        view = memoryview(mapped)
+        offset = _HEADER.size
+        columns = []
+        for typecode, width in (('q', 8), ('q', 8), ('q', 8), ('i', 4)):
+            columns.append(view[offset:offset + count * width].cast(typecode))
+            offset += count * width
+        offset += -offset % 8
+        banlist._ids, banlist._times, banlist._by, banlist._reason_idx = columns
+        banlist._reasons = json.loads(bytes(view[offset:offset + reasons_size]))
+        banlist._reason_ids = {reason: i for i, reason in enumerate(banlist._reasons)}
+        banlist._mmap = mapped
+        return banlist
+
+    def to_bytes(self) -> bytes:
+        """Serialize the ban list for save()
+
+        Serializes a merged copy: the overlay and arrays stay as they are,
+        so this is safe to call from the writer thread.
+        """
+        with self._lock:
+            columns = self._merged_columns()
+            reasons = json.dumps(self._reasons, ensure_ascii=False).encode('utf-8')
+            parts = [_HEADER.pack(_MAGIC, _VERSION, len(columns[0]), len(reasons))]
+            size = _HEADER.size
+            for column in columns:
+                chunk = bytes(memoryview(column).cast('B'))
+                parts.append(chunk)
+                size += len(chunk)
+        parts.append(b"\0" * (-size % 8))
+        parts.append(reasons)
+        return b"".join(parts)
+
+    def save(self, path: str):
+        """Atomically write the ban list to disk"""
+        payload = self.to_bytes()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    # ===== LOOKUPS =====
+    def _intern(self, reason: str) -> int:
+        """Get the side-table index of a reason (lock held)"""
+        reason = reason or ''
+        index = self._reason_ids.get(reason)
+        if index is None:
+            index = self._reason_ids[reason] = len(self._reasons)
+            self._reasons.append(reason)
+        return index
+
+    def _base_index(self, user_id: int) -> int:
+        """Get the array position of a user, or -1 (lock held)"""
+        ids = self._ids
+        i = bisect_left(ids, user_id)
+        if i < len(ids) and ids[i] == user_id:
+            return i
+        return -1
+
+    def _entry(self, user_id: int) -> Optional[Entry]:
+        """Get the raw ban of a user (lock held)"""
+        entry = self._added.get(user_id)
+        if entry is not None:
+            return entry
+        if user_id in self._removed:
+            return None
+        i = self._base_index(user_id)
+        if i < 0:
+            return None
+        return self._reason_idx[i], self._by[i], self._times[i]
+
+    def contains_id(self, user_id: int) -> bool:
+        """Check if an integer user ID is banned"""
+        with self._lock:
+            if user_id in self._added:
+                return True
+            if user_id in self._removed:
+                return False
+            return self._base_index(user_id) >= 0
+
+    def ids(self) -> Iterator[int]:
+        """Iterate banned user IDs in ascending order
+
+        Iterates a snapshot, so bans may change while it is consumed.
+        """
+        with self._lock:
+            removed = self._removed
+            base = [user_id for user_id in self._ids if user_id not in removed]
+            return heapq.merge(base, sorted(self._added))
+
+    def iter_bans(self, chunk: int = 4096) -> Iterator[Tuple[int, Dict]]:
+        """Iterate (user_id, ban) in ascending order without copying the list
+
+        Reads `chunk` bans at a time under the lock, resuming after the
+        last ID returned, so bans may change while it is consumed.
+        """
+        after = None
+        while True:
+            with self._lock:
+                batch = self._read_after(after, chunk)
+            if not batch:
+                return
+            yield from batch
+            after = batch[-1][0]
+
+    def _read_after(self, after: Optional[int], limit: int) -> List[Tuple[int, Dict]]:
+        """Get up to `limit` bans with IDs above `after` (lock held)"""
+        ids = self._ids
+        i = 0 if after is None else bisect_right(ids, after)
+        added = sorted(user_id for user_id in self._added if after is None or user_id > after)
+        j = 0
+        batch = []
+        while len(batch) < limit:
+            base_id = ids[i] if i < len(ids) else None
+            added_id = added[j] if j < len(added) else None
+            if base_id is None and added_id is None:
+                break
+            if added_id is not None and (base_id is None or added_id <= base_id):
+                user_id = added_id
+                j += 1
+                if base_id == added_id:
+                    i += 1
+                reason_idx, banned_by, banned_at = self._added[user_id]
+            else:
+                user_id = base_id
+                i += 1
+                if user_id in self._removed:
+                    continue
+                reason_idx, banned_by, banned_at = self._reason_idx[i - 1], self._by[i - 1], self._times[i - 1]
+            batch.append((user_id, self._ban(reason_idx, banned_by, banned_at)))
+        return batch
+
+    def _ban(self, reason_idx: int, banned_by: int, banned_at: int) -> Dict:
+        """Build the dict of a raw ban"""
+        return {
+            'reason': self._reasons[reason_idx],
+            'banned_by': banned_by,
+            'banned_at': datetime.fromtimestamp(banned_at).isoformat()
+        }
+
+    # ===== MAPPING =====
+    def __getitem__(self, key) -> Dict:
+        with self._lock:
+            try:
+                entry = self._entry(int(key))
+            except (TypeError, ValueError):
+                entry = None
+            if entry is None:
+                raise KeyError(key)
+            return self._ban(*entry)
+
+    def __contains__(self, key) -> bool:
+        try:
+            return self.contains_id(int(key))
+        except (TypeError, ValueError):
+            return False
+
+    def __setitem__(self, key, ban: Dict):
+        user_id = int(key)
+        banned_by = int(ban.get('banned_by') or 0)
+        banned_at = _to_timestamp(ban.get('banned_at'))
+        with self._lock:
+            if user_id not in self._added and self._base_index(user_id) >= 0:
+                # Shadow the array copy until the next merge
+                self._removed.add(user_id)
+            self._added[user_id] = (self._intern(ban.get('reason', '')), banned_by, banned_at)
+            if len(self._added) + len(self._removed) > OVERLAY_LIMIT:
+                self.merge()
+
+    def __delitem__(self, key):
+        user_id = int(key)
+        with self._lock:
+            found = self._added.pop(user_id, None) is not None
+            if user_id not in self._removed and self._base_index(user_id) >= 0:
+                self._removed.add(user_id)
+                found = True
+        if not found:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(user_id) for user_id in self.ids())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._ids) - len(self._removed) + len(self._added)
+
+    def __repr__(self) -> str:
+        return f"<BanList of {len(self)} bans>"
+
+    # ===== MAINTENANCE =====
+    def merge(self):
+        """Fold the overlay into the sorted arrays"""
+        with self._lock:
+            if not self._added and not self._removed:
+                return
+            merged = self._merged_columns()
+            self._release()
+            self._ids, self._times, self._by, self._reason_idx = merged
+            self._added = {}
+            self._removed = set()
+
+    def _merged_columns(self) -> Tuple[array, ...]:
+        """Build the arrays with the overlay folded in (lock held)"""
+        columns = (self._ids, self._times, self._by, self._reason_idx)
+        if not self._added and not self._removed:
+            return columns
+
+        ids = self._ids
+        # (position, 0 = insert before / 1 = drop, user_id); runs of untouched
+        # entries between events are copied as whole slices
+        events = [(bisect_left(ids, user_id), 1, user_id) for user_id in self._removed]
+        events += [(bisect_left(ids, user_id), 0, user_id) for user_id in self._added]
+        events.sort()
+
+        merged = tuple(array(column.format if isinstance(column, memoryview) else column.typecode)
+                       for column in columns)
+        position = 0
+        for index, kind, user_id in events:
+            if index > position:
+                for target, column in zip(merged, columns):
+                    target.frombytes(memoryview(column)[position:index].cast('B'))
+                position = index
+            if kind == 1:
+                position += 1
+            else:
+                reason_idx, banned_by, banned_at = self._added[user_id]
+                merged[0].append(user_id)
+                merged[1].append(banned_at)
+                merged[2].append(banned_by)
+                merged[3].append(reason_idx)
+        for target, column in zip(merged, columns):
+            target.frombytes(memoryview(column)[position:].cast('B'))
+        return merged
+
+    def _release(self):
+        """Unmap the backing file once no array points into it (lock held)"""
+        if self._mmap is None:
+            return
+        for column in (self._ids, self._times, self._by, self._reason_idx):
+            if isinstance(column, memoryview):
+                column.release()
+        self._mmap.close()
+        self._mmap = None
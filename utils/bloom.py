@@ -0,0 +1,52 @@
+import math
+from typing import Iterable
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+
+class BloomFilter:
+    """Bloom filter over integer IDs
+
+    A miss is definite, a hit only means "maybe". Probes are derived from
+    one 64-bit multiplicative hash (double hashing), so no hashlib calls
+    are needed on the lookup path.
+    """
+
+    __slots__ = ('size', 'hashes', 'count', '_bits')
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    @classmethod
+    def from_ids(cls, ids: Iterable[int], capacity: int, error_rate: float = 0.01) -> "BloomFilter":
+        """Build a filter holding every ID"""
+        bloom = cls(capacity, error_rate)
+        for item in ids:
+            bloom.add(item)
+        return bloom
+
+    def _probes(self, item: int):
+        mixed = (item * _GOLDEN) & _MASK64
+        h1 = mixed & 0xFFFFFFFF
+        h2 = (mixed >> 32) | 1
+        size = self.size
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % size
+
+    def add(self, item: int):
+        """Add an ID"""
+        bits = self._bits
+        for position in self._probes(item):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: int) -> bool:
+        bits = self._bits
+        for position in self._probes(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from telegram import Message
+
+import config
+from database import data
+from utils.deleter import delete_messages_batched
+from utils.shards import owns_chat
+from utils.timerwheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+class MessageCleaner:
+    """Delete bot messages of the types a chat asked to clean
+
+    Messages are registered with their deletion time in a timer wheel and
+    in the pending_deletes store. Every tick the due messages are grouped
+    per chat and removed with batched deleteMessages calls; anything still
+    pending at shutdown is picked up again on the next start.
+    """
+
+    def __init__(self, delay: float, tick: float = 1.0):
+        self.delay = delay
+        self.tick = tick
+        self._wheel = TimerWheel(time.time(), tick)
+        self._task: Optional[asyncio.Task] = None
+        self._bot = None
+
+    def start(self, bot):
+        """Reload pending deletions and start the clock"""
+        self._bot = bot
+        self._wheel = TimerWheel(time.time(), self.tick)
+        for chat_id, messages in data.pending_deletes.items():
+            if not owns_chat(int(chat_id)):
+                continue
+            for message_id, due in messages.items():
+                self._wheel.schedule(due, (int(chat_id), int(message_id)))
+        if len(self._wheel):
+            logger.info(f"Restored {len(self._wheel)} pending message deletions")
+        self._task = asyncio.create_task(self._run(), name="message-cleaner")
+
+    async def stop(self):
+        """Stop the clock; pending deletions stay persisted"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def register(self, message: Optional[Message], clean_type: str) -> bool:
+        """Schedule a bot message for deletion if its chat cleans that type"""
+        if message is None:
+            return False
+        chat = data.chats.get(str(message.chat_id))
+        if not chat or clean_type not in chat.get('clean_types', []):
+            return False
+
+        due = time.time() + self.delay
+        self._wheel.schedule(due, (message.chat_id, message.message_id))
+        data.add_pending_delete(message.chat_id, message.message_id, due)
+        return True
+
+    async def _run(self):
+        """Delete due messages every tick"""
+        while True:
+            await asyncio.sleep(self.tick)
+            due = self._wheel.advance(time.time())
+            if not due:
+                continue
+
+            by_chat: Dict[int, List[int]] = {}
+            for chat_id, message_id in due:
+                by_chat.setdefault(chat_id, []).append(message_id)
+            for chat_id, message_ids in by_chat.items():
+                asyncio.create_task(self._delete(chat_id, message_ids))
+
+    async def _delete(self, chat_id: int, message_ids: List[int]):
+        """Delete one chat's due messages and forget them"""
+        try:
+            await delete_messages_batched(self._bot, chat_id, message_ids)
+        except Exception as e:
+            logger.warning(f"Failed to clean {len(message_ids)} messages in {chat_id}: {e}")
+        # Failed deletions are dropped too; retrying forever helps nobody
+        data.remove_pending_deletes(chat_id, message_ids)
+
+# Global message cleaner instance
+cleaner = MessageCleaner(config.Config.CLEAN_DELAY)
@@ -1,9 +1,13 @@
+import logging
 from functools import wraps
 from typing import Callable
 from telegram import Update
 from telegram.ext import ContextTypes
 import config
-from utils.helpers import is_admin, is_owner, log_action
+from utils.helpers import is_admin, is_owner, is_sudo
+from utils.sender import sender
+
+logger = logging.getLogger(__name__)
 
 def admin_only(func: Callable):
     """Decorator to restrict command to admins only"""
@@ -20,14 +24,14 @@ def admin_only(func: Callable):
             return await func(update, context, *args, **kwargs)
         
         # Check if user is admin in chat
-        if is_admin(chat_id, user_id, context):
+        if await is_admin(chat_id, user_id, context):
             return await func(update, context, *args, **kwargs)
         
         # Not admin
-        if update.message:
-            await update.message.reply_text("❌ You need to be an admin to use this command!")
+        if update.effective_message:
+            await sender.reply(update.effective_message, "❌ You need to be an admin to use this command!")
         
-        log_action("ADMIN_COMMAND_DENIED", user_id, chat_id, func.__name__)
+        logger.info(f"Admin command {func.__name__} denied to {user_id} in {chat_id}")
         return
     
     return wrapped
@@ -45,10 +49,10 @@ def owner_only(func: Callable):
             return await func(update, context, *args, **kwargs)
         
         # Not owner
-        if update.message:
-            await update.message.reply_text("❌ This command is only for the bot owner!")
+        if update.effective_message:
+            await sender.reply(update.effective_message, "❌ This command is only for the bot owner!")
         
-        log_action("OWNER_COMMAND_DENIED", user_id, func.__name__)
+        logger.info(f"Owner command {func.__name__} denied to {user_id}")
         return
     
     return wrapped
@@ -62,12 +66,12 @@ def sudo_only(func: Callable):
         
         user_id = update.effective_user.id
         
-        if user_id in config.Config.SUDO_USERS or is_owner(user_id):
+        if is_sudo(user_id):
             return await func(update, context, *args, **kwargs)
         
         # Not sudo
-        if update.message:
-            await update.message.reply_text("❌ This command is only for sudo users!")
+        if update.effective_message:
+            await sender.reply(update.effective_message, "❌ This command is only for sudo users!")
         
         return
     
@@ -86,8 +90,8 @@ def dev_only(func: Callable):
             return await func(update, context, *args, **kwargs)
         
         # Not dev
-        if update.message:
-            await update.message.reply_text("❌ This command is only for developers!")
+        if update.effective_message:
+            await sender.reply(update.effective_message, "❌ This command is only for developers!")
         
         return
     
@@ -98,7 +102,7 @@ def private_chat_only(func: Callable):
     @wraps(func)
     async def wrapped(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         if update.effective_chat.type != "private":
-            await update.message.reply_text("❌ This command can only be used in private chat!")
+            await sender.reply(update.effective_message, "❌ This command can only be used in private chat!")
             return
         
         return await func(update, context, *args, **kwargs)
@@ -110,7 +114,7 @@ def group_chat_only(func: Callable):
     @wraps(func)
     async def wrapped(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         if update.effective_chat.type not in ["group", "supergroup"]:
-            await update.message.reply_text("❌ This command can only be used in groups!")
+            await sender.reply(update.effective_message, "❌ This command can only be used in groups!")
             return
         
         return await func(update, context, *args, **kwargs)
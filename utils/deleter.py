@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from telegram.error import RetryAfter, TelegramError
+
+import config
+from utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Bot API limit for deleteMessages
+DELETE_BATCH_SIZE = 100
+
+# Shared by every bulk deletion so parallel purges can't flood the API
+delete_limiter = TokenBucket(config.Config.DELETE_RATE)
+
+async def _delete_chunk(bot, chat_id: int, chunk: List[int], semaphore: asyncio.Semaphore,
+                        limiter: TokenBucket) -> int:
+    """Delete one batch of up to DELETE_BATCH_SIZE messages"""
+    async with semaphore:
+        for _ in range(3):
+            await limiter.acquire()
+            try:
+                await bot.delete_messages(chat_id, chunk)
+                return len(chunk)
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TelegramError as e:
+                logger.warning(f"Failed to delete {len(chunk)} messages in {chat_id}: {e}")
+                return 0
+        return 0
+
+async def delete_messages_batched(bot, chat_id: int, message_ids: Iterable[int],
+                                  concurrency: Optional[int] = None,
+                                  limiter: Optional[TokenBucket] = None) -> int:
+    """Delete messages with batched deleteMessages calls
+    
+    Chunks are sent concurrently, at most `concurrency` at a time and
+    paced by `limiter`. Returns the number of message IDs submitted in
+    successful batches; Telegram skips IDs that no longer exist.
+    """
+    ids = sorted(set(message_ids))
+    if not ids:
+        return 0
+    
+    semaphore = asyncio.Semaphore(concurrency or config.Config.DELETE_CONCURRENCY)
+    limiter = limiter or delete_limiter
+    chunks = [ids[i:i + DELETE_BATCH_SIZE] for i in range(0, len(ids), DELETE_BATCH_SIZE)]
+    results = await asyncio.gather(
+        *(_delete_chunk(bot, chat_id, chunk, semaphore, limiter) for chunk in chunks)
+    )
+    return sum(results)
+
+class BatchDeleter:
+    """Coalesce single deletions into per-chat deleteMessages calls
+    
+    Messages queued for a chat within `window` seconds are removed
+    together; a full batch is sent right away.
+    """
+    
+    def __init__(self, window: float):
+        self.window = window
+        self._pending: Dict[int, List[int]] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+    
+    def add(self, bot, chat_id: int, message_id: int):
+        """Queue a message for deletion"""
+        pending = self._pending.setdefault(chat_id, [])
+        pending.append(message_id)
+        if len(pending) >= DELETE_BATCH_SIZE:
+            task = self._tasks.pop(chat_id, None)
+            if task:
+                task.cancel()
+            asyncio.create_task(self._flush(bot, chat_id))
+        elif chat_id not in self._tasks:
+            self._tasks[chat_id] = asyncio.create_task(self._flush_later(bot, chat_id))
+    
+    async def _flush_later(self, bot, chat_id: int):
+        """Delete a chat's queued messages once its window closes"""
+        await asyncio.sleep(self.window)
+        self._tasks.pop(chat_id, None)
+        await self._flush(bot, chat_id)
+    
+    async def _flush(self, bot, chat_id: int):
+        """Delete everything queued for a chat"""
+        ids = self._pending.pop(chat_id, None)
+        if ids:
+            await delete_messages_batched(bot, chat_id, ids)
+
+# Shared coalescing deleter for enforcement (locks, clean-up)
+batch_deleter = BatchDeleter(config.Config.DELETE_BATCH_WINDOW)
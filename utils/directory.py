@@ -0,0 +1,51 @@
+import logging
+import time
+from typing import Optional
+
+from cachetools import LRUCache
+from telegram import User
+from telegram.ext import ContextTypes
+
+import config
+from database import data
+from utils.pipeline import MessageContext
+
+logger = logging.getLogger(__name__)
+
+class UserDirectory:
+    """Record the usernames and names of users seen in updates
+
+    Runs as the first pipeline stage. A write only happens when a
+    user's username or names changed, or when their last_seen is more
+    than `seen_interval` seconds old, so a busy chat costs one dict
+    comparison per message rather than one store write.
+    """
+
+    def __init__(self, seen_interval: float, maxsize: int = 100000):
+        self.seen_interval = seen_interval
+        # user_id -> monotonic time of the last write
+        self._written: LRUCache = LRUCache(maxsize=maxsize)
+
+    async def observe(self, ctx: MessageContext, context: ContextTypes.DEFAULT_TYPE):
+        """Observe the sender and the users an update refers to"""
+        self._observe(ctx.user)
+        message = ctx.message
+        if message is None:
+            return
+        if message.reply_to_message:
+            self._observe(message.reply_to_message.from_user)
+        for member in message.new_chat_members:
+            self._observe(member)
+
+    def _observe(self, user: Optional[User]):
+        if user is None or user.is_bot:
+            return
+        now = time.monotonic()
+        written = self._written.get(user.id)
+        stale = written is None or now - written >= self.seen_interval
+        if data.observe_user(user.id, user.username or "", user.first_name or "",
+                             user.last_name or "", touch_seen=stale) or stale:
+            self._written[user.id] = now
+
+# Global user directory instance
+user_directory = UserDirectory(config.Config.USERNAME_SEEN_INTERVAL)
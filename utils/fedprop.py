@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+import config
+from database import data
+from utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Seconds between progress callbacks while a job runs
+PROGRESS_INTERVAL = 3
+
+# (done, failed, total, finished)
+Progress = Callable[[int, int, int, bool], None]
+
+def _owned(job: Dict) -> bool:
+    """Check if this shard queued a job (or took over its shard's chats)"""
+    return job.get('shard', 0) % config.Config.SHARD_COUNT == config.Config.SHARD_INDEX
+
+class FedPropagator:
+    """Apply federation bans and unbans in every member chat
+
+    Each /fban or /unfban becomes a job in the persistent fed_queue store
+    listing the chats still to process. A fixed pool of workers drains it
+    under a shared token bucket, so a federation of thousands of chats is
+    covered at FED_BAN_RATE calls per second without flood waits. A
+    RetryAfter pauses every worker; transient errors are retried with
+    backoff up to FED_MAX_ATTEMPTS; chats where the bot cannot act
+    (kicked, no rights, target is admin) are given up on at once. Jobs
+    still pending at shutdown resume on the next start of the shard that
+    queued them; shards share the queue table but only touch their own
+    jobs.
+    """
+
+    def __init__(self, rate: float, concurrency: int, max_attempts: int):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self._bucket = TokenBucket(rate)
+        self._paused_until = 0.0
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._bot = None
+
+    # ===== LIFECYCLE =====
+    def start(self, bot):
+        """Resume jobs left over from the last run"""
+        self._bot = bot
+        self._bucket = TokenBucket(self.rate)
+        for job_id, job in list(data.fed_queue.items()):
+            if _owned(job):
+                self._spawn(job_id)
+        if self._tasks:
+            logger.info(f"Resumed {len(self._tasks)} federation ban jobs")
+
+    async def stop(self):
+        """Stop all jobs; what is left stays queued"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    # ===== JOBS =====
+    def enqueue(self, fed_id: str, user_id: int, action: str,
+                progress: Optional[Progress] = None) -> Optional[str]:
+        """Queue a ban ("ban") or unban ("unban") in the federation's chats"""
+        # A newer action for the same user supersedes any unfinished one
+        for job_id, job in list(data.fed_queue.items()):
+            if _owned(job) and job['fed_id'] == fed_id and job['user_id'] == user_id:
+                task = self._tasks.pop(job_id, None)
+                if task:
+                    task.cancel()
+                data.remove_fed_job(job_id)
+
+        chats = data.feds[fed_id]['chats']
+        if not chats:
+            return None
+        job_id = data.add_fed_job(fed_id, user_id, action, chats, config.Config.SHARD_INDEX)
+        self._spawn(job_id, progress)
+        return job_id
+
+    def pending(self) -> int:
+        """Get the number of chats still queued across all jobs"""
+        return sum(len(job['pending']) for job in data.fed_queue.values() if _owned(job))
+
+    def _spawn(self, job_id: str, progress: Optional[Progress] = None):
+        task = asyncio.create_task(self._run_job(job_id, progress), name=f"fedprop-{job_id}")
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._forget(job_id, task))
+
+    def _forget(self, job_id: str, task: asyncio.Task):
+        """Drop a finished task unless a newer job took its place"""
+        if self._tasks.get(job_id) is task:
+            del self._tasks[job_id]
+
+    async def _run_job(self, job_id: str, progress: Optional[Progress]):
+        """Work through a job's chats until none are left to retry"""
+        job = data.fed_queue.get(job_id)
+        if job is None:
+            return
+        started = time.monotonic()
+        last_report = [started]
+
+        def report(finished: bool = False):
+            if not progress:
+                return
+            now = time.monotonic()
+            if finished or now - last_report[0] >= PROGRESS_INTERVAL:
+                last_report[0] = now
+                done = job['total'] - len(job['pending'])
+                progress(done, job['failed'], job['total'], finished)
+
+        backoff = 1.0
+        while job['pending']:
+            queue: asyncio.Queue = asyncio.Queue()
+            for chat_id in list(job['pending']):
+                queue.put_nowait(int(chat_id))
+            workers = [
+                asyncio.create_task(self._worker(job_id, job, queue, report))
+                for _ in range(min(self.concurrency, queue.qsize()))
+            ]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+
+            if job['pending']:
+                # Whatever is left failed transiently; wait and go again
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 300)
+
+        logger.info(
+            f"Federation {job['action']} of {job['user_id']} in {job['fed_id']}: "
+            f"{job['total'] - job['failed']}/{job['total']} chats "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+        report(finished=True)
+        data.remove_fed_job(job_id)
+
+    async def _worker(self, job_id: str, job: Dict, queue: asyncio.Queue, report: Callable):
+        """Process chats from the round's queue"""
+        while not queue.empty():
+            chat_id = queue.get_nowait()
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self._bucket.acquire()
+                try:
+                    await self._apply(job, chat_id)
+                except RetryAfter as e:
+                    retry_after = e.retry_after
+                    if not isinstance(retry_after, (int, float)):
+                        retry_after = retry_after.total_seconds()
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                    continue
+                except (BadRequest, Forbidden) as e:
+                    logger.debug(f"Federation {job['action']} skipped in {chat_id}: {e}")
+                    data.finish_fed_job_chat(job_id, chat_id, failed=True)
+                except Exception as e:
+                    attempts = data.retry_fed_job_chat(job_id, chat_id)
+                    if attempts >= self.max_attempts:
+                        logger.warning(f"Federation {job['action']} gave up in {chat_id}: {e}")
+                        data.finish_fed_job_chat(job_id, chat_id, failed=True)
+                else:
+                    data.finish_fed_job_chat(job_id, chat_id)
+                break
+            report()
+
+    async def _apply(self, job: Dict, chat_id: int):
+        """Ban or unban the job's user in one chat"""
+        if job['action'] == "ban":
+            await self._bot.ban_chat_member(chat_id, job['user_id'])
+        else:
+            await self._bot.unban_chat_member(chat_id, job['user_id'], only_if_banned=True)
+
+# Global federation ban propagator instance
+fed_propagator = FedPropagator(
+    config.Config.FED_BAN_RATE,
+    config.Config.FED_CONCURRENCY,
+    config.Config.FED_MAX_ATTEMPTS
+)
@@ -0,0 +1,85 @@
+import logging
+from typing import Optional
+
+from cachetools import TTLCache
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+import config
+from database import data
+from utils.deleter import batch_deleter
+from utils.pipeline import MessageContext
+from utils.sender import Priority, sender
+
+logger = logging.getLogger(__name__)
+
+class GbanEnforcer:
+    """Ban globally or federation banned users as soon as they join or speak
+
+    The common case (sender banned nowhere) is one set lookup for gbans
+    and one for the chat's merged federation ban set. Chat/user pairs
+    already handled are remembered for GBAN_ENFORCED_TTL seconds so a
+    banned user who keeps posting (e.g. the bot lacks ban rights) does
+    not trigger a ban call per message.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 100000):
+        self._enforced: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def check(self, ctx: MessageContext, context: ContextTypes.DEFAULT_TYPE):
+        """Check the sender and any joined members of a group message"""
+        message = ctx.message
+        if not ctx.is_group or message is None:
+            return
+        user = ctx.user
+        if user:
+            notice = self._ban_notice(ctx, user.id)
+            if notice:
+                await self._enforce(context, message.chat_id, user.id, notice)
+                batch_deleter.add(context.bot, message.chat_id, message.message_id)
+                raise ApplicationHandlerStop
+
+        for member in message.new_chat_members:
+            notice = self._ban_notice(ctx, member.id)
+            if notice:
+                await self._enforce(context, message.chat_id, member.id, notice)
+
+    def _ban_notice(self, ctx: MessageContext, user_id: int) -> Optional[str]:
+        """Get the removal notice for a banned user, or None"""
+        chat_id = ctx.chat_id
+        # Gbans are enforced unless the chat turned antispam off
+        if data.is_gbanned(user_id) and (not ctx.chat or ctx.chat.get('antispam', True)):
+            gban = data.get_gban(user_id) or {}
+            return (
+                f"🚫 User {user_id} is globally banned and was removed.\n"
+                f"Reason: {gban.get('reason', 'No reason provided')}"
+            )
+        if data.is_fbanned_in_chat(chat_id, user_id):
+            fed_id, fban = data.get_chat_fban(chat_id, user_id) or (None, {})
+            fed = data.feds.get(fed_id, {})
+            return (
+                f"🚫 User {user_id} is banned in federation {fed.get('name', fed_id)} and was removed.\n"
+                f"Reason: {fban.get('reason') or 'No reason provided'}"
+            )
+        return None
+
+    async def _enforce(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, notice: str):
+        """Ban a banned user from a chat once"""
+        key = (chat_id, user_id)
+        if key in self._enforced:
+            return
+        self._enforced[key] = True
+
+        try:
+            await context.bot.ban_chat_member(chat_id, user_id)
+        except Exception as e:
+            logger.warning(f"Could not enforce ban of {user_id} in {chat_id}: {e}")
+            return
+
+        # The notice is queued, not awaited, so enforcement never waits on
+        # the chat's send rate
+        context.application.create_task(sender.send_message(
+            chat_id, notice, priority=Priority.MODERATION
+        ))
+
+# Global gban enforcer instance
+gban_enforcer = GbanEnforcer(config.Config.GBAN_ENFORCED_TTL)
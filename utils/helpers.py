@@ -1,6 +1,8 @@
 import re
 from telegram.ext import ContextTypes
 import config
+from database import data
+from utils.admin_cache import admin_cache
 
 def extract_user_id(text: str):
     """Extract user ID from text"""
@@ -8,12 +10,14 @@ def extract_user_id(text: str):
         return None
     
     # Numeric ID
-    if text.isdigit():
-        return int(text)
+    match = re.match(r'^(\d+)$', text)
+    if match:
+        return int(match.group(1))
     
-    # Username (simplified)
-    if text.startswith('@'):
-        return None  # Would need to resolve
+    # Username, from the directory of users seen in updates
+    match = re.match(r'^@(\w+)$', text)
+    if match:
+        return data.resolve_username(match.group(1), config.Config.USERNAME_MAX_AGE)
     
     return None
 
@@ -22,16 +26,13 @@ def is_owner(user_id: int) -> bool:
     return user_id == config.Config.OWNER_ID
 
 def is_sudo(user_id: int) -> bool:
-    """Check if user is sudo"""
-    return user_id in config.Config.SUDO_USERS or is_owner(user_id)
+    """Check if user is sudo (from .env or /addsudo)"""
+    # The users store, unlike Config, is replicated to every shard
+    return is_owner(user_id) or user_id in config.Config.SUDO_USERS or data.is_sudo_user(user_id)
 
 async def is_admin(chat_id: int, user_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Check if user is admin in chat"""
-    try:
-        member = await context.bot.get_chat_member(chat_id, user_id)
-        return member.status in ['creator', 'administrator']
-    except:
-        return False
+    return await admin_cache.is_admin(context.bot, chat_id, user_id)
 
 def format_time(seconds: int) -> str:
     """Format seconds to human readable"""
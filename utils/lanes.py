@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Base semaphore size; the real cap is applied once an update's lane is free
+_UNBOUNDED = 2 ** 30
+
+class _Lane:
+    """Updates of one chat, run one at a time in arrival order"""
+
+    __slots__ = ('lock', 'depth')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.depth = 0
+
+class ChatLaneProcessor(BaseUpdateProcessor):
+    """Run updates of the same chat one after another, different chats in parallel
+
+    Every update is keyed by its chat (or its user when there is no chat)
+    into a FIFO lane, so two /warn in one chat cannot interleave on the
+    shared data. Updates that wait for their lane do not hold one of the
+    `max_concurrent_updates` slots: the cap only counts updates actually
+    running, so one busy chat cannot starve the others. Replies are
+    queued rather than awaited (see MessageScheduler.reply), so a chat
+    out of send budget does not hold up its own next update.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        # The base semaphore must not count updates waiting for their lane,
+        # so it is built unbounded and the real cap is applied per lane
+        self._limit = _UNBOUNDED
+        super().__init__(_UNBOUNDED)
+        self._limit = max_concurrent_updates
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lanes: Dict[Hashable, _Lane] = {}
+        self._running = 0
+        self._counters = {'processed': 0, 'queued': 0, 'peak_depth': 0}
+
+    @property
+    def max_concurrent_updates(self) -> int:
+        """Updates running at once across all lanes"""
+        return self._limit
+
+    async def initialize(self):
+        """Create the slot semaphore on the running loop"""
+        self._slots = asyncio.Semaphore(self._limit)
+
+    async def shutdown(self):
+        """Nothing to release; lanes empty as their updates finish"""
+
+    @staticmethod
+    def _lane_key(update: object) -> Optional[Hashable]:
+        """Get the lane of an update: its chat, else its user"""
+        if not isinstance(update, Update):
+            return None
+        chat = update.effective_chat
+        if chat:
+            return chat.id
+        user = update.effective_user
+        return ("user", user.id) if user else None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]):
+        """Wait for the update's lane, then for a free slot, then run it"""
+        key = self._lane_key(update)
+        if key is None:
+            async with self._slots:
+                await self._run(coroutine)
+            return
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane()
+        lane.depth += 1
+        if lane.depth > 1:
+            self._counters['queued'] += 1
+            if lane.depth > self._counters['peak_depth']:
+                self._counters['peak_depth'] = lane.depth
+        try:
+            async with lane.lock:
+                async with self._slots:
+                    await self._run(coroutine)
+        finally:
+            lane.depth -= 1
+            if not lane.depth:
+                del self._lanes[key]
+
+    async def _run(self, coroutine: Awaitable[Any]):
+        self._running += 1
+        try:
+            await coroutine
+        finally:
+            self._running -= 1
+            self._counters['processed'] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Get lane depths and counters"""
+        depths = [lane.depth for lane in self._lanes.values()]
+        return {
+            'running': self._running,
+            'lanes': len(depths),
+            'waiting': sum(depths) - len(depths),
+            'deepest_lane': max(depths, default=0),
+            **self._counters,
+        }
+
+# Global update processor instance
+lane_processor = ChatLaneProcessor(config.Config.UPDATE_CONCURRENCY)
@@ -0,0 +1,158 @@
+import logging
+from typing import Dict, Iterable, Optional
+
+from cachetools import LRUCache
+from telegram import Message, MessageEntity
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+import config
+from database import data
+from utils.admin_cache import admin_cache
+from utils.deleter import batch_deleter
+from utils.helpers import is_sudo
+from utils.pipeline import MessageContext
+
+logger = logging.getLogger(__name__)
+
+# One bit per lockable type, in Config.LOCK_TYPES order
+LOCK_BITS: Dict[str, int] = {name: 1 << i for i, name in enumerate(config.Config.LOCK_TYPES)}
+ALL_LOCKS = (1 << len(config.Config.LOCK_TYPES)) - 1
+
+_URL_ENTITIES = (MessageEntity.URL, MessageEntity.TEXT_LINK)
+
+def lock_mask(lock_types: Iterable[str], locked: bool = False) -> int:
+    """Build the bitmask of a chat's locks"""
+    if locked:
+        return ALL_LOCKS
+    mask = 0
+    for name in lock_types:
+        mask |= LOCK_BITS.get(name, 0)
+    return mask
+
+def _bit(name: str) -> int:
+    return LOCK_BITS.get(name, 0)
+
+_TEXT, _AUDIO, _VOICE, _VIDEO, _PHOTO, _DOCUMENT = map(
+    _bit, ("text", "audio", "voice", "video", "photo", "document")
+)
+_STICKER, _GIF, _GAME, _POLL, _FORWARD, _LOCATION = map(
+    _bit, ("sticker", "gif", "game", "poll", "forward", "location")
+)
+_CONTACT, _URL, _BOT, _INLINE, _ALL = map(_bit, ("contact", "url", "bot", "inline", "all"))
+# Locks that commands and service messages are exempt from
+_CHAT_LOCKS = _TEXT | _ALL
+
+def is_service(message: Message) -> bool:
+    """Check if a message is a service notice (join, leave, pin, title...)"""
+    return message.text is None and message.effective_attachment is None
+
+def classify(message: Message) -> int:
+    """Get the lock bits a message falls under"""
+    # Every message falls under the "all" lock
+    kinds = _ALL
+    if message.text is not None:
+        kinds |= _TEXT
+    if message.audio:
+        kinds |= _AUDIO
+    if message.voice:
+        kinds |= _VOICE
+    if message.video or message.video_note:
+        kinds |= _VIDEO
+    if message.photo:
+        kinds |= _PHOTO
+    if message.animation:
+        kinds |= _GIF
+    elif message.document:
+        kinds |= _DOCUMENT
+    if message.sticker:
+        kinds |= _STICKER
+    if message.game:
+        kinds |= _GAME
+    if message.poll:
+        kinds |= _POLL
+    if message.forward_origin:
+        kinds |= _FORWARD
+    if message.location or message.venue:
+        kinds |= _LOCATION
+    if message.contact:
+        kinds |= _CONTACT
+    if message.via_bot:
+        kinds |= _INLINE
+    if message.new_chat_members and any(member.is_bot for member in message.new_chat_members):
+        kinds |= _BOT
+    for entity in message.entities or message.caption_entities:
+        if entity.type in _URL_ENTITIES:
+            kinds |= _URL
+            break
+    return kinds
+
+class LockEnforcer:
+    """Delete messages that break a chat's locks
+
+    Each chat's locks are kept as a bitmask, so a message costs one
+    classification and one AND; admins are only looked up on a hit.
+    Commands and service messages never count as "text" or "all", so
+    locked chats still take commands and greet new members. Only
+    chats with locks are cached, in an LRU: the many unlocked chats are
+    answered from the settings record the pipeline already looked up.
+    """
+
+    def __init__(self, maxsize: int):
+        self._masks: LRUCache = LRUCache(maxsize=maxsize)
+
+    def get_mask(self, chat_id: int, chat: Optional[Dict] = None) -> int:
+        """Get the lock bitmask of a chat"""
+        mask = self._masks.get(chat_id)
+        if mask is None:
+            if chat is None:
+                chat = data.chats.get(str(chat_id))
+            mask = lock_mask(chat.get('lock_types', []), chat.get('is_locked', False)) if chat else 0
+            if mask:
+                self._masks[chat_id] = mask
+        return mask
+
+    def invalidate(self, chat_id: int):
+        """Drop the cached locks of a chat after they change"""
+        self._masks.pop(chat_id, None)
+
+    async def check(self, ctx: MessageContext, context: ContextTypes.DEFAULT_TYPE):
+        """Enforce locks on an incoming group message"""
+        message = ctx.message
+        if not ctx.is_group or message is None:
+            return
+        chat_id = ctx.chat_id
+        mask = self.get_mask(chat_id, ctx.chat)
+        if not mask:
+            return
+
+        exempt = ctx.is_command or is_service(message)
+        if mask & _ALL and not exempt:
+            # Under the "all" lock there is nothing to classify
+            violations = _ALL
+        else:
+            violations = classify(message) & mask
+            if exempt:
+                violations &= ~_CHAT_LOCKS
+        if not violations:
+            return
+
+        # Admins and anonymous admins posting as the chat are exempt
+        if message.sender_chat and message.sender_chat.id == chat_id:
+            return
+        user = ctx.user
+        if user and (is_sudo(user.id) or await admin_cache.is_admin(context.bot, chat_id, user.id)):
+            return
+
+        if violations & _BOT:
+            for member in message.new_chat_members:
+                if member.is_bot:
+                    try:
+                        await context.bot.ban_chat_member(chat_id, member.id)
+                    except Exception as e:
+                        logger.warning(f"Could not remove bot {member.id} from {chat_id}: {e}")
+
+        batch_deleter.add(context.bot, chat_id, message.message_id)
+        raise ApplicationHandlerStop
+
+# Global lock enforcer instance
+lock_enforcer = LockEnforcer(config.Config.LOCK_CACHE_SIZE)
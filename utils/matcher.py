@@ -0,0 +1,88 @@
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cachetools import LRUCache
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over a fixed list of keywords
+    
+    Finds, in a single pass over the text, the keyword with the lowest
+    index that occurs anywhere in it.
+    """
+    
+    __slots__ = ('keywords', '_goto', '_fail', '_out')
+    
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords: List[str] = list(keywords)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Lowest keyword index ending at each state, following fail links
+        self._out: List[Optional[int]] = [None]
+        
+        for index, keyword in enumerate(self.keywords):
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(None)
+                state = nxt
+            if self._out[state] is None:
+                self._out[state] = index
+        
+        self._build_fail_links()
+    
+    def _build_fail_links(self):
+        """Compute failure links breadth-first and merge outputs"""
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in goto[state].items():
+                queue.append(nxt)
+                link = fail[state]
+                while link and char not in goto[link]:
+                    link = fail[link]
+                fail[nxt] = goto[link].get(char, 0)
+                inherited = out[fail[nxt]]
+                if inherited is not None and (out[nxt] is None or inherited < out[nxt]):
+                    out[nxt] = inherited
+    
+    def first_match(self, text: str) -> Optional[str]:
+        """Get the earliest-added keyword contained in text"""
+        goto, fail, out = self._goto, self._fail, self._out
+        best = None
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found = out[state]
+            if found is not None and (best is None or found < best):
+                best = found
+                if best == 0:
+                    break
+        return None if best is None else self.keywords[best]
+
+class MatcherCache:
+    """LRU cache of compiled keyword matchers keyed by chat
+    
+    Entries carry the generation they were built for; a bumped generation
+    makes the next lookup rebuild the matcher.
+    """
+    
+    def __init__(self, maxsize: int = 1024):
+        self._cache: LRUCache = LRUCache(maxsize=maxsize)
+    
+    def get(self, chat_id: str, generation: int, keywords: Iterable[str]) -> KeywordMatcher:
+        """Get the matcher for a chat, rebuilding it if stale"""
+        entry: Optional[Tuple[int, KeywordMatcher]] = self._cache.get(chat_id)
+        if entry is None or entry[0] != generation:
+            entry = (generation, KeywordMatcher(keywords))
+            self._cache[chat_id] = entry
+        return entry[1]
@@ -0,0 +1,85 @@
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram import Message, Update, User
+from telegram.ext import ContextTypes
+
+from database import data
+from utils.router import split_command
+
+logger = logging.getLogger(__name__)
+
+class MessageContext:
+    """What every stage of one update's pipeline shares
+
+    The chat's settings are looked up once (None if the bot has no record
+    of the chat) instead of by each stage.
+    """
+
+    __slots__ = ('update', 'message', 'user', 'chat_id', 'chat_key', 'chat', 'is_group', 'is_command')
+
+    def __init__(self, update: Update):
+        self.update = update
+        self.message: Optional[Message] = update.effective_message
+        self.user: Optional[User] = update.effective_user
+        chat = update.effective_chat
+        self.chat_id: Optional[int] = chat.id if chat else None
+        self.chat_key: Optional[str] = str(chat.id) if chat else None
+        self.chat: Optional[Dict] = data.chats.get(self.chat_key) if chat else None
+        self.is_group = bool(chat) and chat.type in ("group", "supergroup")
+        self.is_command = self.message is not None and split_command(self.message) is not None
+
+# A stage returns True to skip the stages after it; raising
+# ApplicationHandlerStop also keeps the update from command handlers
+Stage = Callable[[MessageContext, ContextTypes.DEFAULT_TYPE], Awaitable[Optional[bool]]]
+
+class Pipeline:
+    """Ordered middleware run once per update
+
+    Replaces a separate handler per concern: the update is wrapped in one
+    MessageContext and handed to each stage in turn, and the time spent
+    in every stage is recorded for /stats.
+    """
+
+    def __init__(self):
+        self._stages: List[Tuple[str, Stage]] = []
+        # name -> [calls, total seconds, slowest call]
+        self._timings: Dict[str, List[float]] = {}
+
+    def add(self, name: str, stage: Stage):
+        """Append a stage"""
+        self._stages.append((name, stage))
+        self._timings[name] = [0, 0.0, 0.0]
+
+    async def handle_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Run an update through the stages until one stops it"""
+        ctx = MessageContext(update)
+        for name, stage in self._stages:
+            started = time.perf_counter()
+            try:
+                done = await stage(ctx, context)
+            finally:
+                elapsed = time.perf_counter() - started
+                timing = self._timings[name]
+                timing[0] += 1
+                timing[1] += elapsed
+                if elapsed > timing[2]:
+                    timing[2] = elapsed
+            if done:
+                return
+
+    def stats(self) -> List[Tuple[str, int, float, float]]:
+        """Get (stage, calls, mean seconds, slowest seconds) in stage order"""
+        return [
+            (name, int(calls), total / calls if calls else 0.0, slowest)
+            for name, (calls, total, slowest) in self._timings.items()
+        ]
+
+    def reset_stats(self):
+        """Zero the recorded timings"""
+        for name in self._timings:
+            self._timings[name] = [0, 0.0, 0.0]
+
+# Global message pipeline instance
+pipeline = Pipeline()
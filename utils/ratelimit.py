@@ -0,0 +1,46 @@
+import asyncio
+import time
+from typing import Optional
+
+class TokenBucket:
+    """Async token bucket rate limiter
+    
+    Holds up to `capacity` tokens and refills at `rate` tokens per second.
+    """
+    
+    __slots__ = ('rate', 'capacity', '_tokens', '_updated')
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+    
+    def _refill(self):
+        """Add tokens for the time elapsed since the last refill"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def delay(self, tokens: float = 1) -> float:
+        """Get seconds until `tokens` are available (0 if available now)"""
+        self._refill()
+        if self._tokens >= tokens:
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+    
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Take tokens if available without waiting"""
+        if self.delay(tokens):
+            return False
+        self._tokens -= tokens
+        return True
+    
+    async def acquire(self, tokens: float = 1):
+        """Wait until tokens are available and take them"""
+        while True:
+            wait = self.delay(tokens)
+            if not wait:
+                self._tokens -= tokens
+                return
+            await asyncio.sleep(wait)
@@ -0,0 +1,84 @@
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram import Message, MessageEntity, Update
+from telegram.ext import BaseHandler, ContextTypes, filters
+
+logger = logging.getLogger(__name__)
+
+PREFIXES = ("/", "!")
+
+_NAME = re.compile(r"\w+")
+
+Callback = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[Any]]
+
+def split_command(message: Message) -> Optional[Tuple[str, Optional[str]]]:
+    """Get the lowercased command and @botname a message starts with
+
+    `/` commands need Telegram's bot_command entity at the start, like
+    CommandHandler; `!` commands need a name right after the `!`.
+    """
+    text = message.text
+    if not text or text[0] not in PREFIXES:
+        return None
+    if text[0] == "/":
+        entities = message.entities
+        if not entities or entities[0].offset != 0 or entities[0].type != MessageEntity.BOT_COMMAND:
+            return None
+        word = text[1:entities[0].length]
+    else:
+        word = text.split(None, 1)[0][1:]
+
+    command, _, bot_name = word.partition("@")
+    if not _NAME.fullmatch(command):
+        return None
+    return command.lower(), bot_name.lower() or None
+
+class CommandRouter(BaseHandler):
+    """One handler for every command, with `/` or `!` prefix
+
+    The first word of a message is split into prefix, command and an
+    optional @botname once, and the command is looked up in a dict, so
+    a message that is not a known command costs one miss and falls
+    through to the other handlers of its group. Like CommandHandler, new
+    and edited messages are routed, and context.args is filled the same
+    way.
+    """
+
+    def __init__(self):
+        # Callbacks are per command, see handle_update
+        super().__init__(None)
+        self._commands: Dict[str, Callback] = {}
+        self.bot_username: Optional[str] = None
+
+    def add(self, command: str, callback: Callback):
+        """Route /command and !command to a callback"""
+        self._commands[command.lower()] = callback
+
+    def set_bot_username(self, username: str):
+        """Set the name that /command@botname must match"""
+        self.bot_username = username.lower() if username else None
+
+    def check_update(self, update: object) -> Optional[Tuple[Callback, List[str]]]:
+        """Get the callback and arguments of a known command"""
+        if not isinstance(update, Update) or not filters.UpdateType.MESSAGES.check_update(update):
+            return None
+        message = update.effective_message
+        parsed = split_command(message)
+        if parsed is None:
+            return None
+
+        command, bot_name = parsed
+        if bot_name and bot_name != self.bot_username:
+            return None
+        callback = self._commands.get(command)
+        if callback is None:
+            return None
+        return callback, message.text.split()[1:]
+
+    async def handle_update(self, update: Update, application, check_result, context):
+        """Call the routed command with its arguments"""
+        callback, args = check_result
+        context.args = args
+        return await callback(update, context)
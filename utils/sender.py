@@ -0,0 +1,255 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from cachetools import TTLCache
+from telegram import Message
+from telegram.error import RetryAfter
+
+import config
+from utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+class Priority(IntEnum):
+    """Send order when the outbound queue is backed up (lower goes first)"""
+    MODERATION = 0
+    COMMAND = 1
+    BULK = 2
+
+class _Job:
+    """One queued API call"""
+    
+    __slots__ = ('priority', 'seq', 'chat_id', 'factory', 'future')
+    
+    def __init__(self, priority: int, seq: int, chat_id: int,
+                 factory: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.factory = factory
+        self.future = future
+    
+    def __lt__(self, other: "_Job") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class MessageScheduler:
+    """Central outbound queue for every message the bot sends
+    
+    Jobs are released in priority order under a global token bucket
+    (Telegram's ~30 msg/s) and a per-chat bucket (~20 msg/min in groups,
+    ~1 msg/s in private chats). A RetryAfter parks only the affected
+    chat; its jobs are re-queued in their original order once the wait
+    is over while other chats keep flowing.
+    """
+    
+    def __init__(self):
+        self._heap: List[_Job] = []
+        self._seq = itertools.count()
+        self._global = TokenBucket(config.Config.GLOBAL_SEND_RATE)
+        self._chat_buckets: TTLCache = TTLCache(maxsize=100000, ttl=300)
+        self._parked_until: Dict[int, float] = {}
+        self._deferred: Dict[int, List[_Job]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._bot = None
+        self._in_flight = 0
+        self._counters = {'sent': 0, 'failed': 0, 'retry_after': 0}
+    
+    # ===== LIFECYCLE =====
+    def start(self, bot):
+        """Start dispatching on the running event loop"""
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(config.Config.SEND_CONCURRENCY)
+        self._dispatcher = asyncio.create_task(self._dispatch(), name="message-scheduler")
+        if self._heap:
+            self._wakeup.set()
+    
+    async def stop(self):
+        """Stop dispatching and cancel whatever is still queued"""
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        
+        pending = list(self._heap) + [job for jobs in self._deferred.values() for job in jobs]
+        self._heap.clear()
+        self._deferred.clear()
+        for job in pending:
+            job.future.cancel()
+        if pending:
+            logger.info(f"Dropped {len(pending)} unsent messages on shutdown")
+    
+    # ===== QUEUEING =====
+    def submit(self, chat_id: int, factory: Callable[[], Awaitable[Any]],
+               priority: int = Priority.COMMAND) -> asyncio.Future:
+        """Queue an API call for a chat; factory is called (again on retry) to send it"""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, _Job(priority, next(self._seq), chat_id, factory, future))
+        if self._wakeup:
+            self._wakeup.set()
+        return future
+    
+    async def send(self, chat_id: int, factory: Callable[[], Awaitable[Any]],
+                   priority: int = Priority.COMMAND) -> Any:
+        """Queue an API call and wait for its result"""
+        return await self.submit(chat_id, factory, priority)
+    
+    def post(self, chat_id: int, factory: Callable[[], Awaitable[Any]],
+             priority: int = Priority.COMMAND,
+             on_sent: Optional[Callable[[Any], None]] = None) -> asyncio.Future:
+        """Queue an API call without waiting for it; failures are logged"""
+        future = self.submit(chat_id, factory, priority)
+        
+        def settled(future: asyncio.Future):
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                logger.warning(f"Queued message to {chat_id} failed: {future.exception()}")
+            elif on_sent:
+                on_sent(future.result())
+        
+        future.add_done_callback(settled)
+        return future
+    
+    async def reply(self, message: Message, text: str, priority: int = Priority.COMMAND,
+                    wait: bool = False, on_sent: Optional[Callable[[Message], None]] = None,
+                    **kwargs) -> Optional[Message]:
+        """Queue message.reply_text
+        
+        Returns once queued: the handler holds its chat's lane until it
+        returns, and the chat's bucket may not free up for a minute. Use
+        on_sent for the sent message, or wait=True to wait for it.
+        """
+        return await self._queue(
+            message.chat_id, lambda: message.reply_text(text, **kwargs), priority, wait, on_sent
+        )
+    
+    async def send_message(self, chat_id: int, text: str, priority: int = Priority.COMMAND,
+                           wait: bool = False, on_sent: Optional[Callable[[Message], None]] = None,
+                           **kwargs) -> Optional[Message]:
+        """Queue bot.send_message; see reply"""
+        return await self._queue(
+            chat_id, lambda: self._bot.send_message(chat_id=chat_id, text=text, **kwargs),
+            priority, wait, on_sent
+        )
+    
+    async def _queue(self, chat_id: int, factory: Callable[[], Awaitable[Any]], priority: int,
+                     wait: bool, on_sent: Optional[Callable[[Any], None]]) -> Any:
+        """Send and wait, or only queue"""
+        if not wait:
+            self.post(chat_id, factory, priority, on_sent)
+            return None
+        result = await self.send(chat_id, factory, priority)
+        if on_sent:
+            on_sent(result)
+        return result
+    
+    # ===== DISPATCH =====
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        """Get the rate limiter of a chat"""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:
+                per_minute = config.Config.GROUP_SEND_RATE
+                bucket = TokenBucket(per_minute / 60, capacity=per_minute)
+            else:
+                bucket = TokenBucket(config.Config.PRIVATE_SEND_RATE)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+    
+    def _defer(self, job: _Job, delay: float):
+        """Hold a job back until its chat can send again"""
+        deferred = self._deferred.get(job.chat_id)
+        if deferred is None:
+            deferred = self._deferred[job.chat_id] = []
+            asyncio.get_running_loop().call_later(delay, self._release, job.chat_id)
+        deferred.append(job)
+    
+    def _release(self, chat_id: int):
+        """Put a chat's deferred jobs back into the queue"""
+        for job in self._deferred.pop(chat_id, ()):
+            heapq.heappush(self._heap, job)
+        self._wakeup.set()
+    
+    async def _dispatch(self):
+        """Pop jobs in priority order and start them when limits allow"""
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            
+            job = heapq.heappop(self._heap)
+            if job.future.done():
+                continue
+            
+            # Keep per-chat order: if the chat already has held-back jobs,
+            # this one waits behind them
+            if job.chat_id in self._deferred:
+                self._deferred[job.chat_id].append(job)
+                continue
+            
+            parked = self._parked_until.get(job.chat_id, 0) - time.monotonic()
+            if parked > 0:
+                self._defer(job, parked)
+                continue
+            self._parked_until.pop(job.chat_id, None)
+            
+            bucket = self._chat_bucket(job.chat_id)
+            if not bucket.try_acquire():
+                self._defer(job, bucket.delay())
+                continue
+            
+            await self._global.acquire()
+            await self._slots.acquire()
+            self._in_flight += 1
+            asyncio.create_task(self._run(job))
+    
+    async def _run(self, job: _Job):
+        """Perform one API call and settle its future"""
+        try:
+            result = await job.factory()
+        except RetryAfter as e:
+            self._counters['retry_after'] += 1
+            logger.warning(f"Flood wait of {e.retry_after}s in chat {job.chat_id}")
+            self._parked_until[job.chat_id] = time.monotonic() + e.retry_after
+            self._defer(job, e.retry_after)
+        except Exception as e:
+            self._counters['failed'] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self._counters['sent'] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+    
+    # ===== METRICS =====
+    def metrics(self) -> Dict[str, Any]:
+        """Get queue depths and counters"""
+        by_priority = {priority.name.lower(): 0 for priority in Priority}
+        for job in self._heap:
+            by_priority[Priority(job.priority).name.lower()] += 1
+        return {
+            'queued': len(self._heap),
+            'queued_by_priority': by_priority,
+            'deferred': sum(len(jobs) for jobs in self._deferred.values()),
+            'parked_chats': sum(1 for until in self._parked_until.values() if until > time.monotonic()),
+            'in_flight': self._in_flight,
+            **self._counters,
+        }
+
+# Global outbound scheduler instance
+sender = MessageScheduler()
@@ -0,0 +1,60 @@
+from typing import Any, Dict
+
+import config
+
+_MASK = (1 << 64) - 1
+
+# Update kinds whose payload carries the chat directly
+_CHAT_UPDATES = (
+    "message", "edited_message", "channel_post", "edited_channel_post",
+    "business_message", "edited_business_message", "my_chat_member",
+    "chat_member", "chat_join_request", "message_reaction",
+    "message_reaction_count", "chat_boost", "removed_chat_boost"
+)
+
+# Update kinds without a chat, routed by their user
+_USER_UPDATES = (
+    "inline_query", "chosen_inline_result", "shipping_query",
+    "pre_checkout_query", "poll_answer"
+)
+
+def shard_of(chat_id: int, count: int) -> int:
+    """Get the shard owning a chat
+
+    Chat ids are mixed first: group ids share long prefixes and are
+    handed out roughly in sequence, so a plain modulo would cluster.
+    """
+    if count <= 1:
+        return 0
+    mixed = (int(chat_id) * 0x9E3779B97F4A7C15) & _MASK
+    return (mixed >> 32) % count
+
+def route_key(payload: Dict[str, Any]) -> int:
+    """Get the chat id (else the user id) of a raw update payload
+
+    Matches what the update's effective_chat / effective_user will be,
+    so a chat's updates always land on the same shard and lane.
+    """
+    for kind in _CHAT_UPDATES:
+        body = payload.get(kind)
+        if body and body.get("chat"):
+            return body["chat"]["id"]
+
+    query = payload.get("callback_query")
+    if query:
+        message = query.get("message")
+        if message and message.get("chat"):
+            return message["chat"]["id"]
+        return query["from"]["id"]
+
+    for kind in _USER_UPDATES:
+        body = payload.get(kind)
+        if body:
+            user = body.get("from") or body.get("user")
+            if user:
+                return user["id"]
+    return 0
+
+def owns_chat(chat_id: int) -> bool:
+    """Check if this process is the shard handling a chat"""
+    return shard_of(chat_id, config.Config.SHARD_COUNT) == config.Config.SHARD_INDEX
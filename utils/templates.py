@@ -0,0 +1,94 @@
+import re
+from typing import Callable, Dict, List, Optional
+
+from cachetools import LRUCache
+
+# Variables available in welcome/goodbye messages
+PLACEHOLDERS = ("first", "last", "fullname", "username", "id", "chat", "count", "mention")
+
+_TOKEN = re.compile(r"\{\{|\}\}|\{([^{}]*)\}|[{}]")
+
+class TemplateError(ValueError):
+    """Raised for a template that cannot be compiled"""
+
+class Template:
+    """A greeting parsed into literal text and placeholder segments
+
+    Segments are stored as ["text", value] / ["field", name] pairs so the
+    compiled form can be saved next to the raw text in the chat record.
+    """
+
+    __slots__ = ('source', 'segments', 'fields')
+
+    def __init__(self, source: str, segments: List[List[str]]):
+        self.source = source
+        self.segments = segments
+        self.fields = {value for kind, value in segments if kind == "field"}
+
+    def render(self, values: Dict[str, Callable[[], str]]) -> str:
+        """Fill the template, computing each used placeholder once"""
+        resolved = {name: values[name]() for name in self.fields}
+        return "".join(
+            resolved[value] if kind == "field" else value
+            for kind, value in self.segments
+        )
+
+def compile_template(text: str, strict: bool = True) -> Template:
+    """Parse a template; {{ and }} are literal braces
+
+    In strict mode unknown placeholders and unbalanced braces raise
+    TemplateError. Otherwise they are kept as plain text, which is how
+    messages saved before templates were compiled always rendered.
+    """
+    segments: List[List[str]] = []
+    literal: List[str] = []
+    position = 0
+
+    for match in _TOKEN.finditer(text):
+        literal.append(text[position:match.start()])
+        position = match.end()
+        token = match.group(0)
+        name = match.group(1)
+
+        if name is not None and name in PLACEHOLDERS:
+            if literal:
+                segments.append(["text", "".join(literal)])
+                literal = []
+            segments.append(["field", name])
+        elif not strict:
+            literal.append(token)
+        elif token in ("{{", "}}"):
+            literal.append(token[0])
+        elif name is not None:
+            raise TemplateError(f"unknown variable {token}")
+        else:
+            raise TemplateError(f"unbalanced '{token}' (use {token * 2} for a literal brace)")
+
+    literal.append(text[position:])
+    if "".join(literal):
+        segments.append(["text", "".join(literal)])
+    return Template(text, segments)
+
+class TemplateCache:
+    """Compiled greetings of recently active chats"""
+
+    def __init__(self, maxsize: int):
+        self._cache: LRUCache = LRUCache(maxsize=maxsize)
+
+    def get(self, chat: Dict, field: str) -> Optional[Template]:
+        """Get the compiled template of a chat's welcome/goodbye field"""
+        source = chat.get(field)
+        if not source:
+            return None
+
+        key = (chat['id'], field)
+        template = self._cache.get(key)
+        if template is None or template.source != source:
+            segments = chat.get(f"{field}_tpl")
+            if segments:
+                template = Template(source, segments)
+            else:
+                # Saved before templates were compiled
+                template = compile_template(source, strict=False)
+            self._cache[key] = template
+        return template
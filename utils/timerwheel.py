@@ -0,0 +1,76 @@
+import math
+from typing import Any, List, Tuple
+
+class TimerWheel:
+    """Hierarchical timing wheel
+
+    Level 0 has one slot per tick; each higher level covers SLOTS times
+    the span of the one below. Scheduling is O(1) and each entry is moved
+    down at most once per level as its deadline approaches, so advancing
+    the clock costs O(due entries) no matter how many are pending.
+    """
+
+    BITS = 6
+    SLOTS = 1 << BITS
+    MASK = SLOTS - 1
+
+    def __init__(self, now: float, tick: float = 1.0, levels: int = 5):
+        self.tick = tick
+        self.levels = levels
+        self._current = int(now // tick)
+        self._wheels: List[List[List[Tuple[int, Any]]]] = [
+            [[] for _ in range(self.SLOTS)] for _ in range(levels)
+        ]
+        self._ready: List[Any] = []
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def schedule(self, deadline: float, item: Any):
+        """Fire item once the clock reaches deadline"""
+        self._size += 1
+        self._place(math.ceil(deadline / self.tick), item)
+
+    def _place(self, expires: int, item: Any):
+        """Put an entry in the slot covering its expiry tick"""
+        delta = expires - self._current
+        if delta <= 0:
+            self._ready.append(item)
+            return
+
+        # Past the top level the entry waits in the last slot and is
+        # re-placed when that slot cascades
+        delta = min(delta, (1 << (self.BITS * self.levels)) - 1)
+        level = 0
+        while delta >= 1 << (self.BITS * (level + 1)):
+            level += 1
+        index = ((self._current + delta) >> (self.BITS * level)) & self.MASK
+        self._wheels[level][index].append((expires, item))
+
+    def advance(self, now: float) -> List[Any]:
+        """Move the clock to now and return every entry that came due"""
+        target = int(now // self.tick)
+        while self._current < target:
+            self._current += 1
+            current = self._current
+
+            # Cascade from the highest level whose slot boundary we crossed
+            top = 0
+            while top + 1 < self.levels and not current & ((1 << (self.BITS * (top + 1))) - 1):
+                top += 1
+            for level in range(top, 0, -1):
+                index = (current >> (self.BITS * level)) & self.MASK
+                entries = self._wheels[level][index]
+                self._wheels[level][index] = []
+                for expires, item in entries:
+                    self._place(expires, item)
+
+            slot = self._wheels[0][current & self.MASK]
+            if slot:
+                self._wheels[0][current & self.MASK] = []
+                self._ready.extend(item for _, item in slot)
+
+        ready, self._ready = self._ready, []
+        self._size -= len(ready)
+        return ready
@@ -0,0 +1,148 @@
+import hmac
+import json
+import logging
+import ssl
+from typing import Any, Callable, Dict, Optional
+
+from telegram import Bot, Update
+from tornado.httpserver import HTTPServer
+from tornado.web import Application, RequestHandler
+
+import config
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Receives each update payload; must not block, and raises ValueError
+# for a payload that is not an update
+Sink = Callable[[Dict[str, Any]], None]
+
+class _UpdateHandler(RequestHandler):
+    """POST an update, GET a health check"""
+
+    def initialize(self, server: "WebhookServer"):
+        self.server = server
+
+    def _has_secret(self) -> bool:
+        token = self.request.headers.get(SECRET_HEADER) or ""
+        return hmac.compare_digest(token.encode(), self.server.secret.encode())
+
+    def get(self):
+        # The counters are only shown to callers that know the secret
+        if self.server.secret and self._has_secret():
+            self.write({'ok': True, **self.server.metrics()})
+        else:
+            self.write("ok")
+
+    def post(self):
+        server = self.server
+        if server.secret and not self._has_secret():
+            server.counters['rejected'] += 1
+            self.send_error(403)
+            return
+        try:
+            payload = json.loads(self.request.body)
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            server.counters['rejected'] += 1
+            self.send_error(400)
+            return
+
+        # Acknowledge as soon as the update is queued; Telegram holds back
+        # the next updates until it gets the 200
+        try:
+            server.sink(payload)
+        except ValueError:
+            # Retrying would not make it parse
+            server.counters['rejected'] += 1
+            self.send_error(400)
+            return
+        server.counters['received'] += 1
+
+def _log_request(handler: RequestHandler):
+    """Log failed requests only; one line per update is too much"""
+    if handler.get_status() >= 400:
+        logger.warning(f"Webhook {handler.request.method} {handler.request.uri} -> {handler.get_status()}")
+
+class WebhookServer:
+    """Minimal HTTP(S) server feeding webhook updates to a sink
+
+    Telegram POSTs each update as JSON to `path`; when a secret is set,
+    requests without the matching secret token header are refused.
+    Recorded updates can be POSTed the same way to test locally.
+    """
+
+    def __init__(self, sink: Sink, listen: str, port: int, path: str,
+                 secret: Optional[str] = None, cert: Optional[str] = None, key: Optional[str] = None):
+        self.sink = sink
+        self.listen = listen
+        self.port = port
+        self.path = "/" + path.strip("/")
+        self.secret = secret or None
+        self.cert = cert
+        self.key = key
+        self.counters = {'received': 0, 'rejected': 0}
+        self._server: Optional[HTTPServer] = None
+
+    async def start(self):
+        """Start listening"""
+        app = Application(
+            [(self.path, _UpdateHandler, {'server': self})],
+            log_function=_log_request
+        )
+        ssl_context = None
+        if self.cert:
+            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            ssl_context.load_cert_chain(self.cert, self.key)
+        self._server = HTTPServer(app, ssl_options=ssl_context, xheaders=True)
+        self._server.listen(self.port, self.listen)
+        scheme = "https" if ssl_context else "http"
+        logger.info(f"Webhook listening on {scheme}://{self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        """Stop accepting updates"""
+        if self._server:
+            self._server.stop()
+            await self._server.close_all_connections()
+            self._server = None
+
+    def metrics(self) -> Dict[str, int]:
+        """Get request counters"""
+        return dict(self.counters)
+
+async def register_webhook(bot: Bot):
+    """Point Telegram at WEBHOOK_URL, if one is configured"""
+    cfg = config.Config
+    if not cfg.WEBHOOK_URL:
+        logger.info("WEBHOOK_URL not set; nothing registered with Telegram")
+        return
+    
+    certificate = open(cfg.WEBHOOK_CERT, 'rb') if cfg.WEBHOOK_CERT else None
+    try:
+        await bot.set_webhook(
+            cfg.WEBHOOK_URL,
+            certificate=certificate,
+            max_connections=cfg.WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=True,
+            secret_token=cfg.WEBHOOK_SECRET or None
+        )
+    finally:
+        if certificate:
+            certificate.close()
+    logger.info(f"Webhook registered at {cfg.WEBHOOK_URL}")
+
+def create_webhook_server(sink: Sink) -> WebhookServer:
+    """Build the webhook server described by the WEBHOOK_* settings"""
+    cfg = config.Config
+    return WebhookServer(
+        sink,
+        cfg.WEBHOOK_LISTEN,
+        cfg.WEBHOOK_PORT,
+        cfg.WEBHOOK_PATH,
+        secret=cfg.WEBHOOK_SECRET,
+        cert=cfg.WEBHOOK_CERT or None,
+        key=cfg.WEBHOOK_KEY or None
+    )
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from cachetools import TTLCache
+from telegram import Message, User
+
+import config
+
+logger = logging.getLogger(__name__)
+
+class MemberCounts:
+    """Per-chat member counts fetched once per MEMBER_COUNT_TTL
+
+    Joins and leaves seen by the bot adjust the cached value, so {count}
+    stays close to the real number without an API call per member.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 10000):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, bot, chat_id: int) -> Optional[int]:
+        """Get the member count of a chat"""
+        count = self._cache.get(chat_id)
+        if count is None:
+            try:
+                count = await bot.get_chat_member_count(chat_id)
+            except Exception as e:
+                logger.debug(f"Could not fetch member count of {chat_id}: {e}")
+                return None
+            self._cache[chat_id] = count
+        return count
+
+    def adjust(self, chat_id: int, delta: int):
+        """Apply joins (+) or leaves (-) to a cached count"""
+        count = self._cache.get(chat_id)
+        if count is not None:
+            self._cache[chat_id] = max(count + delta, 0)
+
+class JoinBatcher:
+    """Collapse bursts of joins into one welcome per chat
+
+    The first join in a chat opens a window of WELCOME_BATCH_WINDOW
+    seconds; every member joining before it closes is handed to the
+    callback together. Members already welcomed within WELCOME_DEDUPE_TTL
+    seconds are dropped.
+    """
+
+    def __init__(self, window: float, dedupe_ttl: float,
+                 callback: Callable[[Message, List[User]], Awaitable[None]]):
+        self.window = window
+        self._callback = callback
+        self._recent: TTLCache = TTLCache(maxsize=100000, ttl=dedupe_ttl)
+        self._pending: Dict[int, Dict[int, User]] = {}
+        self._messages: Dict[int, Message] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def add(self, message: Message, members: List[User]) -> int:
+        """Queue joined members for the next welcome; returns how many were new"""
+        chat_id = message.chat_id
+        pending = self._pending.setdefault(chat_id, {})
+        added = 0
+        for member in members:
+            key = (chat_id, member.id)
+            if key in self._recent or member.id in pending:
+                continue
+            self._recent[key] = True
+            pending[member.id] = member
+            added += 1
+
+        if not pending:
+            del self._pending[chat_id]
+            return added
+
+        # The latest service message is the one the welcome replies to
+        self._messages[chat_id] = message
+        if chat_id not in self._tasks:
+            self._tasks[chat_id] = asyncio.create_task(self._flush_later(chat_id))
+        return added
+
+    async def _flush_later(self, chat_id: int):
+        """Send a chat's batch once its window closes"""
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self._tasks.pop(chat_id, None)
+            members = list(self._pending.pop(chat_id, {}).values())
+            message = self._messages.pop(chat_id, None)
+
+        if members and message:
+            try:
+                await self._callback(message, members)
+            except Exception as e:
+                logger.error(f"Error sending welcome in {chat_id}: {e}")
+
+# Global member count cache instance
+member_counts = MemberCounts(config.Config.MEMBER_COUNT_TTL)